@@ -0,0 +1,109 @@
+"""
+GridAStar vs pathfinding's AStarFinder on occupancy grids from recorded frames.
+
+Grids are built the way findPath builds them, from calib_images pairs or from
+frames recorded with test_2.py (L_frame_<id>.jpg / R_frame_<id>.jpg, --frames DIR).
+Each grid is searched from findPath's start cell (305, 1) and from the free
+row-0 cell nearest to it, to findPath's far cell. Times include building the
+pathfinding Grid, since findPath has to do that every frame.
+
+Run from the repository root:
+    python -m benchmarks.bench_astar [--frames DIR] [--limit 10] [--repeat 3]
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+from pathfinding.core.diagonal_movement import DiagonalMovement
+from pathfinding.core.grid import Grid
+from pathfinding.finder.a_star import AStarFinder
+
+import stereo_path_planning as spp
+from grid_astar import GridAStar
+from occupancy_grid import OccupancyGrid
+
+
+def frame_pairs(frames_dir, limit):
+    if frames_dir:
+        left = sorted(glob.glob(os.path.join(frames_dir, "L_frame_*.jpg")))
+        right = [p.replace("L_frame_", "R_frame_") for p in left]
+    else:
+        left = sorted(glob.glob(os.path.join("calib_images", "stereoLeft", "imageL*.png")))
+        right = sorted(glob.glob(os.path.join("calib_images", "stereoRight", "imageR*.png")))
+    return list(zip(left, right))[:limit]
+
+
+def occupancy_grid(pathL, pathR):
+    """The OccupancyGrid findPath would build for this stereo pair."""
+    imgL = spp.calib.rectify(cv2.imread(pathL), 'L')
+    imgR = spp.calib.rectify(cv2.imread(pathR), 'R')
+    params = (spp.minDisp, spp.nDisp, spp.bSize, spp.pfCap, spp.sRange)
+    _, depth, _ = spp.computeDisparity(imgL, imgR, params)
+    zz = np.clip(depth.Z(slice(spp.yfloor-10, spp.yfloor)), 0, 100)
+    obstacles = np.amin(zz, axis=0)
+    return OccupancyGrid.from_obstacles(obstacles, blocked_cols=spp.nDisp+60)
+
+
+def queries(grid):
+    end = grid.last_free(-90)
+    free0 = np.flatnonzero(grid.depth > 1)
+    out = [((305, 1), end)]
+    if free0.size:
+        out.append(((int(free0[np.argmin(np.abs(free0 - 305))]), 1), end))
+    return out
+
+
+def run_pathfinding(dense, start, end, diagonal):
+    g = Grid(matrix=dense)
+    finder = AStarFinder(diagonal_movement=DiagonalMovement.only_when_no_obstacle if diagonal
+                         else DiagonalMovement.never)
+    path, runs = finder.find_path(g.node(*start), g.node(*end), g)
+    return [tuple(n) for n in path], runs
+
+
+def path_cost(path):
+    return sum(np.hypot(a[0] - b[0], a[1] - b[1]) for a, b in zip(path, path[1:]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--frames', help="directory with recorded L_frame_*/R_frame_* JPEGs")
+    parser.add_argument('--limit', type=int, default=10, help="stereo pairs to use")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    cases = [(grid, q) for grid in (occupancy_grid(l, r) for l, r in frame_pairs(args.frames, args.limit))
+             for q in queries(grid)]
+    print(f"{len(cases)} searches on {args.limit} grids of {cases[0][0].shape}")
+
+    for diagonal in (False, True):
+        planner = GridAStar(diagonal=diagonal)
+        t_pf = t_ga = 0.0
+        runs_pf = runs_ga = found = mismatched = 0
+        for grid, (start, end) in cases:
+            dense = grid.dense()
+            t0 = time.perf_counter()
+            for _ in range(args.repeat):
+                p_pf, r_pf = run_pathfinding(dense, start, end, diagonal)
+            t1 = time.perf_counter()
+            for _ in range(args.repeat):
+                p_ga, r_ga = planner.find_path(start, end, grid)
+            t2 = time.perf_counter()
+            t_pf += t1 - t0
+            t_ga += t2 - t1
+            runs_pf += r_pf
+            runs_ga += r_ga
+            found += bool(p_ga)
+            mismatched += bool(p_pf) != bool(p_ga) or abs(path_cost(p_pf) - path_cost(p_ga)) > 1e-6
+        n = args.repeat * len(cases)
+        name = "8-connected" if diagonal else "4-connected"
+        print(f"{name}: pathfinding {t_pf / n * 1e3:8.2f} ms  GridAStar {t_ga / n * 1e3:8.2f} ms  "
+              f"speedup x{t_pf / t_ga:.1f}  expanded {runs_pf} vs {runs_ga}  "
+              f"paths found {found}/{len(cases)}  cost mismatches {mismatched}")
+
+
+if __name__ == "__main__":
+    main()
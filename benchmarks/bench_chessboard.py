@@ -0,0 +1,101 @@
+"""
+Chessboard detection benchmark: full-resolution search vs. downscaled search + full-resolution refinement.
+
+Runs camera_calibration.find_corners on every calibration image twice. The
+first run uses the previous detector (findChessboardCorners at full
+resolution, no flags). The second uses the two-phase detector at each
+--widths search width. It reports the per-image time, the rejection reasons,
+the boards found by only one of the detectors, and how far apart the corners
+of boards found by both are. --resize upscales the 640x480 pairs to emulate
+higher-resolution captures (e.g. 1600 for UXGA).
+
+Run from the repository root:
+    python -m benchmarks.bench_chessboard [--widths 320 480] [--resize 1600] [--repeat 3] [--per-image]
+"""
+import argparse
+import glob
+import os
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+
+import camera_calibration as cc
+
+
+def run_detector(images, repeat, **kwargs):
+    """{path: (corners or None, reason, best time in s)} for one detector."""
+    out = {}
+    for path, img in images.items():
+        best = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            corners, reason = cc.find_corners(img, **kwargs)
+            dt = time.perf_counter() - t0
+            best = dt if best is None else min(best, dt)
+        out[path] = (corners, reason, best)
+    return out
+
+
+def summarize(name, results, reference=None):
+    ms = np.array([r[2] for r in results.values()]) * 1e3
+    found = [p for p, r in results.items() if r[0] is not None]
+    print(f"{name:>12}: {len(found):3d}/{len(results)} boards, total {ms.sum():7.1f} ms, "
+          f"per image mean {ms.mean():6.2f} ms, p95 {np.percentile(ms, 95):6.2f} ms, max {ms.max():6.2f} ms")
+    for reason, n in Counter(r[1] for r in results.values() if r[1]).most_common():
+        print(f"{'':>14}{n:3d} x {reason}")
+    if reference is None:
+        return
+    missed = [p for p in reference if reference[p][0] is not None and results[p][0] is None]
+    extra = [p for p in reference if reference[p][0] is None and results[p][0] is not None]
+    both = [p for p in reference if reference[p][0] is not None and results[p][0] is not None]
+    if both:
+        err = np.concatenate([np.linalg.norm((results[p][0] - reference[p][0]).reshape(-1, 2), axis=1)
+                              for p in both])
+        print(f"{'':>14}corner difference vs full-res on {len(both)} boards: "
+              f"mean {err.mean():.3f} px, max {err.max():.3f} px")
+    for label, paths in (("missed", missed), ("only found here", extra)):
+        if paths:
+            print(f"{'':>14}{label}: " + ", ".join(os.path.basename(p) for p in paths))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--widths', type=int, nargs='+', default=[320, 480], help="search widths to compare")
+    parser.add_argument('--fallback', action='store_true', help="retry failed downscaled searches at full size")
+    parser.add_argument('--resize', type=int, help="upscale the images to this width first")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per image (best is kept)")
+    parser.add_argument('--per-image', action='store_true', help="print one line per image")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(cc.LEFT_IMAGES_DIR, "imageL*.png"))) + \
+        sorted(glob.glob(os.path.join(cc.RIGHT_IMAGES_DIR, "imageR*.png")))
+    images = {p: cv2.imread(p, cv2.IMREAD_GRAYSCALE) for p in paths}
+    images = {p: img for p, img in images.items() if img is not None}
+    if args.resize:
+        images = {p: cv2.resize(img, (args.resize, round(img.shape[0] * args.resize / img.shape[1])),
+                                interpolation=cv2.INTER_CUBIC) for p, img in images.items()}
+    h, w = next(iter(images.values())).shape
+    print(f"{len(images)} images ({w}x{h}), board {cc.CHECKERBOARD}, OpenCV {cv2.__version__}")
+
+    reference = run_detector(images, args.repeat, detect_width=None)
+    summarize("full-res", reference)
+    runs = {width: run_detector(images, args.repeat, detect_width=width, fallback=args.fallback)
+            for width in args.widths}
+    for width, results in runs.items():
+        summarize(f"width {width}", results, reference)
+
+    if args.per_image:
+        header = f"{'image':>14} {'full-res':>31}" + "".join(f" {'width %d' % w:>31}" for w in runs)
+        print("\n" + header)
+        for p in images:
+            line = f"{os.path.basename(p):>14}"
+            for results in [reference] + list(runs.values()):
+                corners, reason, dt = results[p]
+                line += f" {dt * 1e3:7.2f} ms {(reason or 'found')[:20]:>20}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Decode + preprocess benchmark for the disparity stage.
+
+Compares, per stereo frame pair:
+  current:  full BGR decode x2 -> rectify BGR x2 -> cvtColor gray x2
+  pipeline: left colour + right gray decode at 1/r in the DCT domain -> rectify both
+            at 1/r -> cvtColor the left (what stereo_path_planning's rectify stage does)
+  gray x2:  decode_stereo_pair (gray decode x2 + left colour guide) -> rectify x3
+
+Run from the repository root:
+    python -m benchmarks.bench_decode [--quality 80] [--repeat 10]
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from calibration_bundle import CALIB_DIR, load_calibration
+from frame_decode import REDUCE_FACTORS, decode_color, decode_gray, decode_stereo_pair
+
+
+def load_jpeg_pairs(limit, quality):
+    """Re-encode calib_images pairs as JPEG, the way the ESP32 streams them."""
+    left = sorted(glob.glob(os.path.join("calib_images", "stereoLeft", "imageL*.png")))[:limit]
+    right = sorted(glob.glob(os.path.join("calib_images", "stereoRight", "imageR*.png")))[:limit]
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    return [(cv2.imencode('.jpg', cv2.imread(l), params)[1].tobytes(),
+             cv2.imencode('.jpg', cv2.imread(r), params)[1].tobytes()) for l, r in zip(left, right)]
+
+
+def current_path(calib, jpegL, jpegR):
+    imgL = cv2.imdecode(np.frombuffer(jpegL, np.uint8), cv2.IMREAD_COLOR)
+    imgR = cv2.imdecode(np.frombuffer(jpegR, np.uint8), cv2.IMREAD_COLOR)
+    imgL = calib.rectify(imgL, 'L')
+    imgR = calib.rectify(imgR, 'R')
+    return cv2.cvtColor(imgL, cv2.COLOR_BGR2GRAY), cv2.cvtColor(imgR, cv2.COLOR_BGR2GRAY), imgL
+
+
+def pipeline_path(calib, jpegL, jpegR, reduce):
+    guideL = calib.rectify(decode_color(jpegL, reduce), 'L', scale=reduce)
+    grayR = calib.rectify(decode_gray(jpegR, reduce), 'R', scale=reduce)
+    return cv2.cvtColor(guideL, cv2.COLOR_BGR2GRAY), grayR, guideL
+
+
+def reduced_path(calib, jpegL, jpegR, reduce):
+    grayL, grayR, guideL = decode_stereo_pair(jpegL, jpegR, reduce)
+    return (calib.rectify(grayL, 'L', scale=reduce), calib.rectify(grayR, 'R', scale=reduce),
+            calib.rectify(guideL, 'L', scale=reduce))
+
+
+def time_per_pair(fn, pairs, repeat):
+    fn(*pairs[0])  # warm-up (builds the maps for this size/scale)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for jl, jr in pairs:
+            fn(jl, jr)
+    return (time.perf_counter() - t0) / (repeat * len(pairs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quality', type=int, default=80, help="JPEG quality of the test frames")
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--limit', type=int, default=10, help="stereo pairs to use")
+    args = parser.parse_args()
+
+    calib = load_calibration(CALIB_DIR)
+    pairs = load_jpeg_pairs(args.limit, args.quality)
+
+    t_ref = time_per_pair(lambda jl, jr: current_path(calib, jl, jr), pairs, args.repeat)
+    print(f"current (BGR decode, rectify, cvtColor): {t_ref * 1e3:6.2f} ms/pair")
+    for r in REDUCE_FACTORS[:3]:
+        for name, path in (("pipeline", pipeline_path), ("gray x2 ", reduced_path)):
+            t = time_per_pair(lambda jl, jr: path(calib, jl, jr, r), pairs, args.repeat)
+            print(f"{name} x{r}:                             {t * 1e3:6.2f} ms/pair  speedup x{t_ref / t:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+End-to-end FPS and latency on replayed stereo pairs (no cameras needed).
+
+Feeds recorded pairs (calib_images, or a session recorded with test_2.py's
+recordFrames) through stereo_path_planning.buildPipeline, i.e. the same
+capture -> rectify -> computeDisparity -> findPath stage functions main() runs.
+Each configuration is measured two ways:
+
+    sequential  the stage functions back to back on one thread, pairs as fast as
+                possible: per-frame latency and the single-thread frame rate
+    pipelined   the threaded StereoPipeline fed at a camera-like --rate: delivered
+                FPS and capture-to-plan latency
+
+Per-stage p50/p95/p99 come from latency_trace. Results are printed and, with
+--json, written as one machine-readable document (machine info, settings and
+numbers per configuration) so runs can be diffed between commits.
+
+Run from the repository root:
+    python -m benchmarks.bench_e2e [--replay calib_images] [--frames 40] [--rate 25]
+                                   [--configs baseline pyramid2 lazy] [--json results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import stereo_path_planning as spp
+from change_gate import ChangeGate
+from grid_astar import GridAStar
+from grid_dstar import DStarLite
+from latency_trace import default_tracer as tracer
+from replay_source import ReplayGrabber, find_pairs
+
+# Module settings of stereo_path_planning changed per configuration
+CONFIGS = {
+    'baseline': {},
+    'pyramid2': {'PYRAMID_SCALE': 2},
+    'lazy': {'LAZY_BANDS': True},
+    'reduce2': {'DECODE_REDUCE': 2},
+    'gated': {'CHANGE_GATING': True},
+    'dstar': {'INCREMENTAL_PLANNING': True},
+}
+
+
+def machine_info():
+    return {'platform': platform.platform(), 'machine': platform.machine(),
+            'cpu_count': os.cpu_count(), 'python': sys.version.split()[0],
+            'numpy': np.__version__, 'opencv': cv2.__version__, 'opencv_threads': cv2.getNumThreads()}
+
+
+def latency_stats(seconds):
+    ms = np.asarray(seconds) * 1e3
+    if ms.size == 0:
+        return {}
+    p50, p95, p99 = np.percentile(ms, (50, 95, 99))
+    return {'mean': float(ms.mean()), 'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+
+
+def apply_config(settings):
+    """Set stereo_path_planning's module settings; returns the values to restore."""
+    saved = {name: getattr(spp, name) for name in settings}
+    saved['planner'] = spp.planner
+    for name, value in settings.items():
+        setattr(spp, name, value)
+    spp.planner = (DStarLite(diagonal=spp.PLANNER_DIAGONAL) if spp.INCREMENTAL_PLANNING
+                   else GridAStar(diagonal=spp.PLANNER_DIAGONAL))
+    return saved
+
+
+def make_pipeline(grabber, params):
+    gate = ChangeGate(spp.CHANGE_CELL, spp.CHANGE_THRESHOLD) if spp.CHANGE_GATING else None
+    return spp.buildPipeline(grabber, params, gate)
+
+
+def run_sequential(pairs, params, frames, warmup):
+    """Stage functions one after the other on this thread; per-frame latencies (s)."""
+    grabber = ReplayGrabber(pairs, timing='fast', loop=True)
+    grabber.start()
+    stages = make_pipeline(grabber, params).stages
+    latencies = []
+    for i in range(warmup + frames):
+        if i == warmup:
+            tracer.reset()
+        t0 = time.perf_counter()
+        item = {}
+        for stage in stages:
+            item = stage.fn(item)
+            if stage.reports_wait:
+                item = item[0]      # drop the input wait the source reports
+            if item is None:
+                break
+        if i >= warmup:
+            latencies.append(time.perf_counter() - t0)
+    return {'frames': frames, 'fps': frames / sum(latencies), 'latency_ms': latency_stats(latencies),
+            'stages_ms': tracer.percentiles()}
+
+
+def run_pipelined(pairs, params, frames, warmup, rate):
+    """Threaded pipeline fed at `rate` pairs/s; delivered FPS and capture-to-plan latency."""
+    grabber = ReplayGrabber(pairs, timing=rate, loop=True)
+    grabber.start()
+    pipe = make_pipeline(grabber, params)
+    pipe.start()
+    latencies, done, t_start = [], 0, None
+    while done < warmup + frames:
+        f = pipe.get(timeout=10.0)
+        if f is None:
+            print("Pipeline stalled")
+            break
+        now = time.perf_counter()
+        done += 1
+        if done == warmup:
+            tracer.reset()
+            t_start = now
+        elif done > warmup:
+            latencies.append(now - f['captured'])
+    elapsed = time.perf_counter() - t_start if t_start is not None else 0.0
+    pipe.stop()
+    grabber.stop()
+    stats = pipe.stats()
+    return {'rate': rate, 'frames': len(latencies), 'fps': len(latencies) / elapsed if elapsed else 0.0,
+            'latency_ms': latency_stats(latencies),
+            'dropped': sum(s.get('queue_dropped', 0) for s in stats.values()),
+            'replay_skipped': grabber.skipped, 'stages_ms': tracer.percentiles()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--replay', default='calib_images', help="directory with recorded pairs")
+    parser.add_argument('--limit', type=int, default=20, help="distinct pairs to cycle through")
+    parser.add_argument('--frames', type=int, default=40, help="measured frames per run")
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--rate', type=float, default=25.0, help="pairs/s fed to the pipelined run")
+    parser.add_argument('--configs', nargs='+', default=['baseline', 'pyramid2', 'lazy', 'reduce2'],
+                        choices=sorted(CONFIGS))
+    parser.add_argument('--no-pipeline', action='store_true', help="sequential runs only")
+    parser.add_argument('--json', metavar='PATH', help="write the results as JSON ('-' = stdout)")
+    args = parser.parse_args()
+
+    pairs = find_pairs(args.replay)[:args.limit]
+    if not pairs:
+        print(f"No stereo pairs found in {args.replay}")
+        return
+    params = [spp.minDisp, spp.nDisp, spp.bSize, spp.pfCap, spp.sRange]
+    tracer.enable()
+
+    results = []
+    for name in args.configs:
+        saved = apply_config(CONFIGS[name])
+        try:
+            entry = {'config': name, 'settings': CONFIGS[name]}
+            entry['sequential'] = run_sequential(pairs, params, args.frames, args.warmup)
+            if not args.no_pipeline:
+                entry['pipelined'] = run_pipelined(pairs, params, args.frames, args.warmup, args.rate)
+        finally:
+            for key, value in saved.items():
+                setattr(spp, key, value)
+        results.append(entry)
+
+        seq = entry['sequential']
+        line = (f"{name:>10}: sequential {seq['fps']:6.2f} fps, latency p50 {seq['latency_ms']['p50']:7.1f} ms "
+                f"p95 {seq['latency_ms']['p95']:7.1f} ms")
+        if 'pipelined' in entry:
+            pip = entry['pipelined']
+            line += (f" | pipelined {pip['fps']:6.2f} fps, latency p50 {pip['latency_ms'].get('p50', 0):7.1f} ms "
+                     f"p95 {pip['latency_ms'].get('p95', 0):7.1f} ms")
+        print(line)
+
+    doc = {'benchmark': 'e2e', 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'machine': machine_info(),
+           'replay': args.replay, 'pairs': len(pairs), 'frames': args.frames, 'results': results}
+    if args.json == '-':
+        json.dump(doc, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w') as f:
+            json.dump(doc, f, indent=2)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
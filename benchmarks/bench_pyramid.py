@@ -0,0 +1,97 @@
+"""
+Coarse-to-fine vs full-resolution disparity.
+
+Runs stereo_path_planning.computeDisparity on rectified calib_images pairs,
+once with the full-resolution matcher (reference) and once per pyramid scale,
+and reports time per pair and disparity error against the reference:
+mean/median absolute error (px) and the share of pixels off by more than 1 / 3 px,
+over pixels where both maps are valid. "confident" repeats the >3 px share over
+the pixels the reference WLS filter trusts (non-zero confidence), i.e. leaving
+out the untextured areas where both maps are mostly WLS fill.
+
+Run from the repository root:
+    python -m benchmarks.bench_pyramid [--scales 2 4] [--band 4] [--limit 10]
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+import stereo_path_planning as spp
+
+
+def load_pairs(limit):
+    left = sorted(glob.glob(os.path.join("calib_images", "stereoLeft", "imageL*.png")))[:limit]
+    right = sorted(glob.glob(os.path.join("calib_images", "stereoRight", "imageR*.png")))[:limit]
+    pairs = []
+    for l, r in zip(left, right):
+        imgL = spp.calib.rectify(cv2.imread(l), 'L')
+        imgR = spp.calib.rectify(cv2.imread(r), 'R')
+        pairs.append((cv2.cvtColor(imgL, cv2.COLOR_BGR2GRAY), cv2.cvtColor(imgR, cv2.COLOR_BGR2GRAY), imgL))
+    return pairs
+
+
+def run(pairs, params, repeat):
+    """Disparity maps (px) for every pair and the mean time per pair."""
+    grayL, grayR, guide = pairs[0]
+    spp.computeDisparity(grayL, grayR, params, guide=guide)  # warm-up (builds matchers)
+    maps = []
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        maps = [spp.computeDisparity(gl, gr, params, guide=g)[0] for gl, gr, g in pairs]
+    return maps, (time.perf_counter() - t0) / (repeat * len(pairs))
+
+
+def confidences(pairs, params):
+    """The full-resolution WLS confidence map of every pair (PYRAMID_SCALE must be 1)."""
+    wls = spp.get_matchers(**spp.getMatcherParams(params))[2]
+    out = []
+    for gl, gr, g in pairs:
+        spp.computeDisparity(gl, gr, params, guide=g)
+        out.append(wls.getConfidenceMap().copy())
+    return out
+
+
+def errors(maps, refs, confs):
+    diffs, confident = [], []
+    for d, ref, conf in zip(maps, refs, confs):
+        valid = (d > 0) & (ref > 0)
+        diff = np.abs(d.astype(np.float32) - ref)
+        diffs.append(diff[valid])
+        confident.append(diff[valid & (conf[:d.shape[0], :d.shape[1]] > 0)])
+    diff, confident = np.concatenate(diffs), np.concatenate(confident)
+    return diff.mean(), np.median(diff), 100 * np.mean(diff > 1), 100 * np.mean(diff > 3), \
+        100 * np.mean(confident > 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--band', type=int, default=spp.PYRAMID_BAND, help="refinement half-width (px)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--limit', type=int, default=10, help="stereo pairs to use")
+    args = parser.parse_args()
+
+    params = (spp.minDisp, spp.nDisp, spp.bSize, spp.pfCap, spp.sRange)
+    pairs = load_pairs(args.limit)
+
+    spp.PYRAMID_SCALE = 1
+    refs, t_ref = run(pairs, params, args.repeat)
+    confs = confidences(pairs, params)
+    print(f"full resolution:  {t_ref * 1e3:7.1f} ms/pair")
+
+    spp.PYRAMID_BAND = args.band
+    for s in args.scales:
+        spp.PYRAMID_SCALE = s
+        maps, t = run(pairs, params, args.repeat)
+        mae, med, bad1, bad3, bad3c = errors(maps, refs, confs)
+        print(f"pyramid 1/{s} +/-{args.band}px: {t * 1e3:7.1f} ms/pair  speedup x{t_ref / t:.2f}  "
+              f"mae {mae:.2f}px  median {med:.2f}px  >1px {bad1:.1f}%  >3px {bad3:.1f}%  "
+              f"confident >3px {bad3c:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
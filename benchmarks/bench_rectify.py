@@ -0,0 +1,63 @@
+"""
+Rectification benchmark: float32 maps + ROI slice vs. ROI-cropped fixed-point maps.
+
+Run from the repository root:
+    python -m benchmarks.bench_rectify [--repeat 20]
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from calibration_bundle import CALIB_DIR, SIDES, load_calibration
+
+IMAGE_DIRS = {'L': os.path.join("calib_images", "stereoLeft", "imageL*.png"),
+              'R': os.path.join("calib_images", "stereoRight", "imageR*.png")}
+
+
+def rectify_float(img, mapx, mapy, roi):
+    """Current live-loop path: full-frame float remap, then crop to ROI."""
+    x, y, w, h = roi
+    return cv2.remap(img, mapx, mapy, cv2.INTER_LINEAR)[y:y+h, x:x+w]
+
+
+def time_per_frame(fn, images, repeat):
+    fn(images[0])  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for img in images:
+            fn(img)
+    return (time.perf_counter() - t0) / (repeat * len(images))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=10, help="images per camera")
+    args = parser.parse_args()
+
+    calib = load_calibration(CALIB_DIR)
+    for side in SIDES:
+        images = [cv2.imread(f) for f in sorted(glob.glob(IMAGE_DIRS[side]))[:args.limit]]
+        mapx = np.ascontiguousarray(getattr(calib, 'umap' + side))
+        mapy = np.ascontiguousarray(getattr(calib, 'rmap' + side))
+        roi = getattr(calib, 'ROI' + side)
+        map1, map2 = (np.ascontiguousarray(m) for m in calib.fixed_maps(side))
+
+        t_float = time_per_frame(lambda im: rectify_float(im, mapx, mapy, roi), images, args.repeat)
+        t_fixed = time_per_frame(lambda im: calib.rectify(im, side), images, args.repeat)
+
+        ref = rectify_float(images[0], mapx, mapy, roi)
+        out = calib.rectify(images[0], side)
+        max_err = int(np.abs(ref.astype(np.int16) - out.astype(np.int16)).max())
+
+        print(f"[{side}] float+slice: {t_float * 1e3:6.2f} ms  ({(mapx.nbytes + mapy.nbytes) / 1e6:.2f} MB maps)")
+        print(f"[{side}] fixed ROI:   {t_fixed * 1e3:6.2f} ms  ({(map1.nbytes + map2.nbytes) / 1e6:.2f} MB maps)"
+              f"  speedup x{t_float / t_fixed:.2f}, max abs diff {max_err}")
+
+
+if __name__ == "__main__":
+    main()
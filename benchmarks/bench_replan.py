@@ -0,0 +1,72 @@
+"""
+Incremental (D* Lite) vs from-scratch (GridAStar) replanning over frame sequences.
+
+Each sequence starts from a grid built from a recorded stereo pair (see
+bench_astar) and then simulates a slowly changing scene: every frame a few
+columns' free depth changes by a couple of cells. Start and goal are chosen
+the way findPath chooses them, so a goal jump forces D* Lite to replan fully.
+Reports nodes expanded and time per frame for both planners.
+
+Run from the repository root:
+    python -m benchmarks.bench_replan [--frames DIR] [--limit 5] [--steps 30] [--changes 3]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.bench_astar import frame_pairs, occupancy_grid, queries
+from grid_astar import GridAStar
+from grid_dstar import DStarLite
+from occupancy_grid import OccupancyGrid
+
+
+def sequence(grid, steps, changes, rng):
+    """`steps` grids drifting from `grid` by `changes` column edits per frame."""
+    depth = grid.depth.astype(np.int16)
+    lo = int(np.flatnonzero(depth).min()) if depth.any() else 0
+    out = []
+    for _ in range(steps):
+        cols = rng.integers(lo, depth.size, changes)
+        depth[cols] = np.clip(depth[cols] + rng.integers(-2, 3, changes), 0, grid.height)
+        out.append(OccupancyGrid(depth.copy(), grid.height))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--frames', help="directory with recorded L_frame_*/R_frame_* JPEGs")
+    parser.add_argument('--limit', type=int, default=5, help="stereo pairs (sequences) to use")
+    parser.add_argument('--steps', type=int, default=30, help="frames per sequence")
+    parser.add_argument('--changes', type=int, default=3, help="columns changed per frame")
+    parser.add_argument('--diagonal', action='store_true', help="8-connected moves")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = {'GridAStar': [0, 0.0, 0], 'DStarLite': [0, 0.0, 0]}
+    replans = frames = 0
+    for l, r in frame_pairs(args.frames, args.limit):
+        base = occupancy_grid(l, r)
+        start = queries(base)[-1][0]      # free start cell nearest findPath's
+        grids = sequence(base, args.steps, args.changes, rng)
+        planners = {'GridAStar': GridAStar(args.diagonal), 'DStarLite': DStarLite(args.diagonal)}
+        for grid in grids:
+            end = grid.last_free(-90)
+            for name, planner in planners.items():
+                t0 = time.perf_counter()
+                path, expanded = planner.find_path(start, end, grid)
+                res = results[name]
+                res[0] += expanded
+                res[1] += time.perf_counter() - t0
+                res[2] += bool(path)
+        replans += planners['DStarLite'].full_replans
+        frames += len(grids)
+
+    for name, (expanded, seconds, found) in results.items():
+        print(f"{name:>10}: {expanded / frames:8.1f} nodes expanded/frame  {seconds / frames * 1e3:7.2f} ms/frame  "
+              f"paths {found}/{frames}")
+    print(f"D* Lite full replans: {replans}/{frames} frames")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Single-file binary stereo calibration bundle.
+
+The bundle stores everything the runtime needs from `camera_calibration.py`
+(intrinsics, distortion, R/T/E/F, rectification/projection, Q, ROIs and the
+undistort/rectify remap tables, plus the same tables pre-converted to OpenCV's
+fixed-point CV_16SC2 format and cropped to each camera's valid ROI) in one
+versioned file:
+
+    magic (8 bytes) | header length (uint32 LE) | JSON header | padding | arrays
+
+Every array starts on a 64-byte boundary, so loading is a header parse plus one
+`np.memmap` per array; no pixel data is read until it is actually touched.
+The per-array `.txt`/`.npy` files are only needed to (re)build the bundle.
+"""
+import json
+import os
+import struct
+
+import cv2
+import numpy as np
+
+CALIB_DIR = "Calibration_Files"
+BUNDLE_NAME = "stereo_calib.bin"
+BUNDLE_MAGIC = b"STCALIB\0"
+BUNDLE_VERSION = 2
+ALIGN = 64
+
+# Array name (same as the file stem written by camera_calibration.py) -> dtype
+BUNDLE_ARRAYS = {
+    'CmL': np.float64, 'DcL': np.float64,
+    'CmR': np.float64, 'DcR': np.float64,
+    'RectifL': np.float64, 'RectifR': np.float64,
+    'ProjL': np.float64, 'ProjR': np.float64,
+    'Rtn': np.float64, 'Trnsl': np.float64,
+    'E': np.float64, 'F': np.float64,
+    'Q': np.float64,
+    'ROIL': np.int32, 'ROIR': np.int32,
+    'umapL': np.float32, 'rmapL': np.float32,
+    'umapR': np.float32, 'rmapR': np.float32,
+    # Derived: ROI-cropped fixed-point maps (integer x/y + interpolation table index)
+    'xymapL': np.int16, 'interpL': np.uint16,
+    'xymapR': np.int16, 'interpR': np.uint16,
+}
+REMAP_ARRAYS = ('umapL', 'rmapL', 'umapR', 'rmapR')
+SIDES = ('L', 'R')
+
+
+class StereoCalibration:
+    """Read-only view over a calibration bundle; arrays are attributes (calib.Q, calib.umapL, ...)."""
+
+    def __init__(self, path, version, width, height, arrays):
+        self.path = path
+        self.version = version
+        self.width = width
+        self.height = height
+        self.arrays = arrays
+        self._fixed_maps = {}  # (side, src_size, scale) -> (map1, map2)
+
+    def __getattr__(self, name):
+        arrays = self.__dict__.get('arrays', {})
+        if name in arrays:
+            return arrays[name]
+        raise AttributeError(name)
+
+    @property
+    def frame_size(self):
+        return (self.width, self.height)
+
+    def check_resolution(self, frame_size):
+        """Raise ValueError if `frame_size` (w, h) is not the calibrated resolution."""
+        w, h = frame_size
+        if (w, h) != (self.width, self.height):
+            raise ValueError(f"Calibration bundle {self.path} is for {self.width}x{self.height}, "
+                             f"frames are {w}x{h}")
+
+    def fixed_maps(self, side, src_size=None, scale=1):
+        """
+        ROI-cropped CV_16SC2 + interpolation maps for camera `side` ('L' or 'R').
+        Args:
+            side (str): 'L' or 'R'.
+            src_size (tuple): (w, h) of the incoming frames. Frames that are not at the
+                calibrated resolution get maps with the resize folded in, built on first use.
+            scale (int): Output is the ROI at 1/scale resolution (for reduced-size matching).
+        Returns:
+            tuple: (map1, map2) for cv2.remap.
+        """
+        if src_size is None:
+            src_size = self.frame_size
+        key = (side, tuple(src_size), scale)
+        maps = self._fixed_maps.get(key)
+        if maps is None:
+            mapx, mapy = self.arrays['umap' + side], self.arrays['rmap' + side]
+            roi = self.arrays['ROI' + side]
+            if key[1] != self.frame_size or scale != 1:
+                mapx, mapy = scale_maps(mapx, mapy, self.frame_size, key[1], roi, scale)
+                maps = cv2.convertMaps(mapx, mapy, cv2.CV_16SC2)
+            elif 'xymap' + side in self.arrays:
+                maps = (self.arrays['xymap' + side], self.arrays['interp' + side])
+            else:
+                maps = fixed_point_maps(mapx, mapy, roi)
+            self._fixed_maps[key] = maps
+        return maps
+
+    def rectify(self, img, side, interpolation=cv2.INTER_LINEAR, scale=1):
+        """Resize (if needed), undistort, rectify and crop `img` to its ROI in a single remap."""
+        map1, map2 = self.fixed_maps(side, (img.shape[1], img.shape[0]), scale)
+        return cv2.remap(img, map1, map2, interpolation)
+
+    def roi_size(self, side, scale=1):
+        """(w, h) of rectify() output for camera `side` at 1/scale resolution."""
+        _, _, w, h = (int(v) for v in self.arrays['ROI' + side])
+        return scaled_size((w, h), scale)
+
+
+def scaled_size(size, scale):
+    w, h = size
+    return max(1, round(w / scale)), max(1, round(h / scale))
+
+
+def scale_maps(mapx, mapy, calib_size, src_size, roi, scale=1):
+    """
+    Fold a cv2.resize(src_size -> calib_size) into float remap tables.
+    Args:
+        mapx, mapy (numpy.ndarray): Float32 maps at the calibrated resolution.
+        calib_size, src_size (tuple): (w, h) of the calibration and of the incoming frames.
+        roi (sequence): Valid region (x, y, w, h); only this part of the maps is kept.
+        scale (int): Additionally shrink the output grid by this factor.
+    Returns:
+        tuple: ROI-sized (or ROI/scale-sized) float32 maps that sample the src_size frame directly.
+    """
+    x, y, w, h = (int(v) for v in roi)
+    mapx = np.ascontiguousarray(mapx[y:y+h, x:x+w], dtype=np.float32)
+    mapy = np.ascontiguousarray(mapy[y:y+h, x:x+w], dtype=np.float32)
+    if scale != 1:
+        # Sample the maps at the centres of the coarser output pixels
+        out_size = scaled_size((w, h), scale)
+        mapx = cv2.resize(mapx, out_size, interpolation=cv2.INTER_LINEAR)
+        mapy = cv2.resize(mapy, out_size, interpolation=cv2.INTER_LINEAR)
+    sx = src_size[0] / calib_size[0]
+    sy = src_size[1] / calib_size[1]
+    # Same pixel-centre convention as cv2.resize: src = (dst + 0.5) * scale - 0.5
+    mapx = (mapx + np.float32(0.5)) * np.float32(sx) - np.float32(0.5)
+    mapy = (mapy + np.float32(0.5)) * np.float32(sy) - np.float32(0.5)
+    return mapx.astype(np.float32), mapy.astype(np.float32)
+
+
+def fixed_point_maps(mapx, mapy, roi):
+    """
+    Convert float32 remap tables to OpenCV's fixed-point format, keeping only the ROI.
+    Args:
+        mapx, mapy (numpy.ndarray): Float32 undistort/rectify maps (h x w).
+        roi (sequence): Valid region (x, y, w, h) from stereoRectify.
+    Returns:
+        tuple: (CV_16SC2 map, CV_16UC1 interpolation table), both roi-sized.
+    """
+    x, y, w, h = (int(v) for v in roi)
+    mapx = np.ascontiguousarray(mapx[y:y+h, x:x+w], dtype=np.float32)
+    mapy = np.ascontiguousarray(mapy[y:y+h, x:x+w], dtype=np.float32)
+    return cv2.convertMaps(mapx, mapy, cv2.CV_16SC2)
+
+
+def _aligned(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def write_bundle(path, arrays, frame_size):
+    """Write `arrays` (name -> ndarray) for a (w, h) calibration to `path` atomically."""
+    w, h = frame_size
+    arrays = dict(arrays)
+    for side in SIDES:
+        if 'xymap' + side not in arrays and 'umap' + side in arrays:
+            arrays['xymap' + side], arrays['interp' + side] = fixed_point_maps(
+                arrays['umap' + side], arrays['rmap' + side], arrays['ROI' + side])
+
+    entries = {}
+    blobs = []
+    offset = 0
+    for name, dtype in BUNDLE_ARRAYS.items():
+        if name not in arrays:
+            continue
+        a = np.ascontiguousarray(arrays[name], dtype=dtype)
+        offset = _aligned(offset)
+        entries[name] = {'dtype': np.dtype(dtype).str, 'shape': list(a.shape), 'offset': offset}
+        blobs.append((offset, a))
+        offset += a.nbytes
+
+    header = json.dumps({'version': BUNDLE_VERSION, 'width': int(w), 'height': int(h),
+                         'arrays': entries}).encode('utf-8')
+    data_start = _aligned(len(BUNDLE_MAGIC) + 4 + len(header))
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(BUNDLE_MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        for rel_offset, a in blobs:
+            f.seek(data_start + rel_offset)
+            f.write(a.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_bundle(path):
+    """Memory-map a bundle written by write_bundle()."""
+    with open(path, 'rb') as f:
+        if f.read(len(BUNDLE_MAGIC)) != BUNDLE_MAGIC:
+            raise ValueError(f"{path} is not a stereo calibration bundle")
+        (header_len,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(header_len).decode('utf-8'))
+
+    if header['version'] != BUNDLE_VERSION:
+        raise ValueError(f"{path} has bundle version {header['version']}, expected {BUNDLE_VERSION}; "
+                         "rebuild it with `python calibration_bundle.py`")
+
+    data_start = _aligned(len(BUNDLE_MAGIC) + 4 + header_len)
+    arrays = {}
+    for name, e in header['arrays'].items():
+        arrays[name] = np.memmap(path, dtype=np.dtype(e['dtype']), mode='r',
+                                 offset=data_start + e['offset'], shape=tuple(e['shape']))
+    return StereoCalibration(path, header['version'], header['width'], header['height'], arrays)
+
+
+def load_calibration_files(calib_dir=CALIB_DIR):
+    """Load the per-array calibration files, preferring `.npy` over `.txt` for the remap tables."""
+    arrays = {}
+    for name, dtype in BUNDLE_ARRAYS.items():
+        if name.startswith(('xymap', 'interp')):
+            continue
+        npy_path = os.path.join(calib_dir, name + '.npy')
+        txt_path = os.path.join(calib_dir, name + '.txt')
+        if os.path.isfile(npy_path):
+            arrays[name] = np.load(npy_path).astype(dtype)
+        elif os.path.isfile(txt_path):
+            # ROIs are saved with '%d' but older runs wrote them as floats
+            arrays[name] = np.loadtxt(txt_path, dtype=np.float64).astype(dtype)
+    missing = [n for n in ('Q', 'ROIL', 'ROIR') + REMAP_ARRAYS if n not in arrays]
+    if missing:
+        raise FileNotFoundError(f"Missing calibration files in {calib_dir}: {', '.join(missing)}")
+    return arrays
+
+
+def build_bundle(calib_dir=CALIB_DIR, path=None):
+    """(Re)build the bundle in `calib_dir` from the per-array calibration files."""
+    path = path or os.path.join(calib_dir, BUNDLE_NAME)
+    arrays = load_calibration_files(calib_dir)
+    h, w = arrays['umapL'].shape[:2]
+    write_bundle(path, arrays, (w, h))
+    return path
+
+
+def load_calibration(calib_dir=CALIB_DIR, frame_size=None):
+    """
+    Load the stereo calibration used by the live loops.
+    Args:
+        calib_dir (str): Directory holding `stereo_calib.bin` (and optionally the source files).
+        frame_size (tuple): Expected (width, height); a mismatch raises ValueError.
+    Returns:
+        StereoCalibration: Memory-mapped calibration.
+    """
+    path = os.path.join(calib_dir, BUNDLE_NAME)
+    if not os.path.isfile(path):
+        print(f"No calibration bundle at {path}, building it from the calibration files...")
+        build_bundle(calib_dir, path)
+    calib = read_bundle(path)
+    if frame_size is not None:
+        calib.check_resolution(frame_size)
+    return calib
+
+
+if __name__ == "__main__":
+    out = build_bundle()
+    calib = read_bundle(out)
+    print(f"Wrote {out} (v{calib.version}, {calib.width}x{calib.height}, "
+          f"{len(calib.arrays)} arrays, {os.path.getsize(out) / 1e6:.1f} MB)")
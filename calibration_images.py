@@ -110,13 +110,15 @@ import cv2
 import numpy as np
 import os
 
+from mjpeg_client import MjpegCapture
+
 # Update the URLs of the ESP32-CAM streams
 url1 = 'http://192.168.0.159:81/stream'  # Camera 1 stream URL
 url2 = 'http://192.168.0.178:81/stream'  # Camera 2 stream URL
 
 # Initialize video capture for both cameras
-cap1 = cv2.VideoCapture(url1)
-cap2 = cv2.VideoCapture(url2)
+cap1 = MjpegCapture(url1)
+cap2 = MjpegCapture(url2)
 
 # Check if streams are accessible
 if not cap1.isOpened():
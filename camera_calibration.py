@@ -1,7 +1,12 @@
 import cv2
 import numpy as np
 import glob
+import hashlib
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from calibration_bundle import BUNDLE_NAME, write_bundle
 
 # Adjust these to match your checkerboard
 CHECKERBOARD = (9, 6)  # (columns, rows) of interior corners
@@ -12,8 +17,190 @@ CALIB_IMAGES_DIR = "calib_images"
 LEFT_IMAGES_DIR = os.path.join(CALIB_IMAGES_DIR, "stereoLeft")
 RIGHT_IMAGES_DIR = os.path.join(CALIB_IMAGES_DIR, "stereoRight")
 OUTPUT_DIR = "Calibration_Files"
+SAVE_TEXT_MAPS = False  # umap/rmap .txt copies are ~3.3 MB each and no longer read at runtime
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# Corner detection: images wider than DETECT_WIDTH are searched on a downscaled copy
+# (findChessboardCorners with DETECT_FLAGS) and the scaled-up corners are refined with
+# cornerSubPix at full resolution. Images up to DETECT_WIDTH use the full-resolution search
+# (no flags); at 640x480 downscaling loses small boards (see benchmarks/bench_chessboard.py).
+DETECT_WIDTH = 640
+DETECT_FLAGS = cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE
+FULL_RES_FALLBACK = False  # retry a failed downscaled search at full resolution (slow on misses)
+MAX_REFINE_SHIFT = 4.0     # px at full resolution; larger cornerSubPix moves reject the board
+# Largest distance of a corner from a homography fit of the ideal grid, in squares (median
+# corner spacing). Correct boards stay below ~0.1 (lens distortion); misordered or misfit
+# corners from either detector are off by 0.2 up to a whole square.
+GRID_TOLERANCE = 0.15
+SUBPIX_WINDOW = (11, 11)
+SEARCH_SUBPIX_WINDOW = (5, 5)  # cornerSubPix window on the downscaled search image
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+DETECT_WORKERS = os.cpu_count() or 1  # processes for findChessboardCorners (1 = no pool)
+# Refined corners (and misses) per image, keyed by image content hash + board/detector
+# parameters, so a recalibration only runs detection on new or changed images
+CORNER_CACHE = os.path.join(OUTPUT_DIR, "corner_cache.npz")
+
+
+def cache_key(data):
+    """Cache key of one image: SHA-1 of the file bytes plus everything that shapes its corners."""
+    params = f"{CHECKERBOARD[0]}x{CHECKERBOARD[1]}_d{DETECT_WIDTH}_f{DETECT_FLAGS}_b{FULL_RES_FALLBACK:d}_" \
+             f"m{MAX_REFINE_SHIFT}_g{GRID_TOLERANCE}_w{SUBPIX_WINDOW[0]}x{SUBPIX_WINDOW[1]}_" \
+             f"sw{SEARCH_SUBPIX_WINDOW[0]}x{SEARCH_SUBPIX_WINDOW[1]}_" \
+             f"t{SUBPIX_CRITERIA[0]}_i{SUBPIX_CRITERIA[1]}_e{SUBPIX_CRITERIA[2]}"
+    return hashlib.sha1(data).hexdigest() + "_" + params
+
+
+def load_corner_cache(path=CORNER_CACHE):
+    """{key: (corners or None, (w, h), rejection reason)} from the cache file ({} if missing or unreadable)."""
+    if not os.path.isfile(path):
+        return {}
+    cache = {}
+    try:
+        with np.load(path) as npz:
+            for name in npz.files:
+                key, _, field = name.rpartition("/")
+                if field == "size":
+                    w, h, found = npz[name]
+                    if found:
+                        cache[key] = npz[key + "/corners"], (int(w), int(h)), None
+                    else:
+                        cache[key] = None, (int(w), int(h)), str(npz[key + "/reason"])
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ignoring unreadable corner cache {path}: {e}")
+        return {}
+    return cache
+
+
+def save_corner_cache(cache, path=CORNER_CACHE):
+    arrays = {}
+    for key, (corners, (w, h), reason) in cache.items():
+        arrays[key + "/size"] = np.array([w, h, corners is not None], np.int32)
+        if corners is not None:
+            arrays[key + "/corners"] = corners
+        else:
+            arrays[key + "/reason"] = np.array(reason or "")
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+
+def grid_error(corners):
+    """
+    Largest distance (in squares) of a corner from the homography that best maps the
+    ideal CHECKERBOARD grid onto `corners`; large when corners are out of order or
+    landed on the wrong square.
+    """
+    pts = corners.reshape(-1, 2)
+    grid = np.mgrid[0:CHECKERBOARD[0], 0:CHECKERBOARD[1]].T.reshape(-1, 2).astype(np.float32)
+    H, _ = cv2.findHomography(grid, pts, 0)
+    if H is None:
+        return np.inf
+    fit = cv2.perspectiveTransform(grid[None], H)[0]
+    rows = pts.reshape(CHECKERBOARD[1], CHECKERBOARD[0], 2)
+    step = np.median(np.linalg.norm(np.diff(rows, axis=1), axis=2))
+    return float(np.linalg.norm(fit - pts, axis=1).max() / max(step, 1e-6))
+
+
+def find_corners(img, detect_width=DETECT_WIDTH, fallback=FULL_RES_FALLBACK):
+    """
+    Two-phase chessboard detection on a grayscale image.
+    Args:
+        img (np.ndarray): Full-resolution grayscale image.
+        detect_width (int): Search width (None, or >= the image width: full-resolution search
+            without flags, i.e. the previous detector).
+        fallback (bool): Search at full resolution if the downscaled search fails.
+    Returns:
+        tuple: (corners refined with cornerSubPix, None) or (None, rejection reason).
+    Boards from either search are rejected if they do not fit the grid (GRID_TOLERANCE).
+    """
+    h, w = img.shape[:2]
+    if detect_width is None or detect_width >= w:
+        ret, corners = cv2.findChessboardCorners(img, CHECKERBOARD, None)
+        if not ret:
+            return None, f"board not found at {w}x{h}"
+        refined = cv2.cornerSubPix(img, corners, SUBPIX_WINDOW, (-1, -1), SUBPIX_CRITERIA)
+        if grid_error(refined) > GRID_TOLERANCE:
+            return None, f"corners off the grid by > {GRID_TOLERANCE:g} squares"
+        return refined, None
+
+    scale = detect_width / w
+    small = cv2.resize(img, (detect_width, round(h * scale)), interpolation=cv2.INTER_AREA)
+    ret, corners = cv2.findChessboardCorners(small, CHECKERBOARD, DETECT_FLAGS)
+    if not ret:
+        if fallback:
+            return find_corners(img, None)
+        return None, f"board not found at {small.shape[1]}x{small.shape[0]}"
+    # Sub-pixel corners on the search image first, so the full-resolution refinement starts
+    # well inside its window; pixel centres then map as (x + 0.5) / scale - 0.5
+    corners = cv2.cornerSubPix(small, corners, SEARCH_SUBPIX_WINDOW, (-1, -1), SUBPIX_CRITERIA)
+    coarse = (corners + 0.5) / scale - 0.5
+    refined = cv2.cornerSubPix(img, coarse.copy(), SUBPIX_WINDOW, (-1, -1), SUBPIX_CRITERIA)
+    shift = float(np.abs(refined - coarse).max())
+    if shift > MAX_REFINE_SHIFT:
+        return None, f"refinement moved a corner > {MAX_REFINE_SHIFT:g} px"
+    if grid_error(refined) > GRID_TOLERANCE:
+        return None, f"corners off the grid by > {GRID_TOLERANCE:g} squares"
+    return refined, None
+
+
+def detect_corners(path):
+    """
+    Read one image and find its corners (runs in the worker processes).
+    Returns:
+        tuple: (corners or None, (w, h), rejection reason or None, seconds),
+            or None if the image is unreadable.
+    """
+    img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    t0 = time.perf_counter()
+    corners, reason = find_corners(img)
+    return corners, (img.shape[1], img.shape[0]), reason, time.perf_counter() - t0
+
+
+def find_all_corners(paths, workers=DETECT_WORKERS, cache_path=CORNER_CACHE):
+    """
+    Corners of every image, from the cache where possible and a process pool otherwise.
+    Args:
+        paths (list): Image files.
+        workers (int): Detection processes (1 = run in this process).
+        cache_path (str): Corner cache file (None = no cache).
+    Returns:
+        dict: path -> (corners or None, (w, h), rejection reason); unreadable images are left out.
+    """
+    cache = load_corner_cache(cache_path) if cache_path else {}
+    keys = {}
+    for path in paths:
+        with open(path, 'rb') as f:
+            keys[path] = cache_key(f.read())
+    todo = [path for path in paths if keys[path] not in cache]
+
+    t0 = time.perf_counter()
+    if len(todo) > 1 and workers > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+            found = list(pool.map(detect_corners, todo))
+    else:
+        found = [detect_corners(path) for path in todo]
+    print(f"Corner detection: {len(paths) - len(todo)} images cached, {len(todo)} detected "
+          f"in {time.perf_counter() - t0:.2f} s")
+
+    times = {}
+    for path, result in zip(todo, found):
+        if result is not None:
+            cache[keys[path]] = result[:3]
+            times[path] = result[3]
+    if times:
+        ms = np.array(list(times.values())) * 1e3
+        slowest = max(times, key=times.get)
+        print(f"  per image: mean {ms.mean():.1f} ms, p95 {np.percentile(ms, 95):.1f} ms, "
+              f"max {ms.max():.1f} ms ({os.path.basename(slowest)})")
+    if cache_path and todo:
+        # Keep only the current images so removed ones don't accumulate
+        current = set(keys.values())
+        save_corner_cache({key: value for key, value in cache.items() if key in current}, cache_path)
+    return {path: cache[keys[path]] for path in paths if keys[path] in cache}
+
+
 def main():
     # Prepare object points (like [0,0,0], [1,0,0], [2,0,0] ... in real scale)
     objp = np.zeros((CHECKERBOARD[0] * CHECKERBOARD[1], 3), np.float32)
@@ -32,38 +219,36 @@ def main():
     # Ensure that the number of left and right images match
     assert len(left_imgs) == len(right_imgs), "Mismatch in number of left and right images"
 
-    for (lf, rf) in zip(left_imgs, right_imgs):
-        imgL = cv2.imread(lf, cv2.IMREAD_GRAYSCALE)
-        imgR = cv2.imread(rf, cv2.IMREAD_GRAYSCALE)
+    # Detect (or look up) the refined corners of all images at once
+    corners = find_all_corners(left_imgs + right_imgs)
 
-        if imgL is None or imgR is None:
+    for (lf, rf) in zip(left_imgs, right_imgs):
+        if lf not in corners or rf not in corners:
             print(f"Error reading images: {lf}, {rf}")
             continue
 
-        retL, cornersL = cv2.findChessboardCorners(imgL, CHECKERBOARD, None)
-        retR, cornersR = cv2.findChessboardCorners(imgR, CHECKERBOARD, None)
-
-        if retL and retR:
-            # Refine corners
-            criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
-            cornersL = cv2.cornerSubPix(imgL, cornersL, (11, 11), (-1, -1), criteria)
-            cornersR = cv2.cornerSubPix(imgR, cornersR, (11, 11), (-1, -1), criteria)
+        (cornersL, (w, h), reasonL), (cornersR, _, reasonR) = corners[lf], corners[rf]
 
+        if cornersL is not None and cornersR is not None:
+            # Corner 0 must be the same physical corner in both views: the first-to-last
+            # corner vectors of the two boards point the same way
+            vecL, vecR = cornersL[-1, 0] - cornersL[0, 0], cornersR[-1, 0] - cornersR[0, 0]
+            if np.dot(vecL, vecR) <= 0:
+                print(f"Corner order differs between {lf} and {rf}; skipping the pair")
+                continue
             # Save the points
             objpoints.append(objp)
             imgpointsL.append(cornersL)
             imgpointsR.append(cornersR)
         else:
-            print(f"Chessboard corners not detected in images: {lf}, {rf}")
+            print(f"Chessboard corners not detected in images: {lf} ({reasonL or 'ok'}), "
+                  f"{rf} ({reasonR or 'ok'})")
 
     # Check if sufficient points were collected
     if not objpoints:
         print("No valid chessboard corners were found in any image pair.")
         return
 
-    # Image shape
-    h, w = imgL.shape[:2]
-
     # Initialize calibration matrices
     cameraMatrixL = np.zeros((3, 3))
     distCoeffsL = np.zeros((5, 1))
@@ -131,12 +316,12 @@ def main():
     np.savetxt(os.path.join(OUTPUT_DIR, "ROIL.txt"), roiL, fmt='%d')
     np.savetxt(os.path.join(OUTPUT_DIR, "ROIR.txt"), roiR, fmt='%d')
 
-    # Save the float32 remap arrays as text (if you want) but can be large
-    # For text, we can also store with e.g. '%.6f'
-    np.savetxt(os.path.join(OUTPUT_DIR, "umapL.txt"), mapLx, fmt='%.6f')
-    np.savetxt(os.path.join(OUTPUT_DIR, "rmapL.txt"), mapLy, fmt='%.6f')
-    np.savetxt(os.path.join(OUTPUT_DIR, "umapR.txt"), mapRx, fmt='%.6f')
-    np.savetxt(os.path.join(OUTPUT_DIR, "rmapR.txt"), mapRy, fmt='%.6f')
+    # Optionally save the float32 remap arrays as text (large, slow to parse)
+    if SAVE_TEXT_MAPS:
+        np.savetxt(os.path.join(OUTPUT_DIR, "umapL.txt"), mapLx, fmt='%.6f')
+        np.savetxt(os.path.join(OUTPUT_DIR, "rmapL.txt"), mapLy, fmt='%.6f')
+        np.savetxt(os.path.join(OUTPUT_DIR, "umapR.txt"), mapRx, fmt='%.6f')
+        np.savetxt(os.path.join(OUTPUT_DIR, "rmapR.txt"), mapRy, fmt='%.6f')
 
     # Additionally, save binary .npy files for the remap arrays (preferred for speed/accuracy)
     np.save(os.path.join(OUTPUT_DIR, "umapL.npy"), mapLx)
@@ -144,6 +329,15 @@ def main():
     np.save(os.path.join(OUTPUT_DIR, "umapR.npy"), mapRx)
     np.save(os.path.join(OUTPUT_DIR, "rmapR.npy"), mapRy)
 
+    # Single memory-mappable bundle read by the live loops (see calibration_bundle.py)
+    write_bundle(os.path.join(OUTPUT_DIR, BUNDLE_NAME), {
+        'CmL': cameraMatrixL, 'DcL': distCoeffsL, 'CmR': cameraMatrixR, 'DcR': distCoeffsR,
+        'RectifL': RL, 'RectifR': RR, 'ProjL': PL, 'ProjR': PR,
+        'Rtn': R, 'Trnsl': T, 'E': E, 'F': F, 'Q': Q,
+        'ROIL': roiL, 'ROIR': roiR,
+        'umapL': mapLx, 'rmapL': mapLy, 'umapR': mapRx, 'rmapR': mapRy,
+    }, (w, h))
+
     print(f"\nStereo calibration RMS error = {ret:.6f}")
     print(f"Calibration files saved to '{OUTPUT_DIR}'")
     print("Done.")
@@ -50,13 +50,14 @@
 #     main()
 
 
-import requests
 import os
 import time
 import cv2
 import threading
 import numpy as np
 
+from mjpeg_client import MjpegCapture, default_pool
+
 LEFT_CAM_IP = "192.168.0.178:81"
 RIGHT_CAM_IP = "192.168.0.159:81"
 
@@ -65,7 +66,7 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 def fetch_video_frame(ip):
     url = f"http://{ip}/stream"
-    cap = cv2.VideoCapture(url)
+    cap = MjpegCapture(url)
     if not cap.isOpened():
         print(f"Unable to open stream for {ip}")
         return None
@@ -78,12 +79,7 @@ def capture_image(ip):
     Capture a single image from the ESP32-CAM's HTTP server.
     """
     url = f"http://{ip}/capture"
-    r = requests.get(url, timeout=5)
-    if r.status_code == 200:
-        return r.content  # JPEG bytes
-    else:
-        print(f"Error capturing from {ip} -> status code: {r.status_code}")
-        return None
+    return default_pool.capture(url)  # JPEG bytes (None on error), keep-alive connection
 
 def display_feeds(left_cap, right_cap):
     """
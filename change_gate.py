@@ -0,0 +1,118 @@
+"""
+Temporal change gating for the disparity stage.
+
+When the car is stopped, consecutive frames are (nearly) the same and the
+full SGBM + right matcher + WLS pass produces the same result again.
+ChangeGate decides per frame pair:
+
+  'reuse'    both JPEGs are byte-identical to the previous pair (the ESP32 resent
+             a frame), or no grid cell changed: keep the previous disparity
+  'partial'  some cells changed: recompute only the row bands containing them
+  'full'     too much changed: recompute everything
+
+Changes are measured on a downscaled grid (one cell = `cell` x `cell` pixels,
+mean absolute gray difference) of both rectified images against the frame the
+disparity was last computed from, so slow drift still triggers a recompute.
+"""
+import cv2
+import numpy as np
+
+from lazy_disparity import row_runs
+
+
+class ChangeGate:
+    """Per-frame reuse / partial / full decision plus skip-rate counters."""
+
+    def __init__(self, cell=16, threshold=4.0, full_fraction=0.5, margin=1):
+        """
+        Args:
+            cell (int): Grid cell size in pixels.
+            threshold (float): Mean absolute gray difference (0-255) for a cell to count as changed.
+            full_fraction (float): Share of changed rows above which everything is recomputed.
+            margin (int): Extra cell rows marked stale above and below a changed cell.
+        """
+        self.cell = cell
+        self.threshold = threshold
+        self.full_fraction = full_fraction
+        self.margin = margin
+
+        self._jpegs = (None, None)
+        self._ref = None          # (smallL, smallR) the current disparity was computed from
+
+        self.frames = 0
+        self.duplicates = 0
+        self.reused = 0
+        self.partial = 0
+        self.full = 0
+        self.rows_total = 0
+        self.rows_stale = 0
+
+    def is_duplicate(self, frameL, frameR):
+        """True if both frames are the same JPEG bytes as the previous pair."""
+        if not isinstance(frameL, (bytes, bytearray)) or not isinstance(frameR, (bytes, bytearray)):
+            return False
+        dup = frameL == self._jpegs[0] and frameR == self._jpegs[1]
+        self._jpegs = (frameL, frameR)
+        return dup
+
+    def _small(self, gray):
+        h, w = gray.shape[:2]
+        return cv2.resize(gray, ((w + self.cell - 1) // self.cell, (h + self.cell - 1) // self.cell),
+                          interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def update(self, grayL, grayR, duplicate=False):
+        """
+        Decide what to do with this rectified pair.
+        Returns:
+            tuple: (decision, stale) where decision is 'reuse', 'partial' or 'full' and
+            stale is a boolean mask over grayL's rows that must be recomputed.
+        """
+        h = grayL.shape[0]
+        self.frames += 1
+        self.rows_total += h
+        if duplicate and self._ref is not None:
+            self.duplicates += 1
+            self.reused += 1
+            return 'reuse', np.zeros(h, bool)
+
+        smallL, smallR = self._small(grayL), self._small(grayR)
+        if self._ref is None or self._ref[0].shape != smallL.shape or self._ref[1].shape != smallR.shape:
+            self._ref = (smallL, smallR)
+            self.full += 1
+            self.rows_stale += h
+            return 'full', np.ones(h, bool)
+
+        changed = ((np.abs(smallL - self._ref[0]) > self.threshold).any(axis=1) |
+                   (np.abs(smallR - self._ref[1]) > self.threshold).any(axis=1))
+        if not changed.any():
+            self.reused += 1
+            return 'reuse', np.zeros(h, bool)
+
+        # Grow by `margin` cell rows (matching context), then expand cells to pixel rows
+        for y0, y1 in row_runs(changed.copy()):
+            changed[max(0, y0 - self.margin):y1 + self.margin] = True
+        stale = np.repeat(changed, self.cell)[:h]
+        n = int(stale.sum())
+        self.rows_stale += n
+
+        # The reference follows the rows that are being recomputed
+        if n > self.full_fraction * h:
+            self._ref = (smallL, smallR)
+            self.full += 1
+            return 'full', np.ones(h, bool)
+        self._ref[0][changed] = smallL[changed]
+        self._ref[1][changed] = smallR[changed]
+        self.partial += 1
+        return 'partial', stale
+
+    def stats(self):
+        n = max(1, self.frames)
+        return {
+            'frames': self.frames,
+            'duplicates': self.duplicates,
+            'reused': self.reused,
+            'partial': self.partial,
+            'full': self.full,
+            'skip_rate': self.reused / n,                                      # frames not matched at all
+            'row_skip_rate': 1.0 - self.rows_stale / max(1, self.rows_total),  # rows not recomputed
+        }
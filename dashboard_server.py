@@ -0,0 +1,273 @@
+"""
+Live MJPEG dashboard for headless runs (no cv2.imshow / matplotlib windows).
+
+A small HTTP server on the car streams three views:
+
+    /                 page showing all three streams
+    /left.mjpg        left image with the projected A* path (findPath's `pr`)
+    /disparity.mjpg   disparity map
+    /occupancy.mjpg   occupancy grid with the far cell
+    /<view>.jpg       the newest single frame
+
+The loop calls Dashboard.publish(), which only replaces a one-item pending
+slot and returns at once; while nobody is watching (and a snapshot of every
+view exists) it does nothing at all. An encoder thread draws the overlays with
+OpenCV primitives, JPEG-encodes the views somebody is watching and stores the
+newest JPEG per view. Each client has its own server thread that sends the
+newest JPEG when it changes. A slow client skips frames, a stuck one times
+out, and neither affects the pipeline or other clients. Streams use the
+ESP32-CAM multipart format, so MjpegCapture can read them too.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from mjpeg_client import DEFAULT_BOUNDARY
+from stereo_pipeline import DropOldestQueue
+
+VIEWS = ('left', 'disparity', 'occupancy')
+
+PAGE = b"""<!doctype html>
+<html><head><title>Stereo path planning</title></head>
+<body style="background:#222;color:#ddd;font-family:sans-serif">
+<h3>Stereo path planning</h3>
+<img src="/left.mjpg"> <img src="/disparity.mjpg"><br>
+<img src="/occupancy.mjpg">
+</body></html>
+"""
+
+
+class JpegSlot:
+    """Newest JPEG of one view; readers wait for a newer one by sequence number."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.jpeg = None
+        self.seq = 0
+        self.closed = False
+
+    def set(self, jpeg):
+        with self._cond:
+            self.jpeg = jpeg
+            self.seq += 1
+            self._cond.notify_all()
+
+    def wait_newer(self, seq, timeout=None):
+        """(jpeg, seq) once a JPEG newer than `seq` is stored; (None, seq) on timeout or close."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.seq != seq or self.closed, timeout) or self.closed:
+                return None, seq
+            return self.jpeg, self.seq
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+def write_mjpeg_headers(handler):
+    """Send the 200 response headers of a multipart/x-mixed-replace stream."""
+    handler.send_response(200)
+    handler.send_header("Content-Type", "multipart/x-mixed-replace;boundary=" + DEFAULT_BOUNDARY.decode())
+    handler.send_header("Cache-Control", "no-cache")
+    handler.send_header("Access-Control-Allow-Origin", "*")
+    handler.end_headers()
+
+
+def write_mjpeg_part(wfile, jpeg, timestamp=None):
+    """Write one multipart part the way the esp32-camera stream handler does."""
+    head = b"\r\n--" + DEFAULT_BOUNDARY + b"\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n" % len(jpeg)
+    if timestamp is not None:
+        head += b"X-Timestamp: %.6f\r\n" % timestamp
+    wfile.write(head + b"\r\n")
+    wfile.write(jpeg)
+    wfile.flush()
+
+
+def draw_path(img, pr, roi_size=None):
+    """
+    Left image with the path pixels as a polyline plus near (yellow) -> far (red) dots.
+    `pr` is in full-resolution ROI pixels; with `roi_size` (w, h) it is scaled to the image
+    size (images decoded at 1/DECODE_REDUCE resolution).
+    """
+    if pr is None or len(pr) == 0:
+        return img
+    pts = np.asarray(pr, np.float64)[:, :2]
+    if roi_size is not None:
+        pts = (pts + 0.5) * (img.shape[1] / roi_size[0], img.shape[0] / roi_size[1]) - 0.5
+    pts = np.round(pts).astype(np.int32)
+    cv2.polylines(img, [pts.reshape(-1, 1, 2)], False, (0, 255, 0), 1, cv2.LINE_AA)
+    idx = np.linspace(0, len(pts) - 1, min(len(pts), 40)).astype(int)
+    for i in idx.tolist():
+        cv2.circle(img, tuple(pts[i].tolist()), 3, (0, int(255 * (1 - i / len(pts))), 255), -1)
+    return img
+
+
+def render_occupancy(occupancy_grid, far=None, row_scale=3):
+    """BGR image of the grid (white = free, row 0 at the bottom like origin='lower')."""
+    cells = occupancy_grid.dense()
+    if cells.size == 0:
+        return np.zeros((row_scale, max(1, occupancy_grid.shape[1]), 3), np.uint8)
+    img = cv2.cvtColor(cells[::-1] * np.uint8(255), cv2.COLOR_GRAY2BGR)
+    img = cv2.resize(img, None, fx=1, fy=row_scale, interpolation=cv2.INTER_NEAREST)
+    if far is not None and far[0] >= 0:
+        x, y = far
+        cv2.circle(img, (int(x), int((cells.shape[0] - 1 - y) * row_scale + row_scale // 2)), 4, (0, 0, 255), -1)
+    return img
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    dashboard = None        # set on the per-server subclass
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_bytes(self, body, ctype):
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        name, _, ext = self.path.lstrip("/").partition(".")
+        if self.path == "/":
+            self._send_bytes(PAGE, "text/html")
+        elif name in VIEWS and ext == "jpg":
+            jpeg = self.dashboard.slots[name].jpeg
+            if jpeg is None:
+                self.send_error(503, "No frame yet")
+            else:
+                self._send_bytes(jpeg, "image/jpeg")
+        elif name in VIEWS and ext == "mjpg":
+            self.dashboard._stream(self, name)
+        else:
+            self.send_error(404)
+
+
+class Dashboard:
+    """HTTP server + encoder thread for the three MJPEG views."""
+
+    def __init__(self, host='0.0.0.0', port=8080, quality=70, max_fps=15.0, client_timeout=5.0, roi_size=None):
+        """
+        Args:
+            host, port: Address to serve on ('0.0.0.0' = reachable from the network).
+            quality (int): JPEG quality.
+            max_fps (float): Upper bound on encoded frames per second (0 = unlimited).
+            client_timeout (float): Seconds a send may block before the client is dropped.
+            roi_size (tuple): (w, h) the path pixels refer to (calib.roi_size('L')); the path
+                is scaled from it to the published image size. None = same size.
+        """
+        self.host = host
+        self.port = port
+        self.quality = quality
+        self.max_fps = max_fps
+        self.client_timeout = client_timeout
+        self.roi_size = roi_size
+        self.slots = {name: JpegSlot() for name in VIEWS}
+        self._watchers = dict.fromkeys(VIEWS, 0)
+        self._lock = threading.Lock()
+        self._pending = DropOldestQueue(maxsize=1)
+        self._stop = threading.Event()
+        self._server = None
+
+        self.published = 0
+        self.idle = 0           # publish() calls with nobody watching
+        self.encoded = 0
+        self.clients_served = 0
+        self.parts_sent = 0
+
+    def start(self):
+        handler = type("DashboardHandler", (_Handler,), {"dashboard": self})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="dashboard-http", daemon=True).start()
+        threading.Thread(target=self._encode_loop, name="dashboard-encode", daemon=True).start()
+        print(f"Dashboard on http://{self.host}:{self.port}/")
+        return self
+
+    @property
+    def clients(self):
+        return sum(self._watchers.values())
+
+    def publish(self, frameId, imgL, dispMap, occupancy_grid, pr, far=None):
+        """
+        Offer the newest planner output. Never blocks; the arrays must not be modified
+        afterwards. Returns False (and does nothing) if no client is watching.
+        """
+        self.published += 1
+        if not self.clients and all(slot.jpeg is not None for slot in self.slots.values()):
+            self.idle += 1
+            return False
+        self._pending.put((frameId, imgL, dispMap, occupancy_grid, pr, far))
+        return True
+
+    def _encode(self, img):
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return buf.tobytes() if ok else None
+
+    def _encode_loop(self):
+        last = 0.0
+        while not self._stop.is_set():
+            item = self._pending.get(timeout=0.5)
+            if item is None:
+                continue
+            frameId, imgL, dispMap, occupancy_grid, pr, far = item
+            # Until every view has a snapshot, encode all of them; afterwards only watched ones
+            want = {name for name in VIEWS if self._watchers[name] or self.slots[name].jpeg is None}
+            if 'left' in want:
+                left = draw_path(imgL.copy(), pr, self.roi_size)
+                cv2.putText(left, f"#{frameId}", (8, 22), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 1, cv2.LINE_AA)
+                self.slots['left'].set(self._encode(left))
+            if 'disparity' in want:
+                self.slots['disparity'].set(self._encode(
+                    cv2.normalize(dispMap, None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)))
+            if 'occupancy' in want and occupancy_grid is not None:
+                self.slots['occupancy'].set(self._encode(render_occupancy(occupancy_grid, far)))
+            self.encoded += 1
+            if self.max_fps:
+                wait = last + 1.0 / self.max_fps - time.monotonic()
+                if wait > 0:
+                    self._stop.wait(wait)
+                last = time.monotonic()
+
+    def _stream(self, handler, name):
+        """Serve one MJPEG client on its server thread until it disconnects."""
+        slot = self.slots[name]
+        handler.connection.settimeout(self.client_timeout)
+        with self._lock:
+            self._watchers[name] += 1
+            self.clients_served += 1
+        try:
+            write_mjpeg_headers(handler)
+            jpeg, seq = slot.jpeg, slot.seq
+            while not self._stop.is_set():
+                if jpeg is not None:
+                    write_mjpeg_part(handler.wfile, jpeg, time.time())
+                    self.parts_sent += 1
+                jpeg, seq = slot.wait_newer(seq, timeout=1.0)
+        except OSError:
+            pass        # client went away or stopped reading
+        finally:
+            with self._lock:
+                self._watchers[name] -= 1
+            handler.close_connection = True
+
+    def stop(self):
+        self._stop.set()
+        self._pending.wake()
+        for slot in self.slots.values():
+            slot.close()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def stats(self):
+        return {'published': self.published, 'idle': self.idle, 'encoded': self.encoded,
+                'clients': self.clients, 'clients_served': self.clients_served, 'parts_sent': self.parts_sent}
@@ -0,0 +1,131 @@
+"""
+Closed-form depth from Q for selected rows or pixels.
+
+cv2.reprojectImageTo3D builds the whole H x W x 3 float32 cloud, while the
+planner reads one thin band of Z plus X at a few path pixels. For a rectified
+pair, Q's last row only involves the disparity:
+
+    W = Q[3,2] * d + Q[3,3]          Z = (Q[2,2] * d + Q[2,3]) / W
+    X = (x + Q[0,3]) / W             Y = (y + Q[1,3]) / W      (general rows of Q below)
+
+so 1/W and Z are functions of d alone. DepthLUT tabulates them over the full
+16-bit fixed-point disparity range (StereoSGBM/WLS output, 1/16 px; uint8
+getDisparityVis maps are looked up as d << 4), and DepthMap answers Z / X / Y
+queries for rows or pixels of one disparity image. The full cloud is only
+built when cloud() is called. Values match reprojectImageTo3D with
+handleMissingValues=True: pixels at the image's minimum disparity get Z = 10000.
+"""
+import numpy as np
+
+BIG_Z = 10000.0   # reprojectImageTo3D's Z for missing (minimum) disparities
+
+
+class DepthLUT:
+    """1/W and Z per 16-bit fixed-point disparity for one Q matrix."""
+
+    def __init__(self, Q):
+        Q = np.asarray(Q, np.float64)
+        if Q[3, 0] != 0 or Q[3, 1] != 0:
+            raise ValueError("Q's last row depends on x/y; a disparity lookup table cannot represent it")
+        self.Q = Q
+        d = np.arange(1 << 16, dtype=np.uint16).view(np.int16) / 16.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inv_w = 1.0 / (Q[3, 2] * d + Q[3, 3])
+            self.inv_w = inv_w.astype(np.float32)
+            self.z = ((Q[2, 2] * d + Q[2, 3]) * inv_w).astype(np.float32)
+        self._z_from_d = Q[2, 0] == 0 and Q[2, 1] == 0
+
+    @staticmethod
+    def fixed(disparity):
+        """LUT indices (uint16) for an int16 fixed-point or uint8 pixel disparity array."""
+        disparity = np.asarray(disparity)
+        if disparity.dtype == np.int16:
+            return disparity.view(np.uint16)
+        return disparity.astype(np.uint16) << 4
+
+    def _axis(self, r, x, y, d, inv_w):
+        """Row r of Q applied to (x, y, d, 1), divided by W."""
+        q = self.Q[r]
+        num = q[3] + q[2] * d if q[2] else q[3]
+        if q[0]:
+            num = num + q[0] * x
+        if q[1]:
+            num = num + q[1] * y
+        with np.errstate(invalid='ignore'):
+            return (num * inv_w).astype(np.float32)
+
+
+class DepthMap:
+    """Depth queries on one disparity image (read on demand, so in-place updates are seen)."""
+
+    def __init__(self, disparity, lut, handle_missing=True):
+        """
+        Args:
+            disparity (np.ndarray): uint8 getDisparityVis map (pixels) or int16 fixed-point map.
+            lut (DepthLUT): Lookup table for the calibration's Q.
+            handle_missing (bool): Z = 10000 at the minimum disparity, as reprojectImageTo3D does.
+        """
+        self.disparity = disparity
+        self.lut = lut
+        self.handle_missing = handle_missing
+        self._missing_d16 = None    # LUT index of the image's minimum disparity, found on first use
+
+    @property
+    def shape(self):
+        return self.disparity.shape[:2]
+
+    def _rows(self, rows):
+        """(y coordinates as a column vector, fixed-point disparities) for a row selection."""
+        ys = np.arange(self.shape[0])[rows]
+        return ys[:, None], DepthLUT.fixed(self.disparity[rows])
+
+    def _missing(self, d16, z):
+        if self.handle_missing:
+            if self._missing_d16 is None:
+                # One scan of the whole image per DepthMap, not per query. Rows that
+                # LazyDisparity fills in later start at 0, the lowest uint8 value, so
+                # they don't change it while any row is still missing.
+                self._missing_d16 = DepthLUT.fixed(self.disparity.min())
+            z[d16 == self._missing_d16] = BIG_Z
+        return z
+
+    def Z(self, rows=slice(None)):
+        """Depth for the selected rows (slice or index array), shape (rows, W)."""
+        ys, d16 = self._rows(rows)
+        if self.lut._z_from_d:
+            z = self.lut.z[d16]
+        else:
+            z = self.lut._axis(2, np.arange(self.shape[1]), ys, d16 / 16.0, self.lut.inv_w[d16])
+        return self._missing(d16, z)
+
+    def X(self, rows=slice(None)):
+        ys, d16 = self._rows(rows)
+        return self.lut._axis(0, np.arange(self.shape[1]), ys, d16 / 16.0, self.lut.inv_w[d16])
+
+    def Y(self, rows=slice(None)):
+        ys, d16 = self._rows(rows)
+        return self.lut._axis(1, np.arange(self.shape[1]), ys, d16 / 16.0, self.lut.inv_w[d16])
+
+    def at(self, ys, xs):
+        """(X, Y, Z) at individual pixels (ys, xs index arrays), each of shape ys.shape."""
+        ys, xs = np.asarray(ys), np.asarray(xs)
+        d16 = DepthLUT.fixed(self.disparity[ys, xs])
+        d, inv_w = d16 / 16.0, self.lut.inv_w[d16]
+        z = self.lut.z[d16] if self.lut._z_from_d else self.lut._axis(2, xs, ys, d, inv_w)
+        return (self.lut._axis(0, xs, ys, d, inv_w), self.lut._axis(1, xs, ys, d, inv_w),
+                self._missing(d16, np.array(z, np.float32)))
+
+    def points(self, rows=slice(None)):
+        """reprojectImageTo3D output for the selected rows, shape (rows, W, 3)."""
+        ys, d16 = self._rows(rows)
+        xs = np.arange(self.shape[1])
+        d, inv_w = d16 / 16.0, self.lut.inv_w[d16]
+        out = np.empty(d16.shape + (3,), np.float32)
+        out[..., 0] = self.lut._axis(0, xs, ys, d, inv_w)
+        out[..., 1] = self.lut._axis(1, xs, ys, d, inv_w)
+        out[..., 2] = self.Z(rows)
+        return out
+
+    def cloud(self):
+        """The full H x W x 3 point cloud."""
+        return self.points()
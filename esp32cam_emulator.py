@@ -0,0 +1,301 @@
+"""
+Local ESP32-CAM emulator for running the capture path without hardware.
+
+Serves the endpoints of the esp32-camera web server from an image folder:
+
+    /stream    multipart MJPEG (same boundary and part headers as app_httpd.c)
+    /capture   a single JPEG of the current frame
+    /status    emulator counters as JSON
+
+A real camera serves /capture on port 80 and /stream on port 81. The emulator
+answers both paths on `--port` (81) and, unless it is 0, on `--control-port`
+(80), so URLs of the form http://<ip>/capture, http://<ip>:81/capture and
+http://<ip>:81/stream all work. Two instances on two loopback addresses stand
+in for the left and right camera. Only the IP constants change in the
+scripts (LEFT_CAM_IP / RIGHT_CAM_IP, LEFT_CAM_URL / RIGHT_CAM_URL, url1 / url2):
+
+    python esp32cam_emulator.py calib_images/stereoLeft  --host 127.0.0.2 &
+    python esp32cam_emulator.py calib_images/stereoRight --host 127.0.0.3 &
+
+Ports below 1024 need root (or net.ipv4.ip_unprivileged_port_start=80). On
+other systems, pass --port/--control-port and put the ports in the URLs.
+
+The frames are resized to --resolution and JPEG-encoded at --quality once at
+start-up. A clock thread publishes them in a loop at --fps, with Gaussian
+--jitter on every interval, and each client sends the newest one like the
+camera's frame buffer does. The fault options apply to every frame sent:
+    --stall-prob / --stall-ms   pause in the middle of a frame (a stalled TCP flow)
+    --drop-prob                 close the connection halfway through a frame
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+from dashboard_server import JpegSlot, write_mjpeg_headers, write_mjpeg_part
+
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png")
+
+
+def _number(path):
+    m = re.findall(r"\d+", os.path.basename(path))
+    return int(m[-1]) if m else -1
+
+
+def load_frames(path, resolution=None, quality=80):
+    """
+    JPEG bytes of every image in a folder (or matching a glob), in numeric order.
+    Args:
+        path (str): Folder with *.jpg / *.png images, or a glob such as "rec/L_frame_*".
+        resolution (tuple): (width, height) to resize to (None = keep the image size).
+        quality (int): JPEG quality of the re-encoded frames.
+    """
+    if os.path.isdir(path):
+        files = [f for pattern in IMAGE_PATTERNS for f in glob.glob(os.path.join(path, pattern))]
+    else:
+        files = glob.glob(path)
+    frames = []
+    for name in sorted(files, key=lambda f: (_number(f), f)):
+        img = cv2.imread(name)
+        if img is None:
+            print(f"Skipping unreadable image {name}")
+            continue
+        if resolution is not None and (img.shape[1], img.shape[0]) != tuple(resolution):
+            img = cv2.resize(img, tuple(resolution), interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if ok:
+            frames.append(buf.tobytes())
+    return frames
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    camera = None           # set on the per-server subclass
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/stream":
+            self.camera._stream(self)
+        elif path == "/capture":
+            self.camera._capture(self)
+        elif path == "/status":
+            body = json.dumps(self.camera.stats()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_error(404)
+
+
+class CameraEmulator:
+    """One emulated ESP32-CAM: frame clock thread plus /stream and /capture servers."""
+
+    def __init__(self, frames, host='127.0.0.1', port=81, control_port=80, fps=15.0, jitter=0.0,
+                 stall_prob=0.0, stall_ms=500.0, drop_prob=0.0, seed=None):
+        """
+        Args:
+            frames (list): JPEG bytes played in a loop (see load_frames()).
+            host (str): Address to serve on (e.g. 127.0.0.2 / 127.0.0.3 for a stereo pair).
+            port (int): Stream server port (81 on the camera; 0 = any free port).
+            control_port (int): Second port answering /capture like the camera's port 80 (None/0 = off).
+            fps (float): Frame rate of the sensor clock.
+            jitter (float): Standard deviation of the frame interval in ms.
+            stall_prob (float): Probability that a sent frame stalls halfway for `stall_ms`.
+            stall_ms (float): Stall duration in ms.
+            drop_prob (float): Probability that a sent frame is cut off by closing the connection.
+            seed (int): Seed for the jitter and fault draws (None = random).
+        """
+        if not frames:
+            raise ValueError("No frames to serve")
+        self.frames = frames
+        self.host = host
+        self.port = port
+        self.control_port = control_port
+        self.fps = fps
+        self.jitter = jitter
+        self.stall_prob = stall_prob
+        self.stall_ms = stall_ms
+        self.drop_prob = drop_prob
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.slot = JpegSlot()
+        self._stop = threading.Event()
+        self._servers = []
+
+        self.produced = 0
+        self.sent = 0           # frames sent on /stream
+        self.captures = 0       # /capture responses
+        self.stalls = 0
+        self.drops = 0
+        self.clients = 0
+
+    def start(self):
+        handler = type("CameraHandler", (_Handler,), {"camera": self})
+        for port in (self.port, self.control_port):
+            if port is None or (port == 0 and self._servers):
+                continue
+            server = ThreadingHTTPServer((self.host, port), handler)
+            server.daemon_threads = True
+            self._servers.append(server)
+            threading.Thread(target=server.serve_forever, name=f"esp32cam-{port}", daemon=True).start()
+        self.port = self._servers[0].server_address[1]
+        threading.Thread(target=self._clock, name="esp32cam-clock", daemon=True).start()
+        ports = ", ".join(str(s.server_address[1]) for s in self._servers)
+        print(f"ESP32-CAM emulator on {self.host} (ports {ports}): {len(self.frames)} frames at {self.fps} fps")
+        return self
+
+    def _draw(self):
+        with self._rng_lock:
+            return self._rng.random()
+
+    def _clock(self):
+        """Publish the next frame every 1/fps seconds (plus jitter), like the sensor's frame buffer."""
+        period = 1.0 / self.fps
+        due = time.monotonic()
+        i = 0
+        while not self._stop.is_set():
+            self.slot.set(self.frames[i % len(self.frames)])
+            self.produced += 1
+            i += 1
+            with self._rng_lock:
+                interval = max(0.0, period + self._rng.gauss(0.0, self.jitter / 1e3)) if self.jitter else period
+            due += interval
+            wait = due - time.monotonic()
+            if wait < 0:
+                due = time.monotonic()      # fell behind (e.g. suspended): don't burst
+            self._stop.wait(max(0.0, wait))
+
+    def _send(self, wfile, data):
+        """Write one response body or part, applying the stall / drop faults."""
+        half = len(data) // 2
+        if self.drop_prob and self._draw() < self.drop_prob:
+            self.drops += 1
+            wfile.write(data[:half])
+            wfile.flush()
+            raise ConnectionAbortedError("emulated disconnect")
+        if self.stall_prob and self._draw() < self.stall_prob:
+            self.stalls += 1
+            wfile.write(data[:half])
+            wfile.flush()
+            self._stop.wait(self.stall_ms / 1e3)
+            data = data[half:]
+        wfile.write(data)
+        wfile.flush()
+
+    def _stream(self, handler):
+        with self._rng_lock:
+            self.clients += 1
+        try:
+            write_mjpeg_headers(handler)
+            jpeg, seq = self.slot.jpeg, self.slot.seq
+            while not self._stop.is_set():
+                if jpeg is not None:
+                    part = io.BytesIO()
+                    write_mjpeg_part(part, jpeg, time.time())
+                    self._send(handler.wfile, part.getvalue())
+                    self.sent += 1
+                jpeg, seq = self.slot.wait_newer(seq, timeout=1.0)
+        except OSError:
+            pass        # client went away, or an emulated disconnect
+        finally:
+            with self._rng_lock:
+                self.clients -= 1
+            handler.close_connection = True
+
+    def _capture(self, handler):
+        jpeg = self.slot.jpeg
+        if jpeg is None:
+            jpeg, _ = self.slot.wait_newer(0, timeout=2.0)
+        if jpeg is None:
+            handler.send_error(503, "Camera capture failed")
+            return
+        handler.send_response(200)
+        handler.send_header("Content-Type", "image/jpeg")
+        handler.send_header("Content-Disposition", "inline; filename=capture.jpg")
+        handler.send_header("Content-Length", str(len(jpeg)))
+        handler.send_header("X-Timestamp", "%.6f" % time.time())
+        handler.end_headers()
+        try:
+            self._send(handler.wfile, jpeg)
+            self.captures += 1
+        except OSError:
+            handler.close_connection = True
+
+    def stop(self):
+        self._stop.set()
+        self.slot.close()
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+
+    def stats(self):
+        return {'produced': self.produced, 'sent': self.sent, 'captures': self.captures,
+                'stalls': self.stalls, 'drops': self.drops, 'clients': self.clients}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def parse_resolution(text):
+    w, _, h = text.lower().partition("x")
+    return int(w), int(h)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('images', help="image folder (e.g. calib_images/stereoLeft) or glob")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=81, help="stream port (0 = any free port)")
+    parser.add_argument('--control-port', type=int, default=80, help="second /capture port (0 = off)")
+    parser.add_argument('--fps', type=float, default=15.0)
+    parser.add_argument('--resolution', type=parse_resolution, help="WxH, e.g. 640x480 (default: image size)")
+    parser.add_argument('--quality', type=int, default=80, help="JPEG quality")
+    parser.add_argument('--jitter', type=float, default=0.0, help="frame interval std dev in ms")
+    parser.add_argument('--stall-prob', type=float, default=0.0, help="probability a frame stalls halfway")
+    parser.add_argument('--stall-ms', type=float, default=500.0)
+    parser.add_argument('--drop-prob', type=float, default=0.0, help="probability a frame ends in a disconnect")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--stats-every', type=float, default=10.0, help="seconds between stats lines (0 = off)")
+    args = parser.parse_args()
+
+    frames = load_frames(args.images, args.resolution, args.quality)
+    if not frames:
+        print(f"No images found in {args.images}")
+        return
+    camera = CameraEmulator(frames, args.host, args.port, args.control_port or None, args.fps, args.jitter,
+                            args.stall_prob, args.stall_ms, args.drop_prob, args.seed)
+    try:
+        camera.start()
+    except OSError as e:
+        print(f"Error: Could not listen on {args.host}: {e}")
+        return
+    try:
+        while True:
+            time.sleep(args.stats_every or 3600)
+            if args.stats_every:
+                print(camera.stats())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        camera.stop()
+        print(camera.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Non-blocking publish/subscribe channel for sending planner output to a viewer process.
+
+The stereo loop calls FramePublisher.publish(meta, arrays) and returns
+immediately. publish() only replaces the newest pending item; when no viewer is
+connected it does nothing at all. The item is encoded on a fan-out thread, and
+each subscriber has its own sender thread and a one-item drop-oldest queue. A
+slow or stalled viewer therefore only misses frames. It never delays the
+pipeline or another viewer.
+
+On the other side, FrameSubscriber reads continuously on its own thread and
+keeps only the newest message, so the viewer always renders the latest frame:
+
+    pub = FramePublisher(port=5600).start()          # stereo loop
+    pub.publish({'frameId': 3}, {'imgL': imgL})
+
+    sub = FrameSubscriber('127.0.0.1', 5600).start() # viewer process
+    meta, arrays = sub.latest(timeout=1.0)
+
+Wire format per message: a 12-byte prefix (header length, payload length), a
+JSON header (`meta` plus name / dtype / shape of each array) and the raw array
+bytes. Nothing is unpickled, so a subscriber cannot be made to execute code.
+"""
+import json
+import socket
+import struct
+import threading
+
+import numpy as np
+
+from stereo_pipeline import DropOldestQueue
+
+_PREFIX = struct.Struct('!IQ')
+
+
+def encode_message(meta, arrays):
+    """List of byte buffers (prefix, header, array data...) for one message."""
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    header = json.dumps({'meta': meta,
+                         'arrays': [[name, a.dtype.str, a.shape] for name, a in arrays.items()]}).encode()
+    payload = sum(a.nbytes for a in arrays.values())
+    return [_PREFIX.pack(len(header), payload), header] + [memoryview(a.reshape(-1).view(np.uint8)) for a in arrays.values()]
+
+
+def _read_exact(stream, n):
+    data = stream.read(n)
+    if data is None or len(data) < n:
+        raise ConnectionError("stream closed")
+    return data
+
+
+def read_message(stream):
+    """(meta, arrays) from a binary file-like object; raises ConnectionError at the end."""
+    header_len, payload_len = _PREFIX.unpack(_read_exact(stream, _PREFIX.size))
+    header = json.loads(_read_exact(stream, header_len))
+    payload = _read_exact(stream, payload_len)
+    arrays, offset = {}, 0
+    for name, dtype, shape in header['arrays']:
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        arrays[name] = np.frombuffer(payload, dtype, count, offset).reshape(shape)
+        offset += count * dtype.itemsize
+    return header['meta'], arrays
+
+
+class _Subscription:
+    """Sender thread for one connected viewer."""
+
+    def __init__(self, conn, addr, on_close):
+        self.conn = conn
+        self.addr = addr
+        self.queue = DropOldestQueue(maxsize=1)
+        self.sent = 0
+        self._on_close = on_close
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"publish-{addr[1]}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                buffers = self.queue.get(timeout=0.5)
+                if buffers is None:
+                    continue
+                for buf in buffers:
+                    self.conn.sendall(buf)
+                self.sent += 1
+        except OSError:
+            pass        # viewer went away
+        finally:
+            self.conn.close()
+            self._on_close(self)
+
+    def close(self):
+        self._stop.set()
+        self.queue.wake()
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class FramePublisher:
+    """TCP server pushing the newest published item to every connected subscriber."""
+
+    def __init__(self, host='127.0.0.1', port=5600, max_subscribers=4):
+        """
+        Args:
+            host (str): Interface to listen on ('127.0.0.1' = local viewers only).
+            port (int): TCP port.
+            max_subscribers (int): Further connections are refused.
+        """
+        self.host = host
+        self.port = port
+        self.max_subscribers = max_subscribers
+        self._subs = []
+        self._lock = threading.Lock()
+        self._pending = DropOldestQueue(maxsize=1)
+        self._stop = threading.Event()
+        self._server = None
+        self.published = 0      # publish() calls
+        self.encoded = 0        # items encoded and handed to the subscriber queues
+        self.dropped = 0        # items replaced before being sent (from closed subscribers)
+
+    def start(self):
+        self._server = socket.create_server((self.host, self.port))
+        self._server.settimeout(0.5)
+        self.port = self._server.getsockname()[1]
+        for target, name in ((self._accept, "publish-accept"), (self._fanout, "publish-fanout")):
+            threading.Thread(target=target, name=name, daemon=True).start()
+        print(f"Publishing frames on {self.host}:{self.port}")
+        return self
+
+    def _accept(self):
+        while not self._stop.is_set():
+            try:
+                conn, addr = self._server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            with self._lock:
+                if len(self._subs) >= self.max_subscribers:
+                    conn.close()
+                    continue
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self._subs.append(_Subscription(conn, addr, self._remove))
+            print(f"Viewer connected from {addr[0]}:{addr[1]}")
+
+    def _remove(self, sub):
+        with self._lock:
+            if sub in self._subs:
+                self._subs.remove(sub)
+                self.dropped += sub.queue.dropped
+
+    def _fanout(self):
+        while not self._stop.is_set():
+            item = self._pending.get(timeout=0.5)
+            if item is None:
+                continue
+            buffers = encode_message(*item)
+            with self._lock:
+                subs = list(self._subs)
+            for sub in subs:
+                sub.queue.put(buffers)
+            self.encoded += 1
+
+    @property
+    def subscribers(self):
+        return len(self._subs)
+
+    def publish(self, meta, arrays):
+        """
+        Offer one item (JSON-serialisable `meta`, dict of NumPy `arrays`). Never blocks;
+        the arrays must not be modified afterwards. Returns False if nobody is subscribed.
+        """
+        self.published += 1
+        if not self._subs:
+            return False
+        self._pending.put((meta, arrays))
+        return True
+
+    def stop(self):
+        self._stop.set()
+        self._pending.wake()
+        if self._server is not None:
+            self._server.close()
+        with self._lock:
+            subs = list(self._subs)
+        for sub in subs:
+            sub.close()
+
+    def stats(self):
+        with self._lock:
+            sent = [sub.sent for sub in self._subs]
+            dropped = self.dropped + sum(sub.queue.dropped for sub in self._subs)
+        return {'published': self.published, 'encoded': self.encoded,
+                'dropped': dropped + self._pending.dropped, 'subscribers': len(sent), 'sent': sent}
+
+
+class FrameSubscriber:
+    """Client reading a FramePublisher on a background thread, keeping only the newest message."""
+
+    def __init__(self, host='127.0.0.1', port=5600, retry=1.0):
+        """
+        Args:
+            host, port: Publisher address.
+            retry (float): Seconds between connection attempts (the publisher may start later).
+        """
+        self.host = host
+        self.port = port
+        self.retry = retry
+        self._cond = threading.Condition()
+        self._latest = None
+        self._fresh = False
+        self._stop = threading.Event()
+        self._sock = None
+        self.received = 0
+        self.skipped = 0        # messages replaced before latest() picked them up
+
+    def start(self):
+        threading.Thread(target=self._run, name="subscribe", daemon=True).start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._sock = socket.create_connection((self.host, self.port), timeout=self.retry)
+            except OSError:
+                self._stop.wait(self.retry)
+                continue
+            self._sock.settimeout(None)
+            stream = self._sock.makefile('rb')
+            try:
+                while not self._stop.is_set():
+                    message = read_message(stream)
+                    with self._cond:
+                        if self._fresh:
+                            self.skipped += 1
+                        self._latest, self._fresh = message, True
+                        self.received += 1
+                        self._cond.notify_all()
+            except (OSError, ConnectionError, ValueError):
+                pass
+            finally:
+                stream.close()
+                self._sock.close()
+
+    def latest(self, timeout=None):
+        """Newest message not returned before, as (meta, arrays); None on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._fresh or self._stop.is_set(), timeout) or not self._fresh:
+                return None
+            self._fresh = False
+            return self._latest
+
+    def stop(self):
+        self._stop.set()
+        if self._sock is not None:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        with self._cond:
+            self._cond.notify_all()
+
+    def stats(self):
+        return {'received': self.received, 'skipped': self.skipped}
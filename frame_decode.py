@@ -0,0 +1,69 @@
+"""
+JPEG decode helpers for the disparity stage.
+
+The matcher only needs grayscale, and the WLS filter only needs a colour guide
+for the left camera at the resolution the disparity is computed at. libjpeg can
+produce both directly: IMREAD_GRAYSCALE skips colour conversion, and the
+IMREAD_REDUCED_* modes downscale by 2/4/8 in the DCT domain, which is much
+cheaper than decoding at full size and calling cv2.resize.
+
+Every function also accepts an already-decoded BGR frame (e.g. from
+cv2.VideoCapture) and falls back to cvtColor/resize for it.
+
+When the images are rectified afterwards and the left guide is needed anyway,
+decode_color(left) + decode_gray(right), rectify both, and cvtColor the
+rectified guide for the left gray image: a colour decode costs ~4x a gray one,
+so it is not worth paying twice, and cvtColor is cheaper than another remap.
+"""
+import cv2
+import numpy as np
+
+REDUCE_FACTORS = (1, 2, 4, 8)
+GRAY_FLAGS = {1: cv2.IMREAD_GRAYSCALE, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+              4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+COLOR_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+               4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+
+def _check_reduce(reduce):
+    if reduce not in REDUCE_FACTORS:
+        raise ValueError(f"reduce must be one of {REDUCE_FACTORS}, got {reduce}")
+
+
+def _shrink(img, reduce):
+    if reduce == 1:
+        return img
+    h, w = img.shape[:2]
+    return cv2.resize(img, ((w + reduce - 1) // reduce, (h + reduce - 1) // reduce),
+                      interpolation=cv2.INTER_AREA)
+
+
+def decode_gray(frame, reduce=1):
+    """Grayscale image at 1/`reduce` resolution from JPEG bytes or a BGR frame."""
+    _check_reduce(reduce)
+    if isinstance(frame, np.ndarray):
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return _shrink(gray, reduce)
+    return cv2.imdecode(np.frombuffer(frame, np.uint8), GRAY_FLAGS[reduce])
+
+
+def decode_color(frame, reduce=1):
+    """BGR image at 1/`reduce` resolution from JPEG bytes or a BGR frame."""
+    _check_reduce(reduce)
+    if isinstance(frame, np.ndarray):
+        return _shrink(frame, reduce)
+    return cv2.imdecode(np.frombuffer(frame, np.uint8), COLOR_FLAGS[reduce])
+
+
+def decode_stereo_pair(frameL, frameR, reduce=1, guide=True):
+    """
+    Decode a stereo pair for computeDisparity.
+    Args:
+        frameL, frameR: JPEG bytes (or decoded BGR frames).
+        reduce (int): Downscale factor applied during decode (1, 2, 4 or 8).
+        guide (bool): Also decode the left colour image used as the WLS guide.
+    Returns:
+        tuple: (grayL, grayR, guideL) at 1/reduce resolution; guideL is None if not requested.
+    """
+    guideL = decode_color(frameL, reduce) if guide else None
+    return decode_gray(frameL, reduce), decode_gray(frameR, reduce), guideL
@@ -0,0 +1,82 @@
+"""
+Asynchronous frame recorder.
+
+Recording used to be a synchronous `cv.imwrite` in the compute loop, followed
+by `cv.imread` of the same file. FrameRecorder takes the frame (ideally the
+original JPEG bytes from the stream) and writes it on a background thread; if
+the disk cannot keep up, frames are dropped rather than stalling the loop.
+"""
+import os
+import queue
+import threading
+
+import cv2
+import numpy as np
+
+
+class FrameRecorder:
+    """Background writer for stream frames."""
+
+    def __init__(self, out_dir=".", maxsize=64, jpeg_quality=95):
+        """
+        Args:
+            out_dir (str): Directory the frames are written to (created if missing).
+            maxsize (int): Frames allowed to wait for the disk before new ones are dropped.
+            jpeg_quality (int): Quality used only when a decoded frame has to be re-encoded.
+        """
+        self.out_dir = out_dir
+        self.jpeg_quality = jpeg_quality
+        self._queue = queue.Queue(maxsize)
+        self._thread = None
+
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def start(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="frame-recorder", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, name, frame):
+        """
+        Queue `frame` (JPEG bytes or a BGR array) to be saved as `name`; never blocks.
+        Returns False if the frame was dropped because the writer is behind.
+        """
+        try:
+            self._queue.put_nowait((name, frame))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            name, frame = item
+            try:
+                if isinstance(frame, np.ndarray):
+                    ok, buf = cv2.imencode(os.path.splitext(name)[1] or '.jpg', frame,
+                                           [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+                    if not ok:
+                        raise ValueError(f"could not encode {name}")
+                    frame = buf.tobytes()
+                with open(os.path.join(self.out_dir, name), 'wb') as f:
+                    f.write(frame)
+                self.written += 1
+            except (OSError, ValueError, cv2.error) as e:
+                self.errors += 1
+                print(f"Error recording {name}: {e}")
+
+    def stop(self):
+        """Write everything still queued, then stop the thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return {'written': self.written, 'dropped': self.dropped, 'errors': self.errors}
@@ -0,0 +1,153 @@
+"""
+Array-backed A* for the occupancy grid.
+
+`pathfinding`'s Grid creates a Python Node object per cell every frame before
+AStarFinder even starts. GridAStar works on the grid as it is (a NumPy array
+or an OccupancyGrid, cells > 0 walkable, same convention as pathfinding):
+cells are addressed by flat index y * W + x, the open set is a heap of
+(f, h, index) tuples, and the g-score / parent / state arrays are allocated
+once and reused across frames. Instead of clearing them, every search bumps
+an epoch counter and a cell's entries only count if its stamp matches.
+
+    planner = GridAStar()
+    path, runs = planner.find_path((x0, y0), (x1, y1), grid)
+
+returns the path as a list of (x, y) tuples (start first, [] if there is
+none) and the number of expanded cells, like AStarFinder.find_path.
+"""
+from heapq import heappop, heappush
+from math import sqrt
+
+import numpy as np
+
+SQRT2 = sqrt(2.0)
+
+
+class GridAStar:
+    """A* over a 2D walkability grid with 4- or 8-connectivity."""
+
+    def __init__(self, diagonal=False, weight=1.0):
+        """
+        Args:
+            diagonal (bool): 8-connectivity; a diagonal step is only allowed if both
+                cells it cuts past are walkable. False = 4-connectivity.
+            weight (float): Heuristic weight (1 = optimal paths, > 1 = faster, greedier).
+        """
+        self.diagonal = diagonal
+        self.weight = weight
+        self._g = []
+        self._parent = []
+        self._seen = []      # epoch in which g/parent were last written
+        self._closed = []    # epoch in which the cell was expanded
+        self._epoch = 0
+        self.frames = 0
+        self.expanded = 0    # cells expanded by the last search
+        self.expanded_total = 0
+
+    def _reserve(self, n):
+        grow = n - len(self._g)
+        if grow > 0:
+            self._g.extend([0.0] * grow)
+            self._parent.extend([-1] * grow)
+            self._seen.extend([0] * grow)
+            self._closed.extend([0] * grow)
+
+    def _heuristic(self, dx, dy):
+        if self.diagonal:
+            return max(dx, dy) + (SQRT2 - 1) * min(dx, dy)   # octile
+        return dx + dy                                       # manhattan
+
+    def find_path(self, start, end, grid):
+        """
+        Args:
+            start, end: (x, y) cells.
+            grid: 2D array (rows = y) or OccupancyGrid; cells > 0 are walkable.
+        Returns:
+            tuple: (path as a list of (x, y), number of expanded cells).
+        """
+        cells = grid.dense() if hasattr(grid, 'dense') else np.asarray(grid)
+        h, w = cells.shape
+        free = (cells.reshape(-1) > 0).tolist()
+        self._reserve(h * w)
+        self._epoch += 1
+        epoch = self._epoch
+        g, parent, seen, closed = self._g, self._parent, self._seen, self._closed
+
+        (sx, sy), (ex, ey) = start, end
+        self.frames += 1
+        self.expanded = 0
+        if not (0 <= sx < w and 0 <= sy < h and 0 <= ex < w and 0 <= ey < h):
+            return [], 0
+        s, e = sy * w + sx, ey * w + ex
+        if s == e:
+            return [(sx, sy)], 1
+        if not free[e]:
+            return [], 0    # (a blocked start is allowed, as in pathfinding)
+
+        weight, heuristic, diagonal = self.weight, self._heuristic, self.diagonal
+        last = h * w - w
+        g[s] = 0.0
+        parent[s] = -1
+        seen[s] = epoch
+        h0 = heuristic(abs(sx - ex), abs(sy - ey))
+        heap = [(weight * h0, h0, s)]
+        runs = 0
+        found = False
+        while heap:
+            _, _, i = heappop(heap)
+            if closed[i] == epoch:
+                continue
+            closed[i] = epoch
+            runs += 1
+            if i == e:
+                found = True
+                break
+            x = i % w
+            left, right, up, down = x > 0, x < w - 1, i >= w, i < last
+
+            steps = []
+            if left and free[i - 1]:
+                steps.append((i - 1, 1.0))
+            if right and free[i + 1]:
+                steps.append((i + 1, 1.0))
+            if up and free[i - w]:
+                steps.append((i - w, 1.0))
+            if down and free[i + w]:
+                steps.append((i + w, 1.0))
+            if diagonal:
+                if up and left and free[i - w - 1] and free[i - 1] and free[i - w]:
+                    steps.append((i - w - 1, SQRT2))
+                if up and right and free[i - w + 1] and free[i + 1] and free[i - w]:
+                    steps.append((i - w + 1, SQRT2))
+                if down and left and free[i + w - 1] and free[i - 1] and free[i + w]:
+                    steps.append((i + w - 1, SQRT2))
+                if down and right and free[i + w + 1] and free[i + 1] and free[i + w]:
+                    steps.append((i + w + 1, SQRT2))
+
+            gi = g[i]
+            for j, cost in steps:
+                if closed[j] == epoch:
+                    continue
+                ng = gi + cost
+                if seen[j] != epoch or ng < g[j]:
+                    seen[j] = epoch
+                    g[j] = ng
+                    parent[j] = i
+                    hj = heuristic(abs(j % w - ex), abs(j // w - ey))
+                    heappush(heap, (ng + weight * hj, hj, j))
+
+        self.expanded = runs
+        self.expanded_total += runs
+        if not found:
+            return [], runs
+        path = []
+        i = e
+        while i != -1:
+            path.append((i % w, i // w))
+            i = parent[i]
+        path.reverse()
+        return path, runs
+
+    def stats(self):
+        return {'frames': self.frames, 'expanded_total': self.expanded_total,
+                'expanded_per_frame': self.expanded_total / max(1, self.frames)}
@@ -0,0 +1,152 @@
+"""
+Per-stage latency tracing.
+
+Code paths mark their stages with spans:
+
+    from latency_trace import default_tracer as tracer
+
+    tracer.set_frame(frameId)            # frame the current thread works on
+    with tracer.span('sgbm'):
+        dispL = stereoL.compute(grayL, grayR)
+
+Span times come from time.perf_counter() (monotonic). Per stage name, the
+tracer keeps the last `window` durations, and percentiles() reports rolling
+p50 / p95 / p99 from them. Every span is also kept as an event (up to
+`max_events`), and export_chrome() writes them in Chrome trace-event JSON, one
+row per thread with the frame id in each event's args. Open the file in
+chrome://tracing or https://ui.perfetto.dev.
+
+Tracing is off by default. While it is off, span() returns one shared no-op
+context manager, so an instrumented stage costs a method call.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'frame', 't0')
+
+    def __init__(self, tracer, name, frame):
+        self.tracer = tracer
+        self.name = name
+        self.frame = frame
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.t0, time.perf_counter(), self.frame)
+        return False
+
+
+class Tracer:
+    """Span recorder with rolling per-stage percentiles and Chrome trace export."""
+
+    def __init__(self, enabled=False, window=1000, max_events=200000):
+        """
+        Args:
+            enabled (bool): Record spans (False = span() is a no-op).
+            window (int): Durations kept per stage for the rolling percentiles.
+            max_events (int): Spans kept for export_chrome() (oldest dropped first).
+        """
+        self.enabled = enabled
+        self.window = window
+        self._durations = {}
+        self._events = deque(maxlen=max_events)
+        self._threads = {}
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def set_frame(self, frameId):
+        """Frame id attached to spans opened on this thread without an explicit frame."""
+        self._local.frame = frameId
+
+    def span(self, name, frame=None):
+        """Context manager timing one stage; `frame` defaults to the thread's set_frame() id."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, frame)
+
+    def record(self, name, t0, t1, frame=None):
+        """Add a span measured elsewhere (perf_counter() start/end times)."""
+        if not self.enabled:
+            return
+        if frame is None:
+            frame = getattr(self._local, 'frame', None)
+        tid = threading.get_ident()
+        if tid not in self._threads:
+            self._threads[tid] = threading.current_thread().name
+        durations = self._durations.get(name)
+        if durations is None:
+            durations = self._durations.setdefault(name, deque(maxlen=self.window))
+        durations.append(t1 - t0)
+        self._events.append((name, t0, t1, tid, frame))
+
+    def percentiles(self):
+        """{stage: {'count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'}} over the rolling window."""
+        out = {}
+        for name, durations in list(self._durations.items()):
+            d = np.fromiter(list(durations), float) * 1e3
+            if d.size == 0:
+                continue
+            p50, p95, p99 = np.percentile(d, (50, 95, 99))
+            out[name] = {'count': int(d.size), 'mean_ms': float(d.mean()), 'p50_ms': float(p50),
+                         'p95_ms': float(p95), 'p99_ms': float(p99), 'max_ms': float(d.max())}
+        return out
+
+    def format_stats(self):
+        """One line per stage with its rolling percentiles."""
+        lines = []
+        for name, s in self.percentiles().items():
+            lines.append(f"{name:>14}: p50 {s['p50_ms']:7.2f} ms, p95 {s['p95_ms']:7.2f} ms, "
+                         f"p99 {s['p99_ms']:7.2f} ms ({s['count']} spans)")
+        return "\n".join(lines)
+
+    def chrome_events(self):
+        """Recorded spans as Chrome trace-event dicts (complete events, microseconds)."""
+        pid = os.getpid()
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                  for tid, name in list(self._threads.items())]
+        for name, t0, t1, tid, frame in list(self._events):
+            event = {'name': name, 'ph': 'X', 'pid': pid, 'tid': tid,
+                     'ts': round((t0 - self._origin) * 1e6, 3), 'dur': round((t1 - t0) * 1e6, 3)}
+            if frame is not None:
+                event['args'] = {'frame': frame}
+            events.append(event)
+        return events
+
+    def export_chrome(self, path):
+        """Write the recorded spans to `path` as Chrome trace-event JSON; returns the event count."""
+        events = self.chrome_events()
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return len(events)
+
+    def reset(self):
+        self._durations.clear()
+        self._events.clear()
+
+
+default_tracer = Tracer()
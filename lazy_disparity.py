@@ -0,0 +1,109 @@
+"""
+Band-limited, lazily computed disparity.
+
+findPath only reads a few row bands of the depth map (the obstacle slice just
+above yfloor and the rows below it used to back-project the path), and the 3D
+view only rows 100:yfloor. LazyDisparity matches and WLS-filters only the
+rows a consumer asks for, each run of rows padded with enough context
+for the SGBM block window / path aggregation and the WLS smoothing. Rows nobody
+asked for stay 0 (invalid) in `disparity`; asking for them later computes them
+then. Depth is read from `disparity` on demand (depth_lut.DepthMap), so it
+follows the rows as they are filled in. `reuse()` carries unchanged rows over from the previous
+frame (see change_gate.py).
+"""
+import threading
+import time
+
+import numpy as np
+from cv2 import ximgproc
+
+from latency_trace import default_tracer as tracer
+from stereo_matcher import default_cache
+
+# Matchers from the shared cache are not safe to run from two threads at once
+# (the disparity stage and a viewer asking for extra rows); the lock also covers
+# the computed/disparity bookkeeping of a request
+_compute_lock = threading.Lock()
+
+
+def row_runs(rows):
+    """[(y0, y1), ...] half-open runs of True in a boolean row mask."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], rows.view(np.int8), [0]))))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+class LazyDisparity:
+    """Disparity for one rectified frame, computed band by band on request."""
+
+    def __init__(self, grayL, grayR, guide, matcherParams, pad=48, cache=None):
+        """
+        Args:
+            grayL, grayR: Rectified grayscale images (same size).
+            guide: WLS guide image (rectified left, gray or BGR).
+            matcherParams (dict): get_matchers() parameters.
+            pad (int): Context rows added above and below each computed run.
+            cache (MatcherCache): Where the matcher triple comes from (default_cache if None).
+        """
+        self.grayL, self.grayR, self.guide = grayL, grayR, guide
+        self.matcherParams = matcherParams
+        self.pad = pad
+        self.cache = cache or default_cache
+
+        h, w = grayL.shape[:2]
+        self.disparity = np.zeros((h, w), np.uint8)          # like getDisparityVis output
+        self.computed = np.zeros(h, bool)
+        self.cost_sgbm = 0.0                                  # seconds spent matching
+        self.rows_matched = 0                                 # rows matched including padding
+
+    def reuse(self, previous, stale):
+        """
+        Take over the rows of `previous` (a LazyDisparity of the same size) that were
+        computed and are not marked in the boolean row mask `stale`; the remaining
+        rows are recomputed on request. Returns self.
+        """
+        keep = previous.computed & ~stale
+        self.disparity[keep] = previous.disparity[keep]
+        self.computed |= keep
+        return self
+
+    def request(self, bands):
+        """
+        Make sure every row in `bands` ([(y0, y1), ...], half-open, None = to the edge)
+        is computed. Returns self so calls can be chained.
+        """
+        h = self.computed.shape[0]
+        # Check, match and store under one lock: with change gating the same object
+        # is shared by the disparity stage and the main thread's viewer request
+        with _compute_lock:
+            want = np.zeros(h, bool)
+            for y0, y1 in bands:
+                want[slice(y0, y1)] = True
+            want &= ~self.computed
+            if not want.any():
+                return self
+
+            # Runs closer than two paddings share one padded window
+            runs = []
+            for y0, y1 in row_runs(want):
+                if runs and y0 - runs[-1][1] <= 2 * self.pad:
+                    runs[-1] = (runs[-1][0], y1)
+                else:
+                    runs.append((y0, y1))
+
+            stereoL, stereoR, wls = self.cache.get(**self.matcherParams)
+            for y0, y1 in runs:
+                a, b = max(0, y0 - self.pad), min(h, y1 + self.pad)
+                gL, gR = self.grayL[a:b], self.grayR[a:b]
+                t1 = time.perf_counter()
+                with tracer.span('sgbm'):
+                    dispL = stereoL.compute(gL, gR)
+                with tracer.span('right_matcher'):
+                    dispR = stereoR.compute(gR, gL)
+                self.cost_sgbm += time.perf_counter() - t1
+                with tracer.span('wls'):
+                    dispFiltered = wls.filter(dispL, self.guide[a:b], None, dispR)
+                self.rows_matched += b - a
+
+                self.disparity[y0:y1] = ximgproc.getDisparityVis(dispFiltered)[y0 - a:y1 - a]
+                self.computed[y0:y1] = True
+        return self
@@ -0,0 +1,290 @@
+"""
+Lightweight MJPEG client for the ESP32-CAM HTTP server.
+
+Replaces `cv2.VideoCapture("http://<ip>:81/stream")` (and FFmpeg's probing,
+buffering and reconnect logic) with a persistent HTTP connection per camera.
+Incoming bytes go into a reusable `bytearray`; multipart boundaries are located
+with `bytearray.find()` on index ranges and frames are sliced through a
+`memoryview`, so scanning never copies the stream. Each frame is returned as
+raw JPEG bytes plus its arrival time (`time.monotonic()`); decoding is up to
+the caller. `MjpegCapture` wraps a stream in the VideoCapture interface so it
+can be dropped in wherever the loops open a capture today.
+"""
+import http.client
+import threading
+import time
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+
+DEFAULT_BOUNDARY = b"123456789000000000000987654321"  # esp32-camera app_httpd.c
+
+
+class MjpegStream:
+    """One persistent multipart/x-mixed-replace connection."""
+
+    def __init__(self, url, timeout=5.0, buffer_size=256 * 1024, chunk_size=32 * 1024):
+        """
+        Args:
+            url (str): Stream URL, e.g. "http://192.168.0.159:81/stream".
+            timeout (float): Socket timeout in seconds.
+            buffer_size (int): Initial size of the receive buffer (grows for larger frames).
+            chunk_size (int): Max bytes requested from the socket per read.
+        """
+        self.url = url
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+
+        self._buf = bytearray(buffer_size)
+        self._view = memoryview(self._buf)
+        self._start = 0     # first unconsumed byte
+        self._end = 0       # one past the last received byte
+        self._conn = None
+        self._resp = None
+        self._delim = b"--" + DEFAULT_BOUNDARY
+
+        self.frames = 0
+        self.bytes_received = 0
+        self.reconnects = 0
+
+    def open(self):
+        """(Re)connect and read the response headers; returns True on success."""
+        self.close()
+        parts = urlsplit(self.url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        try:
+            self._conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=self.timeout)
+            self._conn.request("GET", path, headers={"Connection": "keep-alive"})
+            self._resp = self._conn.getresponse()
+        except (OSError, http.client.HTTPException) as e:
+            print(f"Error: Could not open MJPEG stream {self.url}: {e}")
+            self.close()
+            return False
+        if self._resp.status != 200:
+            print(f"Error: MJPEG stream {self.url} -> status code: {self._resp.status}")
+            self.close()
+            return False
+
+        ctype = self._resp.getheader("Content-Type", "")
+        if "boundary=" in ctype:
+            boundary = ctype.split("boundary=", 1)[1].split(";", 1)[0].strip().strip('"')
+            self._delim = (boundary if boundary.startswith("--") else "--" + boundary).encode("latin-1")
+        self._start = self._end = 0
+        return True
+
+    def isOpened(self):
+        return self._resp is not None
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = None
+        self._resp = None
+
+    def _fill(self):
+        """Append the next chunk from the socket to the buffer."""
+        data = self._resp.read1(self.chunk_size)
+        if not data:
+            raise ConnectionError(f"MJPEG stream {self.url} closed by peer")
+        n = len(data)
+        if self._end + n > len(self._buf):
+            self._compact(n)
+        self._view[self._end:self._end + n] = data
+        self._end += n
+        self.bytes_received += n
+
+    def _compact(self, incoming):
+        """Move unconsumed bytes to the front, growing the buffer only if a frame needs it."""
+        pending = self._end - self._start
+        if pending + incoming > len(self._buf):
+            grown = bytearray(max(2 * len(self._buf), pending + incoming))
+            grown[:pending] = self._view[self._start:self._end]
+            self._buf = grown
+            self._view = memoryview(self._buf)
+        elif pending:
+            self._view[:pending] = self._view[self._start:self._end]
+        self._start, self._end = 0, pending
+
+    def _find(self, needle, rel):
+        """Offset (from the first unconsumed byte) of `needle` at or after `rel`, reading as needed."""
+        while True:
+            idx = self._buf.find(needle, self._start + rel, self._end)
+            if idx >= 0:
+                return idx - self._start
+            # Resume just before the end so a needle split across two reads still matches
+            rel = max(rel, self._end - self._start - len(needle) + 1)
+            self._fill()
+
+    def _ensure(self, n):
+        """Read until at least `n` unconsumed bytes are buffered."""
+        while self._end - self._start < n:
+            self._fill()
+
+    def _read_part(self):
+        """Parse one multipart part; returns the JPEG memoryview (valid until the next read)."""
+        # _find may compact the buffer (resetting _start), so read _start only after it returns
+        skip = self._find(self._delim, 0)          # skip anything before the delimiter
+        self._start += skip
+        hdr_start = len(self._delim)
+        hdr_end = self._find(b"\r\n\r\n", hdr_start)
+        body_start = hdr_end + 4
+
+        length = None
+        headers = self._view[self._start + hdr_start:self._start + hdr_end].tobytes()
+        for line in headers.split(b"\r\n"):
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                length = int(value)
+
+        if length is not None:
+            self._ensure(body_start + length)
+            body_end = body_start + length
+        else:
+            body_end = self._find(self._delim, body_start)
+            while body_end > body_start and self._buf[self._start + body_end - 1] in b"\r\n":
+                body_end -= 1
+        jpeg = self._view[self._start + body_start:self._start + body_end]
+        self._start += body_end
+        return jpeg
+
+    def read_jpeg(self):
+        """
+        Block until the next frame arrives.
+        Returns:
+            tuple: (jpeg bytes, arrival timestamp), or (None, None) if the stream failed.
+        """
+        if self._resp is None and not self.open():
+            return None, None
+        try:
+            jpeg = self._read_part()
+        except (OSError, ValueError, ConnectionError, http.client.HTTPException) as e:
+            print(f"MJPEG stream {self.url} failed: {e}")
+            self.close()
+            self.reconnects += 1
+            return None, None
+        timestamp = time.monotonic()
+        self.frames += 1
+        return bytes(jpeg), timestamp
+
+
+class MjpegPool:
+    """
+    Persistent connections per camera: one MjpegStream per stream URL plus keep-alive `/capture`.
+    Streams are reference counted: every stream() call must be matched by a release(), and
+    the connection is closed when the last user releases it (or on close_all()).
+    """
+
+    def __init__(self, timeout=5.0):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._streams = {}
+        self._users = {}    # url -> number of stream() calls not yet released
+        self._http = {}
+
+    def stream(self, url):
+        """Shared, opened MjpegStream for `url` (counts one more user)."""
+        with self._lock:
+            s = self._streams.get(url)
+            if s is None:
+                s = self._streams[url] = MjpegStream(url, self.timeout)
+            self._users[url] = self._users.get(url, 0) + 1
+        if not s.isOpened():
+            s.open()
+        return s
+
+    def release(self, url):
+        """Drop one user of the stream for `url`; the last one closes its connection."""
+        with self._lock:
+            users = self._users.get(url, 0) - 1
+            if users > 0:
+                self._users[url] = users
+                return
+            self._users.pop(url, None)
+            s = self._streams.get(url)
+            if s is not None:
+                s.close()
+
+    def capture(self, url):
+        """Fetch a single JPEG (e.g. http://<ip>/capture) over a keep-alive connection."""
+        parts = urlsplit(url)
+        key = (parts.hostname, parts.port or 80)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        for attempt in range(2):
+            with self._lock:
+                conn = self._http.get(key)
+                if conn is None:
+                    conn = self._http[key] = http.client.HTTPConnection(*key, timeout=self.timeout)
+            try:
+                conn.request("GET", path, headers={"Connection": "keep-alive"})
+                resp = conn.getresponse()
+                data = resp.read()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                with self._lock:
+                    self._http.pop(key, None)
+                if attempt:
+                    print(f"Error capturing from {url}: {e}")
+                continue
+            if resp.status != 200:
+                print(f"Error capturing from {url} -> status code: {resp.status}")
+                return None
+            return data
+        return None
+
+    def close_all(self):
+        with self._lock:
+            for s in self._streams.values():
+                s.close()
+            for conn in self._http.values():
+                conn.close()
+            self._streams.clear()
+            self._users.clear()
+            self._http.clear()
+
+
+default_pool = MjpegPool()
+
+
+class MjpegCapture:
+    """
+    cv2.VideoCapture-compatible wrapper around a pooled MjpegStream.
+    With decode=False, read() returns the raw JPEG bytes as the frame so the consumer
+    can decode only the frames it actually processes (see frame_decode.py).
+    """
+
+    def __init__(self, url, pool=None, flags=cv2.IMREAD_COLOR, decode=True):
+        self.pool = pool or default_pool
+        self.flags = flags
+        self.decode = decode
+        self.stream = self.pool.stream(url)
+        self.last_timestamp = None
+        self._released = False
+
+    def isOpened(self):
+        return not self._released and self.stream.isOpened()
+
+    def read_jpeg(self):
+        if self._released:
+            return None, None
+        jpeg, self.last_timestamp = self.stream.read_jpeg()
+        return jpeg, self.last_timestamp
+
+    def read(self):
+        jpeg, _ = self.read_jpeg()
+        if jpeg is None:
+            return False, None
+        if not self.decode:
+            return True, jpeg
+        frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), self.flags)
+        return frame is not None, frame
+
+    def release(self):
+        """Detach from the pooled stream; its connection stays open while other captures use it."""
+        if not self._released:
+            self._released = True
+            self.pool.release(self.stream.url)
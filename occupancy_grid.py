@@ -0,0 +1,77 @@
+"""
+Compact occupancy grid for the planner.
+
+The grid findPath builds is fully described by one number per column: the
+depth (in grid rows) up to which the column is free, i.e. the nearest obstacle
+Z in the floor slice. The dense version used to be built every frame with
+`np.mgrid` + `np.where` (several int64 H x W arrays); OccupancyGrid keeps just
+the uint8 free-depth profile and answers queries from it.
+
+Cell values follow the `pathfinding` Grid convention the planner uses:
+1 = free (walkable, in front of the obstacle), 0 = blocked.
+"""
+import numpy as np
+
+
+class OccupancyGrid:
+    """Per-column free-depth profile with on-demand dense/bit-packed views."""
+
+    def __init__(self, depth, height):
+        """
+        Args:
+            depth (np.ndarray): Free cells per column, counted from row 0 (uint8, <= height).
+            height (int): Number of grid rows.
+        """
+        self.depth = np.asarray(depth, np.uint8)
+        self.height = int(height)
+        self._dense = None
+
+    @classmethod
+    def from_obstacles(cls, obstacles, blocked_cols=0):
+        """
+        Grid for per-column obstacle depths (float, e.g. min Z over the floor slice).
+        Row y of column x is free while y < obstacles[x], the same cells as
+        `np.where(np.mgrid[0:amax(obstacles), 0:W][0] >= obstacles, 0, 1)`.
+        Args:
+            obstacles (np.ndarray): Obstacle depth per column (0..255).
+            blocked_cols (int): Leading columns marked blocked (outside the valid disparity area).
+        """
+        depth = np.ceil(obstacles).astype(np.uint8)
+        height = int(depth.max()) if depth.size else 0
+        depth[:blocked_cols] = 0
+        return cls(depth, height)
+
+    @property
+    def shape(self):
+        return (self.height, self.depth.shape[0])
+
+    def is_free(self, x, y):
+        """True if cell (x, y) is inside the grid and free (x, y may be arrays)."""
+        x, y = np.asarray(x), np.asarray(y)
+        inside = (x >= 0) & (x < self.depth.shape[0]) & (y >= 0) & (y < self.height)
+        return inside & (y < self.depth[np.clip(x, 0, self.depth.shape[0] - 1)])
+
+    def free_count(self):
+        return int(self.depth.sum())
+
+    def dense(self):
+        """uint8 H x W view (1 = free), built on first use and cached."""
+        if self._dense is None:
+            self._dense = (np.arange(self.height, dtype=np.uint8)[:, None] < self.depth).view(np.uint8)
+        return self._dense
+
+    def packed(self):
+        """Dense grid bit-packed along rows (H x ceil(W/8) uint8), e.g. for sending/logging."""
+        return np.packbits(self.dense(), axis=1)
+
+    def last_free(self, width=None):
+        """
+        Farthest free cell among the first `width` columns: the highest free row, and
+        in it the right-most free column. (x, y); (width-1, height-1) if nothing is free.
+        This is the cell `np.argmax(np.flip(grid[:, :width]))` picks on the dense grid.
+        """
+        depth = self.depth[:width]
+        top = int(depth.max()) if depth.size else 0
+        if top == 0:
+            return depth.shape[0] - 1, self.height - 1
+        return int(np.flatnonzero(depth == top)[-1]), top - 1
@@ -0,0 +1,171 @@
+"""
+Offline replay of recorded stereo pairs.
+
+ReplayGrabber stands in for StereoGrabber, so stored pairs go through the same
+buildPipeline (rectify -> computeDisparity -> findPath) as the live
+ESP32-CAM streams:
+
+    grabber = ReplayGrabber(find_pairs("calib_images"), timing='fast')
+    pipe = buildPipeline(grabber, params)
+
+Supported layouts (find_pairs):
+    <dir>/stereoLeft/imageL<n>.png + <dir>/stereoRight/imageR<n>.png   (capture_calibration_pairs.py)
+    <dir>/L_frame_<n>.jpg + <dir>/R_frame_<n>.jpg                      (test_2.py recordFrames)
+
+Files are read into memory at start() and handed out as encoded bytes, exactly
+like MjpegCapture(decode=False) frames, so decoding stays in the pipeline.
+
+Timing:
+    'fast'      every wait_latest() returns the next pair at once (throughput runs);
+                buildPipeline then uses blocking queues, so no pair is dropped
+    'original'  pairs become available at their recorded times (file modification
+                times, as written by FrameRecorder); a consumer that falls behind
+                gets the newest due pair and skips the rest, like the live grabber
+    <float>     a fixed rate in pairs per second, with the same skipping
+"""
+import glob
+import os
+import re
+import threading
+import time
+
+
+def _number(path):
+    m = re.findall(r"\d+", os.path.basename(path))
+    return int(m[-1]) if m else -1
+
+
+def find_pairs(path):
+    """[(left file, right file), ...] in recording order for a replay directory."""
+    left = glob.glob(os.path.join(path, "stereoLeft", "imageL*.png"))
+    if left:
+        pairs = [(l, os.path.join(path, "stereoRight", os.path.basename(l).replace("imageL", "imageR")))
+                 for l in left]
+    else:
+        pairs = [(l, os.path.join(path, os.path.basename(l).replace("L_frame_", "R_frame_", 1)))
+                 for l in glob.glob(os.path.join(path, "L_frame_*"))]
+    pairs = [p for p in pairs if os.path.isfile(p[1])]
+    pairs.sort(key=lambda p: _number(p[0]))
+    return pairs
+
+
+class ReplayGrabber:
+    """StereoGrabber-compatible source that replays stored pairs."""
+
+    def __init__(self, pairs, timing='fast', loop=False, limit=None):
+        """
+        Args:
+            pairs (list): (left path, right path) tuples, e.g. from find_pairs().
+            timing: 'fast', 'original' or a rate in pairs per second (see module docstring).
+            loop (bool): Start over after the last pair instead of finishing.
+            limit (int): Total pairs to hand out (None = one pass, or endless with loop).
+        """
+        if not pairs:
+            raise ValueError("No stereo pairs to replay")
+        self.pairs = pairs
+        self.timing = timing
+        self.loop = loop
+        self.limit = limit
+        self._frames = []
+        self._times = []
+        self._cond = threading.Condition()
+        self._next = 0          # index of the next pair to hand out
+        self._t0 = None
+        self._period = 0.0      # duration of one pass (for looping)
+        self._stopped = False
+
+        self.delivered = 0
+        self.skipped = 0        # due pairs replaced by a newer one before being read
+        self.finished = False
+
+    def start(self):
+        self._frames = []
+        for l, r in self.pairs:
+            with open(l, 'rb') as fl, open(r, 'rb') as fr:
+                self._frames.append((fl.read(), fr.read()))
+        n = len(self.pairs)
+        if self.timing == 'original':
+            mtimes = [os.path.getmtime(l) for l, _ in self.pairs]
+            self._times = [t - mtimes[0] for t in mtimes]
+            if self._times[-1] <= 0:
+                print("Replay: recordings carry no timing (equal mtimes), replaying as fast as possible")
+                self.timing = 'fast'
+            else:
+                self._period = self._times[-1] * n / (n - 1)
+        elif self.timing != 'fast':
+            rate = float(self.timing)
+            self._times = [i / rate for i in range(n)]
+            self._period = n / rate
+        self._t0 = time.monotonic()
+        self._next = 0
+        self._stopped = False
+        self.finished = False
+        return True
+
+    @property
+    def lossless(self):
+        """True in 'fast' mode: every pair is meant to be processed, so pipelines should block, not drop."""
+        return self.timing == 'fast'
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def _due(self, i):
+        """Monotonic time pair i (counting across loops) is released."""
+        n = len(self._frames)
+        return self._t0 + (i // n) * self._period + self._times[i % n]
+
+    def _exhausted(self, i):
+        if self.limit is not None and self.delivered >= self.limit:
+            return True
+        return not self.loop and i >= len(self._frames)
+
+    def get_latest(self):
+        """Non-blocking: the newest pair that is due and not handed out yet, or (None, None)."""
+        with self._cond:
+            return self._take(time.monotonic())
+
+    def _take(self, now):
+        i = self._next
+        if self._exhausted(i):
+            self.finished = True
+            return None, None
+        if self.timing != 'fast':
+            if self._due(i) > now:
+                return None, None
+            # Skip to the newest due pair, as a live camera would have moved on
+            while not self._exhausted(i + 1) and self._due(i + 1) <= now:
+                i += 1
+                self.skipped += 1
+        self._next = i + 1
+        self.delivered += 1
+        return self._frames[i % len(self._frames)]
+
+    def wait_latest(self, timeout=1.0):
+        """Blocking variant of get_latest() that gives up after `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._stopped:
+                now = time.monotonic()
+                pair = self._take(now)
+                if pair[0] is not None:
+                    return pair
+                if now >= deadline:
+                    return None, None
+                # Finished replays wait like a silent camera instead of spinning the caller
+                due = deadline if self.finished or self.timing == 'fast' else min(deadline, self._due(self._next))
+                self._cond.wait(max(0.0, due - now))
+        return None, None
+
+    def stats(self):
+        return {'pairs': len(self.pairs), 'delivered': self.delivered, 'skipped': self.skipped,
+                'finished': self.finished}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
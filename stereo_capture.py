@@ -0,0 +1,306 @@
+"""
+Threaded capture for the ESP32-CAM MJPEG streams.
+
+`cv2.VideoCapture.read()` returns the *oldest* buffered frame, so a processing
+loop that is slower than the camera falls further and further behind. Here each
+camera gets a reader thread that drains the stream continuously and keeps only
+the newest decoded frame; the planner asks for the latest pair without blocking.
+
+The two ESP32s free-run, so the newest left and right frames are not
+necessarily simultaneous. StereoSynchronizer stamps frames on arrival and only
+releases pairs whose timestamps are within a tolerance.
+"""
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+class LatestFrameGrabber:
+    """Reader thread for one camera that keeps only the newest frame."""
+
+    def __init__(self, url, name=None, open_capture=cv2.VideoCapture, reopen_after=30, on_frame=None):
+        """
+        Args:
+            url (str): Stream URL, e.g. "http://192.168.0.159:81/stream".
+            name (str): Label used in log messages (defaults to the URL).
+            open_capture (callable): Factory returning an object with read()/isOpened()/release().
+            reopen_after (int): Consecutive failed reads before the stream is reopened.
+            on_frame (callable): Optional on_frame(frame, timestamp), called from the reader thread.
+        """
+        self.url = url
+        self.name = name or url
+        self.open_capture = open_capture
+        self.reopen_after = reopen_after
+        self.on_frame = on_frame
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._frame_id = 0       # id of the newest frame (0 = none yet)
+        self._consumed_id = 0    # id of the last frame handed out
+        self._timestamp = 0.0    # time.monotonic() at arrival of the newest frame
+        self._running = False
+        self._thread = None
+        self._cap = None
+
+        self.frames = 0          # frames decoded
+        self.dropped = 0         # frames overwritten before anyone consumed them (without on_frame;
+                                 # with it, e.g. a StereoSynchronizer, the consumer counts its drops)
+        self.read_errors = 0
+
+    def start(self):
+        self._cap = self.open_capture(self.url)
+        if not self._cap.isOpened():
+            print(f"Error: Could not open stream {self.name}")
+            return False
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"grab-{self.name}", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        with self._cond:
+            self._cond.notify_all()
+
+    def _run(self):
+        failures = 0
+        while self._running:
+            ret, frame = self._cap.read()
+            if not ret or frame is None:
+                self.read_errors += 1
+                failures += 1
+                if failures >= self.reopen_after:
+                    print(f"Stream {self.name} stalled, reopening...")
+                    self._cap.release()
+                    self._cap = self.open_capture(self.url)
+                    failures = 0
+                time.sleep(0.01)
+                continue
+            failures = 0
+            # MjpegCapture stamps frames on arrival, before decode
+            timestamp = getattr(self._cap, 'last_timestamp', None) or time.monotonic()
+            self._publish(frame, timestamp)
+
+    def _publish(self, frame, timestamp):
+        with self._cond:
+            if self.on_frame is None and self._frame_id != self._consumed_id:
+                self.dropped += 1
+            self._frame = frame
+            self._frame_id += 1
+            self._timestamp = timestamp
+            self.frames += 1
+            self._cond.notify_all()
+        if self.on_frame is not None:
+            self.on_frame(frame, timestamp)
+
+    def get_latest(self, only_new=True):
+        """
+        Non-blocking: return (frame, frame_id, timestamp) for the newest frame.
+        With only_new, a frame already handed out is not returned again (frame is None).
+        """
+        with self._cond:
+            if self._frame_id == 0 or (only_new and self._frame_id == self._consumed_id):
+                return None, self._frame_id, self._timestamp
+            self._consumed_id = self._frame_id
+            return self._frame, self._frame_id, self._timestamp
+
+    def wait_new(self, timeout=None):
+        """Block until a frame newer than the last consumed one exists; False on timeout/stop."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._frame_id != self._consumed_id or not self._running, timeout)
+
+    def stats(self):
+        return {'frames': self.frames, 'dropped': self.dropped, 'read_errors': self.read_errors}
+
+
+class StereoSynchronizer:
+    """Pairs left/right frames by nearest arrival timestamp within a tolerance."""
+
+    def __init__(self, tolerance=0.030, buffer_size=8, history=1000):
+        """
+        Args:
+            tolerance (float): Max |t_left - t_right| in seconds for a valid pair.
+            buffer_size (int): Frames kept per camera while waiting for a partner.
+            history (int): Number of recent candidate skews kept for statistics.
+        """
+        self.tolerance = tolerance
+        self._buffers = {'L': deque(maxlen=buffer_size), 'R': deque(maxlen=buffer_size)}
+        self._ids = {'L': 0, 'R': 0}
+        self._cond = threading.Condition()
+        self._last_rejected = None
+
+        self.accepted = 0
+        self.rejected = 0
+        self.overflow = {'L': 0, 'R': 0}    # frames pushed out of a full buffer without a partner
+        self.unmatched = {'L': 0, 'R': 0}   # frames discarded as older than a released pair
+        self.skews = deque(maxlen=history)           # |skew| of every candidate pair (s)
+        self.accepted_skews = deque(maxlen=history)  # |skew| of pairs handed out (s)
+
+    def push(self, side, frame, timestamp=None):
+        """Add a frame from camera `side` ('L'/'R'), stamped now unless `timestamp` is given."""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        with self._cond:
+            self._ids[side] += 1
+            buf = self._buffers[side]
+            if len(buf) == buf.maxlen:
+                self.overflow[side] += 1
+            buf.append((timestamp, self._ids[side], frame))
+            self._cond.notify_all()
+
+    def _candidate(self):
+        """Newest left frame and its nearest right frame, or None if a buffer is empty."""
+        bufL, bufR = self._buffers['L'], self._buffers['R']
+        if not bufL or not bufR:
+            return None
+        best = None
+        for iL in range(len(bufL) - 1, -1, -1):
+            tL = bufL[iL][0]
+            iR = min(range(len(bufR)), key=lambda i: abs(bufR[i][0] - tL))
+            skew = bufR[iR][0] - tL
+            if best is None:
+                best = (iL, iR, skew)
+            if abs(skew) <= self.tolerance:
+                return iL, iR, skew
+        return best
+
+    def get_pair(self):
+        """
+        Non-blocking: return (imgL, imgR, skew_seconds) for the freshest pair within
+        tolerance, or None. Frames older than a released pair are discarded.
+        """
+        with self._cond:
+            cand = self._candidate()
+            if cand is None:
+                return None
+            iL, iR, skew = cand
+            bufL, bufR = self._buffers['L'], self._buffers['R']
+            ids = (bufL[iL][1], bufR[iR][1])
+            if abs(skew) > self.tolerance:
+                if ids != self._last_rejected:
+                    self._last_rejected = ids
+                    self.rejected += 1
+                    self.skews.append(abs(skew))
+                return None
+            imgL, imgR = bufL[iL][2], bufR[iR][2]
+            for _ in range(iL + 1):
+                bufL.popleft()
+            for _ in range(iR + 1):
+                bufR.popleft()
+            self.unmatched['L'] += iL
+            self.unmatched['R'] += iR
+            self.accepted += 1
+            self.skews.append(abs(skew))
+            self.accepted_skews.append(abs(skew))
+            return imgL, imgR, skew
+
+    def wait_pair(self, timeout=None):
+        """Block until get_pair() yields a pair; None on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                pair = self.get_pair()
+                if pair is not None:
+                    return pair
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def stats(self):
+        """Pair counts and skew percentiles in milliseconds."""
+        out = {'accepted': self.accepted, 'rejected': self.rejected,
+               'overflow': dict(self.overflow), 'unmatched': dict(self.unmatched),
+               'tolerance_ms': self.tolerance * 1e3}
+        for key, skews in (('skew', self.skews), ('accepted_skew', self.accepted_skews)):
+            if skews:
+                ms = np.asarray(skews) * 1e3
+                out[key + '_ms'] = {'mean': float(ms.mean()), 'p50': float(np.percentile(ms, 50)),
+                                    'p95': float(np.percentile(ms, 95)), 'max': float(ms.max())}
+        return out
+
+
+class StereoGrabber:
+    """Left/right LatestFrameGrabber pair, optionally timestamp-synchronized."""
+
+    def __init__(self, left_url, right_url, open_capture=cv2.VideoCapture, sync_tolerance=None,
+                 sync_buffer=8):
+        """
+        Args:
+            left_url, right_url (str): Stream URLs.
+            open_capture (callable): Capture factory passed to both grabbers.
+            sync_tolerance (float): If set, only pairs whose arrival times differ by at most
+                this many seconds are returned (see StereoSynchronizer).
+            sync_buffer (int): Frames kept per camera by the synchronizer.
+        """
+        self.sync = None
+        on_left = on_right = None
+        if sync_tolerance is not None:
+            self.sync = StereoSynchronizer(sync_tolerance, sync_buffer)
+            on_left = lambda frame, ts: self.sync.push('L', frame, ts)
+            on_right = lambda frame, ts: self.sync.push('R', frame, ts)
+        self.left = LatestFrameGrabber(left_url, "left", open_capture, on_frame=on_left)
+        self.right = LatestFrameGrabber(right_url, "right", open_capture, on_frame=on_right)
+
+    def start(self):
+        if not self.left.start():
+            return False
+        if not self.right.start():
+            self.left.stop()
+            return False
+        return True
+
+    def stop(self):
+        self.left.stop()
+        self.right.stop()
+
+    def get_latest(self):
+        """
+        Non-blocking: return the freshest (imgL, imgR) pair, or (None, None) until both
+        cameras have produced a frame the caller has not seen yet. When synchronized,
+        pairs outside the tolerance are never returned.
+        """
+        if self.sync is not None:
+            pair = self.sync.get_pair()
+            return (None, None) if pair is None else pair[:2]
+        with self.left._cond, self.right._cond:
+            if (self.left._frame_id in (0, self.left._consumed_id) or
+                    self.right._frame_id in (0, self.right._consumed_id)):
+                return None, None
+        imgL, _, _ = self.left.get_latest()
+        imgR, _, _ = self.right.get_latest()
+        return imgL, imgR
+
+    def wait_latest(self, timeout=1.0):
+        """Blocking variant of get_latest() that gives up after `timeout` seconds."""
+        if self.sync is not None:
+            pair = self.sync.wait_pair(timeout)
+            return (None, None) if pair is None else pair[:2]
+        deadline = time.monotonic() + timeout
+        for cam in (self.left, self.right):
+            if not cam.wait_new(max(0.0, deadline - time.monotonic())):
+                return None, None
+        return self.get_latest()
+
+    def stats(self):
+        out = {'left': self.left.stats(), 'right': self.right.stats()}
+        if self.sync is not None:
+            out['sync'] = self.sync.stats()
+        return out
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
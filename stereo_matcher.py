@@ -0,0 +1,203 @@
+"""
+Memoized StereoSGBM / right-matcher / WLS-filter triples.
+
+Creating the matchers and the WLS filter allocates internal buffers, so doing it
+every frame is wasted work. `get_matchers()` returns a configured triple for a
+full parameter set, reusing a warm one when the same parameters were seen
+before. A small LRU bound keeps live parameter tuning from accumulating objects.
+
+PyramidMatcher is a coarse-to-fine alternative that searches the full
+disparity range only at reduced resolution.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+import cv2
+import numpy as np
+from cv2 import ximgproc
+
+MatcherParams = namedtuple('MatcherParams', [
+    'minDisparity', 'numDisparities', 'blockSize', 'P1', 'P2', 'disp12MaxDiff',
+    'preFilterCap', 'uniquenessRatio', 'speckleWindowSize', 'speckleRange', 'mode',
+    'lam', 'sigma', 'discontinuityRad'])
+
+
+def make_params(minDisparity=0, numDisparities=96, blockSize=9, P1=0, P2=0, disp12MaxDiff=0,
+                preFilterCap=0, uniquenessRatio=0, speckleWindowSize=0, speckleRange=0,
+                mode=cv2.StereoSGBM_MODE_SGBM, lam=32000, sigma=2.5, discontinuityRad=4):
+    """MatcherParams with StereoSGBM_create's defaults for anything not given."""
+    return MatcherParams(int(minDisparity), int(numDisparities), int(blockSize), int(P1), int(P2),
+                         int(disp12MaxDiff), int(preFilterCap), int(uniquenessRatio),
+                         int(speckleWindowSize), int(speckleRange), int(mode),
+                         float(lam), float(sigma), int(discontinuityRad))
+
+
+def create_matchers(p):
+    """Build (stereoL, stereoR, wls) for MatcherParams `p`."""
+    stereoL = cv2.StereoSGBM_create(
+        minDisparity=p.minDisparity,
+        numDisparities=p.numDisparities,
+        blockSize=p.blockSize,
+        P1=p.P1,
+        P2=p.P2,
+        disp12MaxDiff=p.disp12MaxDiff,
+        preFilterCap=p.preFilterCap,
+        uniquenessRatio=p.uniquenessRatio,
+        speckleWindowSize=p.speckleWindowSize,
+        speckleRange=p.speckleRange,
+        mode=p.mode)
+    stereoR = ximgproc.createRightMatcher(stereoL)
+    wls = ximgproc.createDisparityWLSFilter(stereoL)
+    wls.setLambda(p.lam)
+    wls.setDepthDiscontinuityRadius(p.discontinuityRad)
+    wls.setSigmaColor(p.sigma)
+    return stereoL, stereoR, wls
+
+
+class MatcherCache:
+    """LRU cache of matcher triples keyed by MatcherParams."""
+
+    def __init__(self, maxsize=4):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, **kwargs):
+        """(stereoL, stereoR, wls) for the given parameters (see make_params for names)."""
+        key = make_params(**kwargs)
+        with self._lock:
+            triple = self._entries.get(key)
+            if triple is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return triple
+            self.misses += 1
+            triple = create_matchers(key)
+            self._entries[key] = triple
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return triple
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self._entries)}
+
+
+default_cache = MatcherCache()
+
+
+def get_matchers(**kwargs):
+    """Shorthand for default_cache.get(**kwargs)."""
+    return default_cache.get(**kwargs)
+
+
+class PyramidMatcher:
+    """
+    Coarse-to-fine disparity.
+
+    1. SGBM + right matcher + WLS at 1/scale resolution (range nDisp/scale).
+    2. Upsample the coarse left (filtered) and right (raw) disparities to full resolution.
+    3. Re-match every pixel at full resolution over its own range, the coarse
+       estimate +/- band: SAD over blockSize x blockSize windows plus a parabola
+       fit for the subpixel offset. A minimum on the edge of the band means the
+       match lies outside it, so the pixel is left invalid instead.
+    4. Confidence WLS filter guided by the left image. The left-right check runs
+       against the coarse right disparity, so refined values that disagree with
+       it get low confidence, and invalid pixels are filled from their neighbours.
+    """
+
+    def __init__(self, scale=2, band=4, cache=None):
+        """
+        Args:
+            scale (int): Coarse level downscale factor (2 = half, 4 = quarter resolution).
+            band (int): Half-width in full-resolution pixels of the per-pixel search range.
+            cache (MatcherCache): Cache for the coarse matcher triple (default_cache if None).
+        """
+        self.scale = scale
+        self.band = band
+        self.cache = cache or default_cache
+        self._wls = {}      # MatcherParams -> full-resolution confidence WLS filter
+
+    def _search(self, grayL, grayR, coarse, blockSize):
+        """
+        Per-pixel band search: disparity (px, float32) and the mask of pixels whose
+        best match lies strictly inside coarse +/- band.
+        """
+        h, w = grayL.shape
+        mapx = np.arange(w, dtype=np.float32)[None, :] - (coarse - self.band)
+        mapy = np.repeat(np.arange(h, dtype=np.float32)[:, None], w, 1)
+        last = 2 * self.band
+        best = arg = lower = upper = prev = None
+        for i in range(last + 1):
+            shifted = cv2.remap(grayR, mapx, mapy, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+            mapx -= 1
+            cost = cv2.boxFilter(cv2.absdiff(grayL, shifted), cv2.CV_32F, (blockSize, blockSize),
+                                 normalize=False)
+            if best is None:
+                best, arg = cost, np.zeros((h, w), np.uint8)
+                lower, upper = cost.copy(), cost.copy()
+                prev = cost
+                continue
+            np.copyto(upper, cost, where=arg == i - 1)
+            better = cost < best
+            np.copyto(lower, prev, where=better)
+            np.copyto(best, cost, where=better)
+            arg[better] = i
+            prev = cost
+        curvature = np.maximum(lower - 2 * best + upper, 1e-3)
+        offset = np.clip((lower - upper) / (2 * curvature), -0.5, 0.5)
+        return coarse + (arg - np.float32(self.band)) + offset, (arg > 0) & (arg < last)
+
+    def compute(self, grayL, grayR, guide, **kwargs):
+        """
+        Same inputs/units as the full-resolution path: returns the filtered disparity
+        (int16, 1/16 pixel) for grayL's size. kwargs are the get_matchers parameters.
+        """
+        p = make_params(**kwargs)
+        s = self.scale
+        h, w = grayL.shape[:2]
+        small = ((w + s - 1) // s, (h + s - 1) // s)
+
+        # 1. Coarse level
+        coarse_p = p._replace(minDisparity=p.minDisparity // s,
+                              numDisparities=max(16, p.numDisparities // s // 16 * 16))
+        stereoL, stereoR, wls = self.cache.get(**coarse_p._asdict())
+        sL = cv2.resize(grayL, small, interpolation=cv2.INTER_AREA)
+        sR = cv2.resize(grayR, small, interpolation=cv2.INTER_AREA)
+        sG = cv2.resize(guide, small, interpolation=cv2.INTER_AREA)
+        dispR = stereoR.compute(sR, sL)
+        dispC = wls.filter(stereoL.compute(sL, sR), sG, None, dispR)
+
+        # 2. Upsample (values scale with resolution)
+        coarse = cv2.resize(dispC, (w, h), interpolation=cv2.INTER_LINEAR).astype(np.float32) * (s / 16)
+        right = cv2.resize(dispR, (w, h), interpolation=cv2.INTER_NEAREST).astype(np.int32) * s
+
+        # 3. Per-pixel refinement within coarse +/- band
+        disp, inside = self._search(grayL, grayR, coarse, p.blockSize)
+        keep = inside & (coarse > p.minDisparity)
+        dispL = np.where(keep, np.round(disp * 16), 16 * (p.minDisparity - 1)).astype(np.int16)
+
+        # 4. Edge-aware smoothing weighted by the left-right confidence
+        wls_refine = self._wls.get(p)
+        if wls_refine is None:
+            wls_refine = self._wls[p] = create_matchers(p)[2]
+        return wls_refine.filter(dispL, guide, None, np.clip(right, -32768, 32767).astype(np.int16))
+
+
+_pyramid_matchers = {}
+
+
+def pyramid_disparity(grayL, grayR, guide, scale=2, band=4, **kwargs):
+    """Coarse-to-fine disparity with a shared PyramidMatcher per (scale, band)."""
+    pm = _pyramid_matchers.get((scale, band))
+    if pm is None:
+        pm = _pyramid_matchers[(scale, band)] = PyramidMatcher(scale, band)
+    return pm.compute(grayL, grayR, guide, **kwargs)
@@ -1,14 +1,29 @@
+import argparse
 import numpy as np
 import cv2
-import requests
 import time
-import matplotlib.pyplot as plt
+import itertools
+from functools import partial
 from cv2 import ximgproc
 
-# A* dependencies
-from pathfinding.core.diagonal_movement import DiagonalMovement
-from pathfinding.core.grid import Grid
-from pathfinding.finder.a_star import AStarFinder
+from change_gate import ChangeGate
+from depth_lut import DepthLUT, DepthMap
+from frame_decode import decode_color, decode_gray
+from latency_trace import default_tracer as tracer
+from lazy_disparity import LazyDisparity
+from mjpeg_client import MjpegCapture
+from occupancy_grid import OccupancyGrid
+from replay_source import ReplayGrabber, find_pairs
+from stereo_capture import StereoGrabber
+from stereo_matcher import default_cache as matcherCache, get_matchers, pyramid_disparity
+from stereo_pipeline import StereoPipeline
+from dashboard_server import Dashboard
+from frame_channel import FramePublisher
+from stereo_viewer import VIEWER_PORT, StereoViewer, frame_message
+
+# A* planner (array-backed, reuses its buffers across frames)
+from grid_astar import GridAStar
+from grid_dstar import DStarLite
 
 # ============ USER CONFIG ==============
 # ============ USER CONFIG ==============
@@ -24,6 +39,54 @@ yfloor = 340
 # Number of frames to process in a loop
 NUM_FRAMES = 100
 
+# Max left/right arrival-time difference (s) for a frame pair to be processed
+SYNC_TOLERANCE = 0.040
+
+# Read the streams with the built-in MJPEG client instead of cv2.VideoCapture/FFmpeg
+USE_MJPEG_CLIENT = True
+
+# JPEG DCT-domain downscale for the disparity stage (1 = full resolution, 2/4/8 = reduced)
+DECODE_REDUCE = 1
+
+# Coarse-to-fine disparity: full search at 1/PYRAMID_SCALE, narrow-band refinement
+# at full resolution (1 = off, 2 = half, 4 = quarter resolution coarse level)
+PYRAMID_SCALE = 1
+PYRAMID_BAND = 4   # +/- pixels searched around the upsampled coarse disparity
+
+# Band-limited disparity: match/filter/reproject only the rows a consumer reads
+# (half-open (y0, y1) row bands of the rectified ROI, None = to the bottom edge)
+LAZY_BANDS = False
+PLAN_ROWS = [(yfloor-10, yfloor), (yfloor+1, None)]   # obstacle slice + path back-projection rows
+VIEW_ROWS = [(100, yfloor)]                           # 3D view
+BAND_PAD = 48   # context rows above/below each band for SGBM aggregation and WLS
+
+# Temporal change gating: reuse the previous disparity for duplicate/unchanged frames
+# and recompute only the row bands whose downscaled-grid cells changed
+CHANGE_GATING = False
+CHANGE_CELL = 16          # grid cell size (px)
+CHANGE_THRESHOLD = 4.0    # mean abs gray difference per cell that counts as a change
+
+# A* connectivity: False = 4-connected grid moves, True = 8-connected
+PLANNER_DIAGONAL = False
+# Keep the search between frames and repair it where the grid changed (D* Lite);
+# a new far cell or grid shape still triggers a full replan, which costs ~3x an A*
+# search, so this only pays off while the far cell mostly stays put (bench_replan)
+INCREMENTAL_PLANNING = False
+
+# Rebuild the 3D surface every N displayed frames (0 = no surface); the other
+# panels are updated in place every frame
+SURFACE_EVERY = 10
+
+# Port of the MJPEG dashboard (--dashboard), e.g. http://<car-ip>:8080/
+DASHBOARD_PORT = 8080
+
+# Per-stage latency tracing (rolling p50/p95/p99 printed at exit; --trace also
+# writes a Chrome trace). Off = the instrumented stages cost a no-op call each
+TRACE_STAGES = False
+
+# Items buffered between pipeline stages (older items are dropped when full)
+PIPELINE_QUEUE_SIZE = 1
+
 # Stereo SGBM parameters
 minDisp = 0
 nDisp  = 96   # must be multiple of 16
@@ -40,60 +103,30 @@ sigma = 2.5
 discontinuityRad = 4
 # =======================================
 
-import os
-
-# Paths to calibration files (generated by the previous step)
-CALIB_DIR = "Calibration_Files"
-undistL_path = os.path.join(CALIB_DIR, 'umapL.txt')
-rectifL_path = os.path.join(CALIB_DIR, 'rmapL.txt')
-undistR_path = os.path.join(CALIB_DIR, 'umapR.txt')
-rectifR_path = os.path.join(CALIB_DIR, 'rmapR.txt')
-roiL_path    = os.path.join(CALIB_DIR, 'ROIL.txt')
-roiR_path    = os.path.join(CALIB_DIR, 'ROIR.txt')
-Q_path       = os.path.join(CALIB_DIR, 'Q.txt')
-CL_path      = os.path.join(CALIB_DIR, 'CmL.txt')
-DL_path      = os.path.join(CALIB_DIR, 'DcL.txt')
-RL_path      = os.path.join(CALIB_DIR, 'RectifL.txt')
-
-# Load them
-undistL = np.loadtxt(undistL_path, dtype=np.float32)
-rectifL = np.loadtxt(rectifL_path, dtype=np.float32)
-undistR = np.loadtxt(undistR_path, dtype=np.float32)
-rectifR = np.loadtxt(rectifR_path, dtype=np.float32)
-roiL    = np.loadtxt(roiL_path, dtype=np.int32)
-roiR    = np.loadtxt(roiR_path, dtype=np.int32)
-Q       = np.loadtxt(Q_path, dtype=np.float32)
-CL      = np.loadtxt(CL_path, dtype=np.float32)
-DL      = np.loadtxt(DL_path, dtype=np.float32)
-RL      = np.loadtxt(RL_path, dtype=np.float32)
+from calibration_bundle import CALIB_DIR, load_calibration
 
-# ============ Functions ================
+# Calibration bundle (generated by camera_calibration.py / calibration_bundle.py)
+calib = load_calibration(CALIB_DIR, frame_size=(FRAME_WIDTH, FRAME_HEIGHT))
+Q       = calib.Q.astype(np.float32)
+CL      = calib.CmL.astype(np.float32)
+DL      = calib.DcL.astype(np.float32)
+RL      = calib.RectifL.astype(np.float32)
 
-def fetch_frame(cap):
-    """Fetch a single frame from the ESP32-CAM VideoCapture stream."""
-    ret, frame = cap.read()
-    if ret:
-        return frame
-    else:
-        print("Error fetching frame from stream.")
-        return None
+# Disparity -> depth lookup tables for Q (depth is computed only where it is read)
+depthLUT = DepthLUT(Q)
 
+planner = DStarLite(diagonal=PLANNER_DIAGONAL) if INCREMENTAL_PLANNING else GridAStar(diagonal=PLANNER_DIAGONAL)
 
-def rescaleROI(src, roi):
-    """Crop the image to the ROI from stereoRectify (valid region)."""
-    x, y, w, h = roi
-    dst = src[y:y+h, x:x+w]
-    return dst
+# ============ Functions ================
 
-def computeDisparity(imgL, imgR, params):
-    """Compute WLS-filtered disparity and reproject to 3D."""
+def getMatcherParams(params, scale=1):
+    """get_matchers() keyword arguments for params = (minD, nD, bSz, pfC, sR) at 1/scale resolution."""
     (minD, nD, bSz, pfC, sR) = params
-
-    # Convert to gray
-    grayL = cv2.cvtColor(imgL, cv2.COLOR_BGR2GRAY)
-    grayR = cv2.cvtColor(imgR, cv2.COLOR_BGR2GRAY)
-
-    stereoL = cv2.StereoSGBM_create(
+    if scale != 1:
+        # Disparities shrink with the image; keep the range a multiple of 16
+        minD = minD // scale
+        nD = max(16, nD // scale // 16 * 16)
+    return dict(
         minDisparity=minD,
         numDisparities=nD,
         blockSize=bSz,
@@ -101,78 +134,111 @@ def computeDisparity(imgL, imgR, params):
         P2=P2,
         speckleRange=sR,
         preFilterCap=pfC,
-        mode=modeSgbm
+        mode=modeSgbm,
+        lam=lam,
+        sigma=sigma,
+        discontinuityRad=discontinuityRad
     )
-    wls = ximgproc.createDisparityWLSFilter(stereoL)
-    stereoR = ximgproc.createRightMatcher(stereoL)
-
-    wls.setLambda(lam)
-    wls.setDepthDiscontinuityRadius(discontinuityRad)
-    wls.setSigmaColor(sigma)
-
-    # Compute disparity from left and right
-    t1 = time.time()
-    dispL = stereoL.compute(grayL, grayR)
-    dispR = stereoR.compute(grayR, grayL)
-    t2 = time.time()
-    cost_sgbm = t2 - t1
-
-    # Filter
-    dispFiltered = wls.filter(dispL, imgL, None, dispR)
-    dispVis = ximgproc.getDisparityVis(dispFiltered)  # for visualization
-
-    # Reproject to 3D
-    points3D = cv2.reprojectImageTo3D(dispVis, Q, handleMissingValues=True)
-
-    return dispVis, points3D, cost_sgbm
-
-def findPath(disparityMap, points3d, cost_sgbm, frameId):
-    """Build occupancy grid from 3D data, run A*, back-project path."""
 
-    # Unpack 3D
-    xx = points3d[:,:,0]
-    yy = points3d[:,:,1]
-    zz = points3d[:,:,2]
+def computeDisparity(imgL, imgR, params, guide=None, scale=1):
+    """
+    Compute WLS-filtered disparity and its DepthMap (3D via Q, evaluated lazily).
+    imgL/imgR may be BGR or already grayscale; `guide` is the WLS guide image
+    (defaults to imgL). With scale > 1 the inputs are at 1/scale of the ROI
+    resolution: matching runs on the small images and the filtered disparity
+    is upsampled back to the full ROI before reprojection. With PYRAMID_SCALE > 1
+    (and full-resolution input) the coarse-to-fine matcher is used instead.
+    """
+    if guide is None:
+        guide = imgL
+
+    # Convert to gray (no-op for frames decoded straight to grayscale)
+    grayL = imgL if imgL.ndim == 2 else cv2.cvtColor(imgL, cv2.COLOR_BGR2GRAY)
+    grayR = imgR if imgR.ndim == 2 else cv2.cvtColor(imgR, cv2.COLOR_BGR2GRAY)
+
+    # ROIL/ROIR can differ by a pixel; match on the common area
+    h, w = min(grayL.shape[0], grayR.shape[0]), min(grayL.shape[1], grayR.shape[1])
+    grayL, grayR, guide = grayL[:h, :w], grayR[:h, :w], guide[:h, :w]
+
+    matcherParams = getMatcherParams(params, scale)
+
+    if PYRAMID_SCALE > 1 and scale == 1:
+        # Full range at low resolution, narrow band around it at full resolution
+        t1 = time.perf_counter()
+        with tracer.span('pyramid'):
+            dispFiltered = pyramid_disparity(grayL, grayR, guide, PYRAMID_SCALE, PYRAMID_BAND, **matcherParams)
+        cost_sgbm = time.perf_counter() - t1
+    else:
+        # Warm matcher/filter objects for this exact parameter set (built once, then reused)
+        stereoL, stereoR, wls = get_matchers(**matcherParams)
+
+        # Compute disparity from left and right
+        t1 = time.perf_counter()
+        with tracer.span('sgbm'):
+            dispL = stereoL.compute(grayL, grayR)
+        with tracer.span('right_matcher'):
+            dispR = stereoR.compute(grayR, grayL)
+        t2 = time.perf_counter()
+        cost_sgbm = t2 - t1
+
+        # Filter
+        with tracer.span('wls'):
+            dispFiltered = wls.filter(dispL, guide, None, dispR)
+            if scale != 1:
+                dispFiltered = cv2.resize(dispFiltered, calib.roi_size('L'), interpolation=cv2.INTER_NEAREST) * scale
+    dispVis = ximgproc.getDisparityVis(dispFiltered)  # for visualization
 
-    # Clip to avoid large outliers
-    xx = np.clip(xx, -25, 60)
-    yy = np.clip(yy, -25, 25)
-    zz = np.clip(zz,  0, 100)
+    # 3D on demand: depth.Z(rows), depth.at(ys, xs), depth.cloud() for everything
+    depth = DepthMap(dispVis, depthLUT)
+
+    return dispVis, depth, cost_sgbm
+
+def computeDisparityLazy(imgL, imgR, params, guide=None, rows=PLAN_ROWS, previous=None, stale=None):
+    """
+    Band-limited computeDisparity: only `rows` are matched and filtered.
+    Returns the LazyDisparity; its `disparity` is full-size with the other
+    rows 0 until a consumer requests them with `.request(bands)`. With `previous`
+    (a LazyDisparity) rows outside the boolean mask `stale` are copied from it.
+    """
+    if guide is None:
+        guide = imgL
+    grayL = imgL if imgL.ndim == 2 else cv2.cvtColor(imgL, cv2.COLOR_BGR2GRAY)
+    grayR = imgR if imgR.ndim == 2 else cv2.cvtColor(imgR, cv2.COLOR_BGR2GRAY)
+    h, w = min(grayL.shape[0], grayR.shape[0]), min(grayL.shape[1], grayR.shape[1])
+    lazy = LazyDisparity(grayL[:h, :w], grayR[:h, :w], guide[:h, :w], getMatcherParams(params), pad=BAND_PAD)
+    if previous is not None:
+        lazy.reuse(previous, stale[:h])
+    return lazy.request(rows)
+
+def findPath(disparityMap, depth, cost_sgbm, frameId):
+    """Build occupancy grid from 3D data (a DepthMap), run A*, back-project path."""
 
     # Floor-based obstacle detection (simple approach)
-    # We take a horizontal slice near yfloor
-    obs_slice = zz[yfloor-10:yfloor, :]  # might adjust depending on your scene
-    # For each column, find the minimum Z in that slice
-    obstacles = np.amin(obs_slice, axis=0, keepdims=False)
-
-    # Build an occupancy grid
-    # We'll do a simple approach: if 'y' >= obstacles, free space, else occupied
-    # but we need to define 'y' as some vertical indexing
-    # Here, just do a range in 2D
-    y_range = np.mgrid[0:np.amax(obstacles), 0:obs_slice.shape[1]][0,:,:]
-    occupancy_grid = np.where(y_range >= obstacles, 0, 1)  # 0 = free, 1 = obstacle
-
-    # Optionally clear near edges if needed
-    occupancy_grid[:, :nDisp+60] = 0
-
-    # Find a "farthest free cell"
-    # We'll just pick the highest value in occupancy_grid[:,:-90]
-    # Then unravel index to get coords
-    far_zy, far_zx = np.unravel_index(np.argmax(np.flip(occupancy_grid[:,:-90])), occupancy_grid[:,:-90].shape)
-    # Flip X
-    far_zx = (zz.shape[1]-91) - far_zx
-    far_zy = occupancy_grid.shape[0] - far_zy - 1
+    # We take a horizontal slice near yfloor; only its Z is computed,
+    # clipped to avoid large outliers
+    with tracer.span('reproject'):
+        obs_slice = np.clip(depth.Z(slice(yfloor-10, yfloor)), 0, 100)  # might adjust depending on your scene
+    with tracer.span('grid'):
+        # For each column, find the minimum Z in that slice
+        obstacles = np.amin(obs_slice, axis=0, keepdims=False)
+
+        # Build an occupancy grid: column x is free up to its obstacle depth
+        # (one uint8 per column; 1 = free in the dense view, the planner's convention),
+        # with the columns near the left edge blocked
+        occupancy_grid = OccupancyGrid.from_obstacles(obstacles, blocked_cols=nDisp+60)
+
+        # Find a "farthest free cell" within occupancy_grid[:,:-90]
+        far_zx, far_zy = occupancy_grid.last_free(-90)
 
     # A* from some center row to that far cell
     xcenter = 305  # you may want to choose your "start" column
-    mat_grid = Grid(matrix=occupancy_grid)
-    start = mat_grid.node(xcenter, 1)
-    end   = mat_grid.node(far_zx, far_zy)
-
-    tA1 = time.time()
-    finder = AStarFinder(diagonal_movement=DiagonalMovement.never)
-    path, runs = finder.find_path(start, end, mat_grid)
-    tA2 = time.time()
+    start = (xcenter, 1)
+    end   = (far_zx, far_zy)
+
+    tA1 = time.perf_counter()
+    with tracer.span('planner'):
+        path, runs = planner.find_path(start, end, occupancy_grid)
+    tA2 = time.perf_counter()
     cost_path = tA2 - tA1
 
     # Convert path to real-world (X,Y,Z)
@@ -188,11 +254,13 @@ def findPath(disparityMap, points3d, cost_sgbm, frameId):
 
     # We'll just index the row from top to bottom
     # or do a geometric spacing
-    y_indices = np.linspace(yy.shape[0]-1, yfloor+1, num=length_path, dtype=np.int32)
-    y_indices = np.clip(y_indices, 0, yy.shape[0]-1)
+    t0 = time.perf_counter()
+    height = depth.shape[0]
+    y_indices = np.linspace(height-1, yfloor+1, num=length_path, dtype=np.int32)
+    y_indices = np.clip(y_indices, 0, height-1)
 
-    # Build real-world array
-    xw = xx[y_indices, coords[:,0]]
+    # Build real-world array (X only at the path pixels)
+    xw = np.clip(depth.at(y_indices, coords[:,0])[0], -25, 60)
     yw = np.linspace(10, 13, num=length_path)  # very naive approach for demonstration
     zw = np.interp(coords[:,1], [0, np.amax(coords[:,1])], [25, nDisp])
 
@@ -204,111 +272,205 @@ def findPath(disparityMap, points3d, cost_sgbm, frameId):
     tvec = np.zeros((3,), dtype=np.float32)
     pr, _ = cv2.projectPoints(world_points, rvec, tvec, CL, DL)
     pr = np.squeeze(pr, 1)
+    tracer.record('backproject', t0, time.perf_counter())
     # px, py
     return (pr, occupancy_grid, cost_sgbm, cost_path, far_zx, far_zy)
 
-def main():
-    # Initialize VideoCapture objects for the cameras
-    capL = cv2.VideoCapture(f"http://{LEFT_CAM_IP}:81/stream")
-    capR = cv2.VideoCapture(f"http://{RIGHT_CAM_IP}:81/stream")
-
-    if not capL.isOpened():
-        print(f"Error: Could not open left camera at {LEFT_CAM_IP}")
-        return
-    if not capR.isOpened():
-        print(f"Error: Could not open right camera at {RIGHT_CAM_IP}")
-        return
-
-    # Process NUM_FRAMES frames in a loop
-    params = [minDisp, nDisp, bSize, pfCap, sRange]
-    for frameId in range(NUM_FRAMES):
-        # Fetch frames
-        imgL = fetch_frame(capL)
-        imgR = fetch_frame(capR)
-
+def buildPipeline(grabber, params, gate=None):
+    """
+    Wire capture, rectification, computeDisparity and findPath as pipeline stages.
+    With a ChangeGate, duplicate/unchanged frames reuse the previous disparity.
+    """
+    frameIds = itertools.count()
+    last = {}   # previous rectified frame and LazyDisparity (used with the gate)
+
+    def capture(f):
+        # Fetch the freshest time-synchronized pair (waits only if none is ready yet)
+        # (the wait is returned so it doesn't count as busy time in the stage stats)
+        t0 = time.perf_counter()
+        imgL, imgR = grabber.wait_latest(timeout=1.0)
+        t1 = time.perf_counter()
         if imgL is None or imgR is None:
-            print("Error: One of the frames is None. Skipping this iteration.")
-            continue
-
-        # (Optional) resize to ensure 640x480
-        imgL = cv2.resize(imgL, (FRAME_WIDTH, FRAME_HEIGHT))
-        imgR = cv2.resize(imgR, (FRAME_WIDTH, FRAME_HEIGHT))
-
-        # Remap (rectify)
-        imgL = cv2.remap(imgL, undistL, rectifL, cv2.INTER_LINEAR)
-        imgR = cv2.remap(imgR, undistR, rectifR, cv2.INTER_LINEAR)
-
-        # Crop to valid ROI
-        imgL = rescaleROI(imgL, roiL)
-        imgR = rescaleROI(imgR, roiR)
-
-        dispMap, points3D, cost_sgbm = computeDisparity(imgL, imgR, params)
-
+            return None, t1 - t0
+        frameId = next(frameIds)
+        tracer.record('capture_wait', t0, t1, frameId)
+        return {'frameId': frameId, 'imgL': imgL, 'imgR': imgR, 'captured': t1}, t1 - t0
+
+    def rectify(f):
+        tracer.set_frame(f['frameId'])
+        if gate is not None and gate.is_duplicate(f['imgL'], f['imgR']) and 'rectified' in last:
+            # Same JPEGs as last time: skip decoding and remapping too
+            f['grayL'], f['grayR'], f['imgL'] = last['rectified']
+            f['duplicate'] = True
+            del f['imgR']
+            return f
+
+        # Decode the left colour guide and the right image in grayscale only, both
+        # at 1/DECODE_REDUCE resolution (JPEG bytes from MjpegCapture, or BGR frames)
+        with tracer.span('decode'):
+            guideL = decode_color(f['imgL'], DECODE_REDUCE)
+            grayR = decode_gray(f['imgR'], DECODE_REDUCE)
+
+        # Resize to the calibration resolution, rectify and crop to the valid ROI
+        # in one remap (maps for new stream resolutions are built on first use);
+        # the left gray image comes from the rectified guide, one remap fewer
+        with tracer.span('remap'):
+            f['imgL'] = calib.rectify(guideL, 'L', scale=DECODE_REDUCE)
+            f['grayR'] = calib.rectify(grayR, 'R', scale=DECODE_REDUCE)
+            f['grayL'] = cv2.cvtColor(f['imgL'], cv2.COLOR_BGR2GRAY)
+        del f['imgR']
+        last['rectified'] = (f['grayL'], f['grayR'], f['imgL'])
+        return f
+
+    def disparity(f):
+        tracer.set_frame(f['frameId'])
+        if gate is not None and DECODE_REDUCE == 1:
+            rows = PLAN_ROWS if LAZY_BANDS else [(0, None)]
+            decision, stale = gate.update(f['grayL'], f['grayR'], f.get('duplicate', False))
+            if decision == 'reuse' and 'lazy' in last:
+                lazy = last['lazy']
+            else:
+                lazy = computeDisparityLazy(f['grayL'], f['grayR'], params, guide=f['imgL'], rows=rows,
+                                            previous=last.get('lazy') if decision == 'partial' else None,
+                                            stale=stale)
+            f['lazy'] = last['lazy'] = lazy
+            f['dispMap'], f['depth'], f['cost_sgbm'] = lazy.disparity, DepthMap(lazy.disparity, depthLUT), lazy.cost_sgbm
+            return f
+        if LAZY_BANDS and DECODE_REDUCE == 1:
+            # Only the planner's rows now; the viewer asks for its own rows later
+            lazy = f['lazy'] = computeDisparityLazy(f['grayL'], f['grayR'], params, guide=f['imgL'])
+            f['dispMap'], f['depth'], f['cost_sgbm'] = lazy.disparity, DepthMap(lazy.disparity, depthLUT), lazy.cost_sgbm
+            return f
+        f['dispMap'], f['depth'], f['cost_sgbm'] = computeDisparity(
+            f['grayL'], f['grayR'], params, guide=f['imgL'], scale=DECODE_REDUCE)
+        return f
+
+    def plan(f):
+        tracer.set_frame(f['frameId'])
         # Occupancy + A*
-        pr, occupancy_grid, c_sgbm, c_path, far_zx, far_zy = findPath(dispMap, points3D, cost_sgbm, frameId)
-
-        # Visualization
-        fig.clf()
-        plt.suptitle(f"Frame #{frameId}")
-
-        # Show left image
-        ax1 = fig.add_subplot(2,2,1)
-        imL_rgb = cv2.cvtColor(imgL, cv2.COLOR_BGR2RGB)
-        ax1.imshow(imL_rgb)
-        ax1.set_title("Left Camera with Path")
-        ax1.set_xlim([0, imgL.shape[1]])
-        ax1.set_ylim([imgL.shape[0], 0])
-
-        if len(pr) > 0:
-            px = pr[:,0]
-            py = pr[:,1]
-            # Color points from near->far
-            sc = ax1.scatter(px, py, c=np.linspace(0,1,len(px)), cmap='plasma_r', s=30)
-
-        # 3D view
-        ax2 = fig.add_subplot(2,2,2, projection='3d')
-        ax2.azim = 90
-        ax2.elev = 110
-        ax2.set_box_aspect((4,3,3))
-        xx = points3D[:,:,0]
-        yy = points3D[:,:,1]
-        zz = points3D[:,:,2]
-        ax2.plot_surface(xx[100:yfloor,:], yy[100:yfloor,:], zz[100:yfloor,:],
-                         cmap='viridis_r', rcount=25, ccount=25, linewidth=0, antialiased=False)
-        ax2.invert_xaxis()
-        ax2.invert_zaxis()
-        ax2.set_xlabel('Azimuth (X)')
-        ax2.set_ylabel('Elevation (Y)')
-        ax2.set_zlabel('Depth (Z)')
-        ax2.set_title("3D Reconstructed Scene")
-        # If we found a path in real-world coords, optionally scatter them:
-        # (We used naive 'world_points' in findPath, do it if needed)
-
-        # Disparity
-        ax3 = fig.add_subplot(2,2,3)
-        ax3.imshow(dispMap, cmap='gray')
-        ax3.set_title("WLS-Filtered Disparity Map")
-
-        # Occupancy
-        ax4 = fig.add_subplot(2,2,4)
-        ax4.imshow(occupancy_grid, origin='lower', interpolation='none', cmap='gray')
-        ax4.set_title("Occupancy Grid with A* Path")
+        f['path'] = findPath(f['dispMap'], f['depth'], f['cost_sgbm'], f['frameId'])
+        return f
+
+    # A fast replay hands out every pair at once; block instead of dropping so each one is processed
+    pipe = StereoPipeline(queue_size=PIPELINE_QUEUE_SIZE, block=getattr(grabber, 'lossless', False))
+    pipe.set_source('capture', capture, reports_wait=True)
+    pipe.add_stage('rectify', rectify)
+    pipe.add_stage('disparity', disparity)
+    pipe.add_stage('plan', plan)
+    return pipe
+
+def main(headless=False, port=VIEWER_PORT, dashboard_port=None, trace_path=None,
+         replay=None, replay_timing='original', replay_loop=False):
+    """
+    Args:
+        headless (bool): Don't draw; publish each frame for `python stereo_viewer.py` instead.
+        port (int): TCP port the frames are published on in headless mode.
+        dashboard_port (int): Also serve the MJPEG dashboard (dashboard_server.py) on this port.
+        trace_path (str): Trace every stage and write a Chrome trace-event JSON file here.
+        replay (str): Replay recorded pairs from this directory instead of the cameras.
+        replay_timing: 'original', 'fast' or pairs per second (see replay_source.py).
+        replay_loop (bool): Restart the replay after the last pair.
+    """
+    tracer.enable(TRACE_STAGES or trace_path is not None)
+    if replay is not None:
+        # Stored pairs through the same rectify -> disparity -> plan stages
+        grabber = ReplayGrabber(find_pairs(replay), timing=replay_timing, loop=replay_loop)
+        grabber.start()
+    else:
+        # One reader thread per camera, keeping only the newest frame
+        grabber = StereoGrabber(f"http://{LEFT_CAM_IP}:81/stream", f"http://{RIGHT_CAM_IP}:81/stream",
+                                sync_tolerance=SYNC_TOLERANCE,
+                                open_capture=partial(MjpegCapture, decode=False) if USE_MJPEG_CLIENT
+                                else cv2.VideoCapture)
+        if not grabber.start():
+            print(f"Error: Could not open cameras at {LEFT_CAM_IP} / {RIGHT_CAM_IP}")
+            return
 
+    params = [minDisp, nDisp, bSize, pfCap, sRange]
+    gate = ChangeGate(CHANGE_CELL, CHANGE_THRESHOLD) if CHANGE_GATING else None
+    pipe = buildPipeline(grabber, params, gate)
+    pipe.start()
+
+    dashboard = (Dashboard(port=dashboard_port, roi_size=calib.roi_size('L')).start()
+                 if dashboard_port is not None else None)
+    if headless:
+        # Frames go to whichever viewer process is attached; publish() never blocks
+        publisher, viewer = FramePublisher(port=port).start(), None
+    else:
+        publisher = None
+        viewer = StereoViewer(calib.roi_size('L'), surface_rows=VIEW_ROWS[0], surface_every=SURFACE_EVERY)
+
+    # Capture -> rectify -> disparity -> planning run on their own threads;
+    # this loop only shows/publishes the newest finished frame (NUM_FRAMES of them)
+    for _ in range(NUM_FRAMES):
+        f = pipe.get(timeout=2.0)
+        if f is None:
+            if getattr(grabber, 'finished', False):
+                break   # replay done
+            print("Error: No frames from the pipeline. Skipping this iteration.")
+            continue
+        frameId, imgL, dispMap, depth = f['frameId'], f['imgL'], f['dispMap'], f['depth']
+        pr, occupancy_grid, c_sgbm, c_path, far_zx, far_zy = f['path']
         costStats = f"(far_zx, far_zy)=({far_zx},{far_zy})\ncost_sgbm={c_sgbm:.3f}\ncost_path={c_path:.3f}"
         pathStats = f"Grid steps={occupancy_grid.shape}\n"
-        fig.text(0.7, 0.05, costStats)
-        fig.text(0.85, 0.05, pathStats)
-
-        plt.pause(0.1)
-
-    plt.ioff()
-    plt.show()
-    
-    
-     # Release the cameras
-    capL.release()
-    capR.release()
-    cv2.destroyAllWindows()
+        tracer.set_frame(frameId)
+
+        if viewer is not None and 'lazy' in f and viewer.needs_surface():
+            # Fill in the rows the 3D view reads (dispMap/depth see them in place), only on
+            # the frames that rebuild the surface: this holds the matcher lock the
+            # disparity stage needs. Headless runs never do it.
+            f['lazy'].request(VIEW_ROWS)
+
+        with tracer.span('render'):
+            if dashboard is not None:
+                dashboard.publish(frameId, imgL, dispMap, occupancy_grid, pr, (far_zx, far_zy))
+            if publisher is not None:
+                publisher.publish(*frame_message(frameId, imgL, dispMap, occupancy_grid, pr, Q,
+                                                 calib.roi_size('L'), VIEW_ROWS[0], (costStats, pathStats)))
+            else:
+                # Visualization: artists are only updated in place, no pause
+                viewer.update(frameId, imgL, dispMap, occupancy_grid, pr, depth, (costStats, pathStats))
+
+    # Stop the stages, then release the cameras
+    pipe.stop()
+    print(pipe.format_stats())
+    print("Matcher cache:", matcherCache.stats())
+    print("Planner:", planner.stats())
+    if dashboard is not None:
+        dashboard.stop()
+        print("Dashboard:", dashboard.stats())
+    if publisher is not None:
+        publisher.stop()
+        print("Publisher:", publisher.stats())
+    else:
+        print("Viewer:", viewer.stats())
+    if gate is not None:
+        print("Change gate:", gate.stats())
+    if tracer.enabled:
+        print(tracer.format_stats())
+        if trace_path:
+            print(f"Wrote {tracer.export_chrome(trace_path)} trace events to {trace_path}")
+    grabber.stop()
+    print("Capture stats:", grabber.stats())
+
+    if viewer is not None:
+        viewer.show()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Stereo disparity -> occupancy grid -> A* path planning.")
+    parser.add_argument("--headless", action="store_true",
+                        help="run without drawing and publish frames for stereo_viewer.py")
+    parser.add_argument("--port", type=int, default=VIEWER_PORT, help="port frames are published on")
+    parser.add_argument("--dashboard", type=int, nargs="?", const=DASHBOARD_PORT, metavar="PORT",
+                        help=f"serve the MJPEG dashboard (default port {DASHBOARD_PORT})")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="trace per-stage latency and write a Chrome trace-event JSON file")
+    parser.add_argument("--replay", metavar="DIR",
+                        help="replay recorded pairs (calib_images-style or L_frame_/R_frame_ files)")
+    parser.add_argument("--replay-timing", default="original", metavar="original|fast|FPS",
+                        help="replay at the recorded times, as fast as possible or at a fixed rate")
+    parser.add_argument("--loop", action="store_true", help="restart the replay after the last pair")
+    args = parser.parse_args()
+    timing = args.replay_timing if args.replay_timing in ('original', 'fast') else float(args.replay_timing)
+    main(headless=args.headless, port=args.port, dashboard_port=args.dashboard, trace_path=args.trace,
+         replay=args.replay, replay_timing=timing, replay_loop=args.loop)
@@ -0,0 +1,227 @@
+"""
+Pipelined execution for the stereo loop.
+
+Each stage (capture, rectify, disparity, planning, ...) runs on its own thread
+and hands its output to the next stage through a small bounded queue. When a
+downstream stage falls behind, the *oldest* queued item is dropped, so the
+pipeline always works on the freshest frames and the frame rate is set by the
+slowest stage instead of the sum of all of them.
+
+Items travelling through the pipeline are plain dicts; a stage function takes
+the dict and returns it (usually with new keys added) or None to drop the item.
+Existing functions plug in through a thin adapter, e.g.
+
+    pipe.add_stage("disparity", lambda f: {**f, "disp": computeDisparity(f["imgL"], f["imgR"], params)})
+
+Rendering stays on the caller's thread (matplotlib is not thread-safe): pull
+finished items with `get()`.
+
+Offline sources that must not lose items (a replay run as fast as possible)
+build the pipeline with block=True: put() then waits for room instead of
+dropping, so the source runs at the pace of the slowest stage.
+"""
+import threading
+import time
+from collections import deque
+
+
+class DropOldestQueue:
+    """
+    Bounded FIFO whose put() never blocks: when full, the oldest item is discarded.
+    With block=True, put() instead waits until there is room (backpressure).
+    """
+
+    def __init__(self, maxsize=2, block=False):
+        self.maxsize = maxsize
+        self.block = block
+        self._items = deque()
+        self._cond = threading.Condition()
+        self.dropped = 0
+        self.put_count = 0
+
+    def put(self, item, stop=None):
+        """
+        Append `item`. In blocking mode, waits for room; gives up (returning False)
+        once the `stop` event is set.
+        """
+        with self._cond:
+            if self.block:
+                while len(self._items) >= self.maxsize:
+                    if stop is not None and stop.is_set():
+                        return False
+                    self._cond.wait(0.05)
+            elif len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self.put_count += 1
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """Oldest item, or None if nothing arrived within `timeout` seconds."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout):
+                return None
+            item = self._items.popleft()
+            if self.block:
+                self._cond.notify_all()     # room for a waiting put()
+            return item
+
+    def __len__(self):
+        return len(self._items)
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+
+class Stage:
+    """
+    One pipeline stage: a worker thread applying `fn` to items from `inbox`.
+    With reports_wait=True, `fn` returns (item or None, seconds spent waiting for input).
+    """
+
+    def __init__(self, name, fn, inbox, outbox, stop_event, poll=0.05, reports_wait=False):
+        self.name = name
+        self.fn = fn
+        self.reports_wait = reports_wait
+        self.inbox = inbox      # None for the source stage
+        self.outbox = outbox
+        self._stop = stop_event
+        self._poll = poll
+        self._thread = None
+
+        self.processed = 0
+        self.skipped = 0        # fn returned None
+        self.errors = 0
+        self.busy = 0.0         # seconds spent inside fn, minus the input wait it reports
+        self.waited = 0.0       # seconds a source fn reported blocking on its input
+        self.started = None
+
+    def start(self):
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=f"stage-{self.name}", daemon=True)
+        self._thread.start()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.inbox is None:
+                item = {}
+            else:
+                item = self.inbox.get(self._poll)
+                if item is None:
+                    continue
+            t0 = time.monotonic()
+            try:
+                out = self.fn(item)
+            except Exception as e:
+                self.errors += 1
+                print(f"Stage '{self.name}' failed: {e!r}")
+                out = None
+            elapsed = time.monotonic() - t0
+            if self.reports_wait and out is not None:
+                # The source reports how long it blocked waiting for input
+                out, waited = out
+                waited = min(waited, elapsed)
+                self.waited += waited
+                elapsed -= waited
+            self.busy += elapsed
+            if out is None:
+                self.skipped += 1
+                continue
+            self.processed += 1
+            self.outbox.put(out, self._stop)
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        return {
+            'processed': self.processed,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'occupancy': self.busy / elapsed if elapsed > 0 else 0.0,   # fraction of time busy
+            'waited_s': self.waited,
+            'mean_ms': 1e3 * self.busy / max(1, self.processed + self.skipped),
+            'queue_len': len(self.inbox) if self.inbox is not None else 0,
+            'queue_dropped': self.inbox.dropped if self.inbox is not None else 0,
+        }
+
+
+class StereoPipeline:
+    """Chain of Stages connected by DropOldestQueues."""
+
+    def __init__(self, queue_size=1, block=False):
+        """
+        Args:
+            queue_size (int): Capacity of every inter-stage queue (small = low latency).
+            block (bool): Wait for room instead of dropping the oldest item (lossless, for
+                offline sources; the source is then paced by the slowest stage).
+        """
+        self.queue_size = queue_size
+        self.block = block
+        self.stages = []
+        self.output = DropOldestQueue(queue_size, block)
+        self._stop = threading.Event()
+
+    def set_source(self, name, fn, reports_wait=False):
+        """
+        First stage. `fn(item)` is called in a loop with an empty dict and should
+        block until new input is available (returning None if there is none).
+        With reports_wait=True it returns (item or None, seconds spent waiting for
+        input) instead, so that the wait does not count as busy time in the
+        occupancy / bottleneck report.
+        """
+        if self.stages:
+            raise ValueError("set_source() must be called before add_stage()")
+        self.stages.append(Stage(name, fn, None, self.output, self._stop, reports_wait=reports_wait))
+
+    def add_stage(self, name, fn, queue_size=None):
+        """Append a stage fed by the previous one through a drop-oldest (or blocking) queue."""
+        if not self.stages:
+            raise ValueError("set_source() must be called first")
+        inbox = DropOldestQueue(queue_size or self.queue_size, self.block)
+        self.stages[-1].outbox = inbox
+        self.stages.append(Stage(name, fn, inbox, self.output, self._stop))
+
+    def start(self):
+        self._stop.clear()
+        for stage in self.stages:
+            stage.start()
+
+    def get(self, timeout=None):
+        """Next finished item (oldest first), or None on timeout."""
+        return self.output.get(timeout)
+
+    def stop(self, timeout=2.0):
+        """Signal all stages to finish their current item and exit, then join them."""
+        self._stop.set()
+        for stage in self.stages:
+            if stage.inbox is not None:
+                stage.inbox.wake()
+        for stage in self.stages:
+            stage.join(timeout)
+
+    def stats(self):
+        out = {stage.name: stage.stats() for stage in self.stages}
+        out['output'] = {'queue_len': len(self.output), 'queue_dropped': self.output.dropped}
+        return out
+
+    def format_stats(self):
+        """One line per stage: occupancy, mean time and queue drops."""
+        lines = []
+        for stage in self.stages:
+            s = stage.stats()
+            lines.append(f"{stage.name:>10}: {100 * s['occupancy']:5.1f}% busy, {s['mean_ms']:7.1f} ms/item, "
+                         f"{s['processed']} done, {s['queue_dropped']} dropped in queue")
+        return "\n".join(lines)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
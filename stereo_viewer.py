@@ -0,0 +1,253 @@
+"""
+Retained-mode matplotlib view of the planner output.
+
+The old loop cleared the figure every frame, rebuilt four subplots (including a
+3D plot_surface) and slept in plt.pause(0.1). StereoViewer builds the figure
+and its artists once; per frame it only swaps data into them (set_data /
+set_offsets / set_text) and blits the changed artists over a cached background:
+
+    viewer = StereoViewer(calib.roi_size('L'), surface_rows=(100, yfloor), surface_every=10)
+    for ...:
+        viewer.update(frameId, imgL, dispMap, occupancy_grid, pr, depth, texts)
+    viewer.show()   # optional: keep the last frame on screen
+
+Headless runs (`python stereo_path_planning.py --headless`) publish each frame
+through frame_channel instead; running this module as a script starts a viewer
+in its own process that renders the newest published frame:
+
+    python stereo_viewer.py [--host 127.0.0.1] [--port 5600]
+
+The 3D surface is part of the background and is only rebuilt every
+`surface_every` frames, which forces one full redraw. No pause is added to the
+loop; GUI events are processed with flush_events().
+"""
+import argparse
+
+import cv2
+import matplotlib.pyplot as plt
+import numpy as np
+
+from depth_lut import DepthLUT, DepthMap
+from frame_channel import FrameSubscriber
+from occupancy_grid import OccupancyGrid
+
+TEXT_POSITIONS = [(0.7, 0.05), (0.85, 0.05)]   # figure coordinates of the stats texts
+VIEWER_PORT = 5600                             # frame_channel port of headless runs
+
+
+class StereoViewer:
+    """Left image + path, 3D surface, disparity and occupancy grid in one figure."""
+
+    def __init__(self, roi_size, surface_rows, surface_every=10, grid_rows=100, figsize=(16, 9)):
+        """
+        Args:
+            roi_size (tuple): (width, height) of the rectified images.
+            surface_rows (tuple): (y0, y1) image rows shown in the 3D view.
+            surface_every (int): Rebuild the 3D surface every N frames (0 = no surface).
+            grid_rows (int): Largest occupancy grid height (findPath clips Z to 0..100).
+            figsize (tuple): Figure size in inches.
+        """
+        self.surface_rows = slice(*surface_rows)
+        self.surface_every = surface_every
+        self.frames = 0
+        self.surface_updates = 0
+        roiW, roiH = roi_size
+
+        plt.ion()
+        self.fig = fig = plt.figure(figsize=figsize)
+        self._title = fig.suptitle("", animated=True)
+
+        # Left camera with the path scattered over it
+        ax1 = fig.add_subplot(2,2,1)
+        self._left = ax1.imshow(np.zeros((roiH, roiW, 4), np.uint8), extent=(0, roiW, roiH, 0),
+                                interpolation='nearest', animated=True)
+        self._path = ax1.scatter(np.empty(0), np.empty(0), c=np.empty(0), cmap='plasma_r',
+                                 vmin=0, vmax=1, s=30, animated=True)
+        ax1.set_title("Left Camera with Path")
+        ax1.set_xlim([0, roiW])
+        ax1.set_ylim([roiH, 0])
+
+        # 3D view (the surface itself is replaced in _draw_surface)
+        self._ax3d = ax2 = fig.add_subplot(2,2,2, projection='3d')
+        ax2.azim = 90
+        ax2.elev = 110
+        ax2.set_box_aspect((4,3,3))
+        ax2.invert_xaxis()
+        ax2.invert_zaxis()
+        ax2.set_xlabel('Azimuth (X)')
+        ax2.set_ylabel('Elevation (Y)')
+        ax2.set_zlabel('Depth (Z)')
+        ax2.set_title("3D Reconstructed Scene")
+        self._surface = None
+
+        # Disparity
+        ax3 = fig.add_subplot(2,2,3)
+        self._disp = ax3.imshow(np.zeros((roiH, roiW, 4), np.uint8), extent=(-0.5, roiW - 0.5, roiH - 0.5, -0.5),
+                                interpolation='nearest', animated=True)
+        ax3.set_title("WLS-Filtered Disparity Map")
+
+        # Occupancy (fixed axes for the tallest grid, so the ticks never change)
+        self._ax_grid = ax4 = fig.add_subplot(2,2,4)
+        self._grid = ax4.imshow(np.zeros((1, roiW), np.uint8), origin='lower', interpolation='none',
+                                cmap='gray', vmin=0, vmax=1, extent=(-0.5, roiW - 0.5, -0.5, 0.5),
+                                animated=True)
+        ax4.set_xlim(-0.5, roiW - 0.5)
+        ax4.set_ylim(-0.5, grid_rows + 0.5)
+        ax4.set_facecolor('0.5')     # rows beyond the current grid
+        ax4.set_title("Occupancy Grid with A* Path")
+
+        self._texts = [fig.text(x, y, "", animated=True) for x, y in TEXT_POSITIONS]
+        self._animated = [self._title, self._left, self._path, self._disp, self._grid] + self._texts
+
+        # Any full redraw (first show, resize, surface update) refreshes the background
+        self._background = None
+        self._fit_size = (roiW, roiH)
+        fig.canvas.mpl_connect('draw_event', self._on_draw)
+        plt.show(block=False)
+        fig.canvas.draw()
+
+    def _on_draw(self, event):
+        canvas = self.fig.canvas
+        box = self._left.axes.get_window_extent()
+        self._fit_size = (max(1, int(box.width)), max(1, int(box.height)))
+        if canvas.supports_blit:
+            self._background = canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        for artist in self._animated:
+            self.fig.draw_artist(artist)
+
+    def _fit(self, img, code):
+        """
+        Image resized to the on-screen size of its axes and converted to RGBA uint8 with
+        cv2, so matplotlib neither color-maps nor resamples a full-size frame per draw.
+        """
+        return cv2.cvtColor(cv2.resize(img, self._fit_size, interpolation=cv2.INTER_AREA), code)
+
+    def _draw_surface(self, depth):
+        """Replace the 3D surface with the current depth rows (DepthMap or H x W x 3 array)."""
+        points = depth.points(self.surface_rows) if hasattr(depth, 'points') else depth[self.surface_rows]
+        if self._surface is not None:
+            self._surface.remove()
+        self._surface = self._ax3d.plot_surface(points[:,:,0], points[:,:,1], points[:,:,2],
+                                                cmap='viridis_r', rcount=25, ccount=25,
+                                                linewidth=0, antialiased=False)
+        self.surface_updates += 1
+
+    def needs_surface(self):
+        """True if the next update() rebuilds the 3D surface, i.e. reads `depth` in surface_rows."""
+        return bool(self.surface_every) and self.frames % self.surface_every == 0
+
+    def update(self, frameId, imgL, dispMap, occupancy_grid, pr, depth, texts=()):
+        """
+        Show one frame.
+        Args:
+            frameId (int): Shown in the title.
+            imgL (np.ndarray): Rectified left image (BGR).
+            dispMap (np.ndarray): Disparity visualization.
+            occupancy_grid (OccupancyGrid): Planner grid (None = leave the last one).
+            pr (np.ndarray): Path pixels (N x 2, x/y), None or empty if there is none.
+            depth: DepthMap (or reprojected H x W x 3 points) for the 3D view.
+            texts (sequence): Stats strings, one per TEXT_POSITIONS entry.
+        """
+        self._title.set_text(f"Frame #{frameId}")
+        self._left.set_data(self._fit(imgL, cv2.COLOR_BGR2RGBA))
+
+        if pr is not None and len(pr) > 0:
+            # Color points from near->far
+            self._path.set_offsets(pr[:, :2])
+            self._path.set_array(np.linspace(0, 1, len(pr)))
+        else:
+            self._path.set_offsets(np.empty((0, 2)))
+            self._path.set_array(np.empty(0))
+
+        # Gray, stretched to the map's own min..max like an autoscaled imshow
+        self._disp.set_data(self._fit(cv2.normalize(dispMap, None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U),
+                                      cv2.COLOR_GRAY2RGBA))
+
+        if occupancy_grid is not None:
+            cells = occupancy_grid.dense()
+            h, w = cells.shape
+            self._grid.set_data(cells)
+            self._grid.set_extent((-0.5, w - 0.5, -0.5, h - 0.5))
+
+        for artist, text in zip(self._texts, texts):
+            artist.set_text(text)
+
+        canvas = self.fig.canvas
+        if self.needs_surface():
+            # Full redraw; _on_draw grabs the new background and draws the artists on top
+            self._draw_surface(depth)
+            canvas.draw()
+            canvas.blit(self.fig.bbox)
+        elif self._background is not None:
+            canvas.restore_region(self._background)
+            self._draw_animated()
+            canvas.blit(self.fig.bbox)
+        else:
+            canvas.draw_idle()
+        canvas.flush_events()
+        self.frames += 1
+
+    def show(self):
+        """Turn the view into a normal figure and block until its window is closed."""
+        for artist in self._animated:
+            artist.set_animated(False)
+        plt.ioff()
+        plt.show()
+
+    def stats(self):
+        return {'frames': self.frames, 'surface_updates': self.surface_updates}
+
+
+def frame_message(frameId, imgL, dispMap, occupancy_grid, pr, Q, roi_size, surface_rows, texts=()):
+    """
+    (meta, arrays) for FramePublisher.publish(): everything StereoViewer.update() needs.
+    The 3D view is rebuilt on the viewer side from the disparity and Q.
+    """
+    meta = {'frameId': int(frameId), 'texts': list(texts), 'Q': np.asarray(Q, float).tolist(),
+            'roi_size': [int(v) for v in roi_size], 'surface_rows': [int(v) for v in surface_rows],
+            'grid_height': occupancy_grid.height if occupancy_grid is not None else -1}
+    arrays = {'imgL': imgL, 'dispMap': dispMap,
+              'pr': np.empty((0, 2)) if pr is None or len(pr) == 0 else np.asarray(pr)}
+    if occupancy_grid is not None:
+        arrays['grid'] = occupancy_grid.depth
+    return meta, arrays
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Viewer for a headless stereo_path_planning/test/test_2 run.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=VIEWER_PORT)
+    parser.add_argument("--surface-every", type=int, default=10, help="3D surface refresh interval (frames)")
+    args = parser.parse_args()
+
+    sub = FrameSubscriber(args.host, args.port).start()
+    print(f"Waiting for frames from {args.host}:{args.port} ...")
+    viewer, lut, lutQ = None, None, None
+    try:
+        while viewer is None or plt.fignum_exists(viewer.fig.number):
+            msg = sub.latest(timeout=0.5)
+            if msg is None:
+                if viewer is not None:
+                    viewer.fig.canvas.flush_events()
+                continue
+            meta, arrays = msg
+            if viewer is None:
+                viewer = StereoViewer(meta['roi_size'], meta['surface_rows'], surface_every=args.surface_every)
+            if meta['Q'] != lutQ:
+                lut, lutQ = DepthLUT(meta['Q']), meta['Q']
+            grid = OccupancyGrid(arrays['grid'], meta['grid_height']) if 'grid' in arrays else None
+            viewer.update(meta['frameId'], arrays['imgL'], arrays['dispMap'], grid, arrays['pr'],
+                          DepthMap(arrays['dispMap'], lut), meta['texts'])
+    except KeyboardInterrupt:
+        pass
+    sub.stop()
+    print("Subscriber:", sub.stats())
+    if viewer is not None:
+        print("Viewer:", viewer.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,22 @@
+import argparse
 import numpy as np
 import cv2
 import time
-import matplotlib.pyplot as plt
+from functools import partial
 from cv2 import ximgproc
 
-# A* dependencies
-from pathfinding.core.diagonal_movement import DiagonalMovement
-from pathfinding.core.grid import Grid
-from pathfinding.finder.a_star import AStarFinder
+from frame_decode import decode_color, decode_gray
+from latency_trace import default_tracer as tracer
+from mjpeg_client import MjpegCapture
+from occupancy_grid import OccupancyGrid
+from stereo_capture import StereoGrabber
+from stereo_matcher import default_cache as matcherCache, get_matchers
+from dashboard_server import Dashboard
+from frame_channel import FramePublisher
+from stereo_viewer import VIEWER_PORT, StereoViewer, frame_message
+
+# A* planner (array-backed, reuses its buffers across frames)
+from grid_astar import GridAStar
 
 # ===================== STREAM URLS ======================
 # Use these MJPEG streams from your ESP32-CAM firmware
@@ -25,6 +34,21 @@ yfloor = 340
 # Number of frames to process in a loop
 NUM_FRAMES = 100
 
+# Max left/right arrival-time difference (s) for a frame pair to be processed
+SYNC_TOLERANCE = 0.040
+
+# Read the streams with the built-in MJPEG client instead of cv2.VideoCapture/FFmpeg
+USE_MJPEG_CLIENT = True
+
+# Rebuild the 3D surface every N frames (0 = no surface); the other panels are updated in place
+SURFACE_EVERY = 10
+
+# Port of the MJPEG dashboard (--dashboard), e.g. http://<car-ip>:8080/
+DASHBOARD_PORT = 8080
+
+# Per-stage latency tracing (rolling p50/p95/p99 printed at exit; --trace also writes a Chrome trace)
+TRACE_STAGES = False
+
 # Stereo SGBM parameters
 minDisp = 0
 nDisp  = 96   # must be multiple of 16
@@ -41,35 +65,20 @@ sigma = 2.5
 discontinuityRad = 4
 # ========================================================
 
-import os
-
-# Paths to calibration files (generated by stereo_calibrate.py)
-CALIB_DIR = "Calibration_Files"
-undistL_path = os.path.join(CALIB_DIR, 'umapL.txt')
-rectifL_path = os.path.join(CALIB_DIR, 'rmapL.txt')
-undistR_path = os.path.join(CALIB_DIR, 'umapR.txt')
-rectifR_path = os.path.join(CALIB_DIR, 'rmapR.txt')
-roiL_path    = os.path.join(CALIB_DIR, 'ROIL.txt')
-roiR_path    = os.path.join(CALIB_DIR, 'ROIR.txt')
-Q_path       = os.path.join(CALIB_DIR, 'Q.txt')
-CL_path      = os.path.join(CALIB_DIR, 'CmL.txt')
-DL_path      = os.path.join(CALIB_DIR, 'DcL.txt')
-RL_path      = os.path.join(CALIB_DIR, 'RectifL.txt')
-
-# Load calibration data
-undistL = np.loadtxt(undistL_path, dtype=np.float32)
-rectifL = np.loadtxt(rectifL_path, dtype=np.float32)
-undistR = np.loadtxt(undistR_path, dtype=np.float32)
-rectifR = np.loadtxt(rectifR_path, dtype=np.float32)
-roiL    = np.loadtxt(roiL_path,    dtype=np.int32)
-roiR    = np.loadtxt(roiR_path,    dtype=np.int32)
-Q       = np.loadtxt(Q_path,       dtype=np.float32)
-CL      = np.loadtxt(CL_path,      dtype=np.float32)
-DL      = np.loadtxt(DL_path,      dtype=np.float32)
-RL      = np.loadtxt(RL_path,      dtype=np.float32)
-
-# Create the StereoSGBM and WLS objects at global scope to avoid re-initializing each frame
-stereoL = cv2.StereoSGBM_create(
+from calibration_bundle import CALIB_DIR, load_calibration
+
+# Load calibration data (bundle generated by camera_calibration.py)
+calib   = load_calibration(CALIB_DIR, frame_size=(FRAME_WIDTH, FRAME_HEIGHT))
+Q       = calib.Q.astype(np.float32)
+CL      = calib.CmL.astype(np.float32)
+DL      = calib.DcL.astype(np.float32)
+RL      = calib.RectifL.astype(np.float32)
+
+planner = GridAStar(diagonal=False)
+
+# StereoSGBM + WLS parameters; the matcher objects are cached per parameter set
+# (stereo_matcher.py), so changing these at runtime reuses warm objects
+MATCHER_PARAMS = dict(
     minDisparity=0,
     numDisparities=96,  # Try increasing to 160 if needed
     blockSize=11,
@@ -78,20 +87,13 @@ stereoL = cv2.StereoSGBM_create(
     speckleWindowSize=00,
     speckleRange=0,
     preFilterCap=0,
-    mode=cv2.StereoSGBM_MODE_SGBM
+    mode=cv2.StereoSGBM_MODE_SGBM,
+    lam=lam,
+    sigma=sigma,
+    discontinuityRad=discontinuityRad
 )
 
-stereoR = ximgproc.createRightMatcher(stereoL)
-wls     = ximgproc.createDisparityWLSFilter(stereoL)
-wls.setLambda(lam)
-wls.setDepthDiscontinuityRadius(discontinuityRad)
-wls.setSigmaColor(sigma)
 
-
-def rescaleROI(src, roi):
-    """Crop the image to the ROI from stereoRectify (valid region)."""
-    x, y, w, h = roi
-    return src[y:y+h, x:x+w]
 def adjust_brightness_contrast(image, brightness=75, contrast=40):
     """
     Adjust brightness and contrast of an image.
@@ -136,10 +138,12 @@ def adjust_brightness_contrast(image, brightness=75, contrast=40):
 #         imgR = histogram_equalization(imgR)
 
 
-def computeDisparity(imgL, imgR):
-    """Compute WLS-filtered disparity and reproject to 3D."""
-    grayL = cv2.cvtColor(imgL, cv2.COLOR_BGR2GRAY)
-    grayR = cv2.cvtColor(imgR, cv2.COLOR_BGR2GRAY)
+def computeDisparity(imgL, imgR, guide=None):
+    """Compute WLS-filtered disparity and reproject to 3D (imgL/imgR may already be gray)."""
+    if guide is None:
+        guide = imgL
+    grayL = imgL if imgL.ndim == 2 else cv2.cvtColor(imgL, cv2.COLOR_BGR2GRAY)
+    grayR = imgR if imgR.ndim == 2 else cv2.cvtColor(imgR, cv2.COLOR_BGR2GRAY)
 
     # Debug prints
     print("grayL.shape =", grayL.shape, "grayL.dtype =", grayL.dtype)
@@ -154,18 +158,24 @@ def computeDisparity(imgL, imgR):
     print("grayL.shape =", grayL.shape)
     print("grayR.shape =", grayR.shape)
 
-    t1 = time.time()
-    dispL = stereoL.compute(grayL, grayR)
-    dispR = stereoR.compute(grayR, grayL)
-    t2 = time.time()
+    stereoL, stereoR, wls = get_matchers(**MATCHER_PARAMS)
+
+    t1 = time.perf_counter()
+    with tracer.span('sgbm'):
+        dispL = stereoL.compute(grayL, grayR)
+    with tracer.span('right_matcher'):
+        dispR = stereoR.compute(grayR, grayL)
+    t2 = time.perf_counter()
     cost_sgbm = t2 - t1
 
     # Filter disparity
-    dispFiltered = wls.filter(dispL, imgL, None, dispR)
-    dispVis = ximgproc.getDisparityVis(dispFiltered)  # for visualization
+    with tracer.span('wls'):
+        dispFiltered = wls.filter(dispL, guide, None, dispR)
+        dispVis = ximgproc.getDisparityVis(dispFiltered)  # for visualization
 
     # Reproject to 3D
-    points3D = cv2.reprojectImageTo3D(dispVis, Q, handleMissingValues=True)
+    with tracer.span('reproject'):
+        points3D = cv2.reprojectImageTo3D(dispVis, Q, handleMissingValues=True)
 
     return dispVis, points3D, cost_sgbm
 
@@ -178,6 +188,7 @@ def findPath(dispVis, points3d, cost_sgbm, frameId):
     yy = points3d[:,:,1]
     zz = points3d[:,:,2]
 
+    t0 = time.perf_counter()
     # Clip to avoid large outliers
     xx = np.clip(xx, -25, 60)
     yy = np.clip(yy, -25, 25)
@@ -186,33 +197,26 @@ def findPath(dispVis, points3d, cost_sgbm, frameId):
     # Floor-based obstacle detection
     obs_slice = zz[yfloor-10:yfloor, :]
     obstacles = np.amin(obs_slice, axis=0)
-    # Construct a simple occupancy grid
-    y_range = np.mgrid[0:np.amax(obstacles), 0:obs_slice.shape[1]][0,:,:]
-    occupancy_grid = np.where(y_range >= obstacles, 0, 1)  # 0=free, 1=obstacle
-
-    # Clear near left boundary if needed
-    occupancy_grid[:, :nDisp+60] = 0
+    # Construct a simple occupancy grid (per-column free depth; 1 = free in the dense view)
+    # Block near left boundary if needed
+    occupancy_grid = OccupancyGrid.from_obstacles(obstacles, blocked_cols=nDisp+60)
+    tracer.record('grid', t0, time.perf_counter())
 
     # Find the farthest free cell
-    try:
-        far_zy, far_zx = np.unravel_index(np.argmax(np.flip(occupancy_grid[:,:-90])),
-                                          occupancy_grid[:,:-90].shape)
-        far_zx = (zz.shape[1]-91) - far_zx
-        far_zy = occupancy_grid.shape[0] - far_zy - 1
-    except:
-        # If occupancy_grid is all zeros or something unexpected
+    if occupancy_grid.height == 0:
+        # If occupancy_grid is empty
         return (None, occupancy_grid, cost_sgbm, 0.0, -1, -1)
+    far_zx, far_zy = occupancy_grid.last_free(-90)
 
     # A* from some center
     xcenter = 305
-    mat_grid = Grid(matrix=occupancy_grid)
-    start = mat_grid.node(xcenter, 1)
-    end   = mat_grid.node(far_zx, far_zy)
-
-    tA1 = time.time()
-    finder = AStarFinder(diagonal_movement=DiagonalMovement.never)
-    path, runs = finder.find_path(start, end, mat_grid)
-    tA2 = time.time()
+    start = (xcenter, 1)
+    end   = (far_zx, far_zy)
+
+    tA1 = time.perf_counter()
+    with tracer.span('planner'):
+        path, runs = planner.find_path(start, end, occupancy_grid)
+    tA2 = time.perf_counter()
     cost_path = tA2 - tA1
 
     if len(path) == 0:
@@ -242,111 +246,99 @@ def findPath(dispVis, points3d, cost_sgbm, frameId):
     return (pr, occupancy_grid, cost_sgbm, cost_path, far_zx, far_zy)
 
 
-def main():
-    # Open the two MJPEG streams as VideoCapture
-    capL = cv2.VideoCapture(LEFT_CAM_URL)
-    capR = cv2.VideoCapture(RIGHT_CAM_URL)
-
-    # Optionally set some properties
-    # capL.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
-    # capL.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
-    # capR.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
-    # capR.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
-
-    plt.ion()
-    fig = plt.figure(figsize=(16,9))
+def main(headless=False, port=VIEWER_PORT, dashboard_port=None, trace_path=None):
+    """
+    Args:
+        headless (bool): Don't draw; publish each frame for `python stereo_viewer.py` instead.
+        port (int): TCP port the frames are published on in headless mode.
+        dashboard_port (int): Also serve the MJPEG dashboard (dashboard_server.py) on this port.
+        trace_path (str): Trace every stage and write a Chrome trace-event JSON file here.
+    """
+    tracer.enable(TRACE_STAGES or trace_path is not None)
+
+    # Open the two MJPEG streams, each drained by its own reader thread
+    grabber = StereoGrabber(LEFT_CAM_URL, RIGHT_CAM_URL, sync_tolerance=SYNC_TOLERANCE,
+                            open_capture=partial(MjpegCapture, decode=False) if USE_MJPEG_CLIENT
+                            else cv2.VideoCapture)
+    if not grabber.start():
+        print("Failed to open the camera streams.")
+        return
+
+    dashboard = (Dashboard(port=dashboard_port, roi_size=calib.roi_size('L')).start()
+                 if dashboard_port is not None else None)
+    if headless:
+        # Frames go to whichever viewer process is attached; publish() never blocks
+        publisher, viewer = FramePublisher(port=port).start(), None
+    else:
+        publisher = None
+        viewer = StereoViewer(calib.roi_size('L'), surface_rows=(100, yfloor), surface_every=SURFACE_EVERY)
 
     for frameId in range(NUM_FRAMES):
-        retL, imgL = capL.read()
-        retR, imgR = capR.read()
+        tracer.set_frame(frameId)
+        with tracer.span('capture_wait'):
+            imgL, imgR = grabber.wait_latest(timeout=1.0)
 
-        if not retL or not retR or imgL is None or imgR is None:
+        if imgL is None or imgR is None:
             print("Failed to read from one of the streams. Retrying...")
-            time.sleep(0.5)
             continue
 
-        # (Optional) resize to match calibration resolution
-        imgL = cv2.resize(imgL, (FRAME_WIDTH, FRAME_HEIGHT))
-        imgR = cv2.resize(imgR, (FRAME_WIDTH, FRAME_HEIGHT))
+        # Decode grayscale for the matcher; colour only for the left (WLS guide / display)
+        with tracer.span('decode'):
+            guideL = decode_color(imgL)
+            grayR = decode_gray(imgR)
 
-        # Remap (rectify)
-        imgL = cv2.remap(imgL, undistL, rectifL, cv2.INTER_LINEAR)
-        imgR = cv2.remap(imgR, undistR, rectifR, cv2.INTER_LINEAR)
-
-        # Crop to valid ROI
-        imgL = rescaleROI(imgL, roiL)
-        imgR = rescaleROI(imgR, roiR)
+        # Resize to the calibration resolution, rectify and crop to the valid ROI
+        # in one remap (maps for new stream resolutions are built on first use);
+        # the left gray image comes from the rectified guide, one remap fewer
+        with tracer.span('remap'):
+            imgL = calib.rectify(guideL, 'L')
+            grayR = calib.rectify(grayR, 'R')
+            grayL = cv2.cvtColor(imgL, cv2.COLOR_BGR2GRAY)
 
         # Compute disparity
-        dispVis, points3D, cost_sgbm = computeDisparity(imgL, imgR)
+        dispVis, points3D, cost_sgbm = computeDisparity(grayL, grayR, guide=imgL)
 
         # Find path
         pr, occupancy_grid, _, cost_path, far_zx, far_zy = findPath(dispVis, points3D, cost_sgbm, frameId)
 
-        # Visualization
-        fig.clf()
-        plt.suptitle(f"Frame #{frameId}")
-
-        # Left camera
-        ax1 = fig.add_subplot(2,2,1)
-        imL_rgb = cv2.cvtColor(imgL, cv2.COLOR_BGR2RGB)
-        ax1.imshow(imL_rgb)
-        ax1.set_title("Left Camera with Path")
-        ax1.set_xlim([0, imgL.shape[1]])
-        ax1.set_ylim([imgL.shape[0], 0])
-
-        # Overlay path if found
-        if pr is not None:
-            px = pr[:,0]
-            py = pr[:,1]
-            ax1.scatter(px, py, c=np.linspace(0,1,len(px)), cmap='plasma_r', s=30)
-
-        # 3D Visualization
-        ax2 = fig.add_subplot(2,2,2, projection='3d')
-        ax2.azim = 90
-        ax2.elev = 110
-        ax2.set_box_aspect((4,3,3))
-
-        xx = points3D[:,:,0]
-        yy = points3D[:,:,1]
-        zz = points3D[:,:,2]
-        ax2.plot_surface(xx[100:yfloor,:],
-                         yy[100:yfloor,:],
-                         zz[100:yfloor,:],
-                         cmap='viridis_r',
-                         rcount=25,
-                         ccount=25,
-                         linewidth=0,
-                         antialiased=False)
-        ax2.invert_xaxis()
-        ax2.invert_zaxis()
-        ax2.set_xlabel('Azimuth (X)')
-        ax2.set_ylabel('Elevation (Y)')
-        ax2.set_zlabel('Depth (Z)')
-        ax2.set_title("3D Reconstructed Scene")
-
-        # Disparity
-        ax3 = fig.add_subplot(2,2,3)
-        ax3.imshow(dispVis, cmap='gray')
-        ax3.set_title("WLS-Filtered Disparity Map")
-
-        # Occupancy
-        ax4 = fig.add_subplot(2,2,4)
-        ax4.set_title("Occupancy Grid with A* Path")
-        if occupancy_grid is not None:
-            ax4.imshow(occupancy_grid, origin='lower', interpolation='none', cmap='gray')
-
         costStats = f"(far_zx, far_zy)=({far_zx},{far_zy})\nSGBM cost={cost_sgbm:.3f}\nPath cost={cost_path:.3f}"
-        fig.text(0.7, 0.05, costStats)
-
-        plt.pause(0.1)
-
-    plt.ioff()
-    plt.show()
-
-    # Release the captures
-    capL.release()
-    capR.release()
+        with tracer.span('render'):
+            if dashboard is not None:
+                dashboard.publish(frameId, imgL, dispVis, occupancy_grid, pr, (far_zx, far_zy))
+            if publisher is not None:
+                publisher.publish(*frame_message(frameId, imgL, dispVis, occupancy_grid, pr, Q,
+                                                 calib.roi_size('L'), (100, yfloor), (costStats,)))
+            else:
+                # Visualization: artists are only updated in place, no pause
+                viewer.update(frameId, imgL, dispVis, occupancy_grid, pr, points3D, (costStats,))
+
+    if tracer.enabled:
+        print(tracer.format_stats())
+        if trace_path:
+            print(f"Wrote {tracer.export_chrome(trace_path)} trace events to {trace_path}")
+
+    if dashboard is not None:
+        dashboard.stop()
+        print("Dashboard:", dashboard.stats())
+    if publisher is not None:
+        publisher.stop()
+        print("Publisher:", publisher.stats())
+    else:
+        viewer.show()
+
+    # Stop the capture threads
+    grabber.stop()
+    print("Capture stats:", grabber.stats())
+    print("Matcher cache:", matcherCache.stats())
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Stereo disparity -> occupancy grid -> A* path planning.")
+    parser.add_argument("--headless", action="store_true",
+                        help="run without drawing and publish frames for stereo_viewer.py")
+    parser.add_argument("--port", type=int, default=VIEWER_PORT, help="port frames are published on")
+    parser.add_argument("--dashboard", type=int, nargs="?", const=DASHBOARD_PORT, metavar="PORT",
+                        help=f"serve the MJPEG dashboard (default port {DASHBOARD_PORT})")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="trace per-stage latency and write a Chrome trace-event JSON file")
+    args = parser.parse_args()
+    main(headless=args.headless, port=args.port, dashboard_port=args.dashboard, trace_path=args.trace)
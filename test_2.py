@@ -1,13 +1,21 @@
+import argparse
 from os.path import isfile, join
 import numpy as np
 import cv2 as cv
 from cv2 import ximgproc
 import matplotlib.pyplot as plt
-from matplotlib.patches import Polygon
-from pathfinding.core.diagonal_movement import DiagonalMovement
-from pathfinding.core.grid import Grid
-from pathfinding.finder.a_star import AStarFinder
 import time
+from functools import partial
+from calibration_bundle import load_calibration
+from frame_channel import FramePublisher
+from frame_decode import decode_color
+from frame_recorder import FrameRecorder
+from grid_astar import GridAStar
+from mjpeg_client import MjpegCapture
+from occupancy_grid import OccupancyGrid
+from stereo_capture import StereoGrabber
+from stereo_matcher import get_matchers
+from stereo_viewer import VIEWER_PORT, StereoViewer, frame_message
 
 '''Global Variables '''
 LEFT_CAM_URL  = "http://192.168.0.159:81/stream"  # Stream URL for Left Camera
@@ -15,6 +23,8 @@ RIGHT_CAM_URL = "http://192.168.0.178:81/stream"  # Stream URL for Right Camera
 
 PATH_CALIB = r'Calibration_Files'
 useStream = 1
+recordFrames = 0     # save the original stream JPEGs as L_frame_<id>.jpg / R_frame_<id>.jpg
+PATH_RECORD = r'.'
 
 ### Stereo Matcher Parameters
 minDisp = 0     # window position x-offset
@@ -26,6 +36,8 @@ modeSgbm = cv.StereoSGBM_MODE_SGBM   # Default: cv.StereoSGBM_MODE_SGBM
 pfCap = 0
 sRange = 0
 yfloor = 340     # y-axis pixel location of floor plane (scene-specific)
+imgSize = (640, 480)    # (width, height) of the camera frames the path is drawn on
+surfaceEvery = 10       # rebuild the 3D surface every N frames (0 = no surface)
 
 ### Weighted least squares parameters
 lam = 32000    # Regularization param
@@ -35,65 +47,74 @@ discontinuityRad = 4
 params = [minDisp, nDisp, bSize, pfCap, sRange]
 
 ### Load Camera Calibration Parameters
-undistL = np.loadtxt(join(PATH_CALIB, 'umapL.txt'), dtype=np.float32)
-rectifL = np.loadtxt(join(PATH_CALIB, 'rmapL.txt'), dtype=np.float32)
-undistR = np.loadtxt(join(PATH_CALIB, 'umapR.txt'), dtype=np.float32)
-rectifR = np.loadtxt(join(PATH_CALIB, 'rmapR.txt'), dtype=np.float32)
-roiL = np.loadtxt(join(PATH_CALIB, 'ROIL.txt'), dtype=int)  # Changed np.int to int
-roiR = np.loadtxt(join(PATH_CALIB, 'ROIR.txt'), dtype=int)  # Changed np.int to int
-Q = np.loadtxt(join(PATH_CALIB, 'Q.txt'), dtype=np.float32)
-
-RL = np.loadtxt(join(PATH_CALIB, 'RectifL.txt'), dtype=np.float32)
-CL = np.loadtxt(join(PATH_CALIB, 'CmL.txt'), dtype=np.float32)
-DL = np.loadtxt(join(PATH_CALIB, 'DcL.txt'), dtype=np.float32)
+calib = load_calibration(PATH_CALIB)
+Q = calib.Q.astype(np.float32)
+
+RL = calib.RectifL.astype(np.float32)
+CL = calib.CmL.astype(np.float32)
+DL = calib.DcL.astype(np.float32)
+
+planner = GridAStar(diagonal=False)   # A* buffers are reused across frames
 
 ''' End Global Variables '''
 
-def main():
+def main(headless=False, port=VIEWER_PORT):
+    '''
+    Args:
+        headless (bool): Don't draw; publish each frame for `python stereo_viewer.py` instead.
+        port (int): TCP port the frames are published on in headless mode.
+    '''
     streamFrames = range(50, 105 + 1)
     imgPairId = '55.jpg'
 
-    left_cam = cv.VideoCapture(LEFT_CAM_URL)
-    right_cam = cv.VideoCapture(RIGHT_CAM_URL)
+    grabber = StereoGrabber(LEFT_CAM_URL, RIGHT_CAM_URL, open_capture=partial(MjpegCapture, decode=False))
+    if useStream and not grabber.start():
+        print('Failed to open camera streams')
+        return
+    recorder = FrameRecorder(PATH_RECORD).start() if recordFrames else None
 
-    plt.figure(figsize=(16,9))
+    if headless:
+        # Frames go to whichever viewer process is attached; publish() never blocks
+        publisher, viewer = FramePublisher(port=port).start(), None
+    else:
+        # Artists are built once and updated in place; no clf() or pause per frame
+        publisher = None
+        viewer = StereoViewer(imgSize, surface_rows=(100, yfloor), surface_every=surfaceEvery)
     if useStream:
         ''' Loop & update figures through image stream ''' 
         for frameId in streamFrames:
-            retL, imgL = left_cam.read()
-            retR, imgR = right_cam.read()
-            if not retL or not retR:
+            jpegL, jpegR = grabber.wait_latest(timeout=1.0)
+            if jpegL is None or jpegR is None:
                 print('Failed to capture images from cameras')
                 continue
-            
-            imgL_path = f'L_frame_{frameId}.jpg'
-            imgR_path = f'R_frame_{frameId}.jpg'
-            cv.imwrite(imgL_path, imgL)
-            cv.imwrite(imgR_path, imgR)
-            
-            compute_disparity(imgL_path, imgR_path, params)
-            plt.pause(0.2)
-    else:
-        compute_disparity(imgPairId, params)
-        plt.show()
-
-    left_cam.release()
-    right_cam.release()
 
-def rescaleROI(src, roi):
-    x, y, w, h = roi
-    dst = src[y:y+h, x:x+w]
-    return dst
+            # Optionally keep the original JPEGs; written off-thread, never blocks this loop
+            if recorder is not None:
+                recorder.submit(f'L_frame_{frameId}.jpg', jpegL)
+                recorder.submit(f'R_frame_{frameId}.jpg', jpegR)
 
-def compute_disparity(imgL_path, imgR_path, params):
-    imgL = cv.imread(imgL_path)
-    imgR = cv.imread(imgR_path)
-    
-    imgL = cv.remap(imgL, undistL, rectifL, cv.INTER_LINEAR)
-    imgR = cv.remap(imgR, undistR, rectifR, cv.INTER_LINEAR)
-
-    imgL = rescaleROI(imgL, roiL)
-    imgR = rescaleROI(imgR, roiR)
+            imgL, imgR = decode_color(jpegL), decode_color(jpegR)
+            compute_disparity(imgL, imgR, params, frameId, viewer, publisher)
+        grabber.stop()
+    else:
+        imgL = cv.imread(join(PATH_RECORD, f'L_frame_{imgPairId}'))
+        imgR = cv.imread(join(PATH_RECORD, f'R_frame_{imgPairId}'))
+        compute_disparity(imgL, imgR, params, int(imgPairId.split('.')[0]), viewer, publisher)
+        if viewer is not None:
+            viewer.show()
+
+    if recorder is not None:
+        recorder.stop()
+        print('Recorder stats:', recorder.stats())
+    if publisher is not None:
+        publisher.stop()
+        print('Publisher stats:', publisher.stats())
+
+def compute_disparity(imgL, imgR, params, frameId, viewer, publisher=None):
+    ''' imgL/imgR: unrectified BGR frames; imgL is also used for the path overlay '''
+    imgOrigL = imgL
+    imgL = calib.rectify(imgL, 'L')
+    imgR = calib.rectify(imgR, 'R')
 
     if imgL.shape != imgR.shape:
         print('L.shape != R.shape: {} != {}'.format(imgL.shape, imgR.shape))
@@ -103,9 +124,9 @@ def compute_disparity(imgL_path, imgR_path, params):
     grayL = cv.cvtColor(imgL, cv.COLOR_BGR2GRAY)
     grayR = cv.cvtColor(imgR, cv.COLOR_BGR2GRAY)
 
-    ### Init StereoMatcher with parameters
+    ### Matcher + WLS filter for these parameters (cached, not rebuilt every frame)
     (minDisp,nDisp,bSize,pfCap,sRange) = params
-    stereoL = cv.StereoSGBM_create(
+    stereoL, stereoR, wls = get_matchers(
                 minDisparity=minDisp,
                 numDisparities=nDisp,
                 blockSize=bSize,
@@ -113,14 +134,10 @@ def compute_disparity(imgL_path, imgR_path, params):
                 P2=P2,
                 speckleRange=sRange,
                 preFilterCap=pfCap,
-                mode=modeSgbm)
-        
-    ### Init WLS Filter with parameters
-    wls = ximgproc.createDisparityWLSFilter(stereoL)
-    stereoR = ximgproc.createRightMatcher(stereoL)
-    wls.setLambda(lam)
-    wls.setDepthDiscontinuityRadius(discontinuityRad)  # Default 4, confidence parameter for gaps/holes in disparity
-    wls.setSigmaColor(sigma)
+                mode=modeSgbm,
+                lam=lam,
+                sigma=sigma,
+                discontinuityRad=discontinuityRad)
 
     ### Compute raw disparity from both sides
     ts1 = time.time()
@@ -141,12 +158,12 @@ def compute_disparity(imgL_path, imgR_path, params):
     points3d = cv.reprojectImageTo3D(dispFinal, Q, ddepth=cv.CV_32F, handleMissingValues=True)
     
     ''' Filter obstacles, compute occupancy grid, find path '''
-    find_path(imgL_path, nDisp, points3d, dispFinal, cost_sgbm)
+    find_path(imgOrigL, frameId, nDisp, points3d, dispFinal, cost_sgbm, viewer, publisher)
     
     ### Show Disparity Maps
-    #display_disparity(imgL, dispL, dispFinal, imgL_path, paramsVals)
+    #display_disparity(imgL, dispL, dispFinal, f'frame_{frameId}', paramsVals)
 
-def find_path(imgId, nDisp, points3d, disparityMap, cost_sgbm):
+def find_path(imL, frameId, nDisp, points3d, disparityMap, cost_sgbm, viewer, publisher=None):
     np.set_printoptions(suppress=True, precision=3)
     xx, yy, zz = points3d[:,:,0], points3d[:,:,1], points3d[:,:,2]
     xx, yy, zz = np.clip(xx, -25, 60), np.clip(yy, -25, 25), np.clip(zz, 0, 100)
@@ -156,26 +173,15 @@ def find_path(imgId, nDisp, points3d, disparityMap, cost_sgbm):
 
     ''' Construct occupancy grid '''
     obstacles = np.amin(obs, 0, keepdims=False)
-    y = np.mgrid[0:np.amax(obstacles), 0:obs.shape[1]][0,:,:]
-
-    ### Assign weights to regions (cost low -> high == 0.01 -> 2)
-    occupancy_grid = np.where(y >= obstacles, 0, 1)
-    occupancy_grid[:, :nDisp+60] = 0
+    occupancy_grid = OccupancyGrid.from_obstacles(obstacles, blocked_cols=nDisp+60)
 
-    far_zy, far_zx = np.unravel_index(np.argmax(np.flip(occupancy_grid[:,:-90])), occupancy_grid[:,:-90].shape)
-    far_zx = (zz.shape[1]-91) - far_zx
-
-    far_zy = occupancy_grid.shape[0] - far_zy - 1
+    far_zx, far_zy = occupancy_grid.last_free(-90)
     
     xcenter = 305
     
     ''' A* path-finding config and computation '''
-    mat_grid = Grid(matrix=occupancy_grid)
-    start = mat_grid.node(xcenter, 1)
-    end = mat_grid.node(far_zx, far_zy)
     tp1 = time.time()
-    finder = AStarFinder(diagonal_movement=DiagonalMovement.never)
-    path, runs = finder.find_path(start, end, mat_grid)
+    path, runs = planner.find_path((xcenter, 1), (far_zx, far_zy), occupancy_grid)
     tp2 = time.time()
     cost_path = tp2-tp1
     
@@ -198,45 +204,17 @@ def find_path(imgId, nDisp, points3d, disparityMap, cost_sgbm):
     ''' Reproject 3D world-frame points back to unrectified 2D points'''
     pr, _ = cv.projectPoints(cf, np.zeros(3), np.zeros(3), CL, DL)
     pr = np.squeeze(pr, 1)
-    py = pr[:,1]
-    px = pr[:,0]
     
-    ''' Draw Floor Polygon '''
-    fPts = np.array([[-40, 13, nDisp], [40, 13, nDisp], [40, 15, 0], [-40, 15, 0]], dtype=np.float32).T
-    pf, _ = cv.projectPoints(fPts, np.zeros(3).T, np.zeros(3), CL, None)
-    pf = np.squeeze(pf, 1)
-
     ''' Update figure (final results) '''
-    imL = cv.imread(imgId)
-    imL = cv.cvtColor(imL, cv.COLOR_BGR2RGB)
-    
-    plt.clf()
-    plt.suptitle(imgId.split('.')[0])
-    
     costStats = '(far_zx, far_zy)=({},{})\ncost_path={:.3f}\ncost_sgbm={:.3f}'.format(far_zx, far_zy, cost_path, cost_sgbm)
-    plt.gcf().text(x=0.6, y=0.05, s=costStats, fontsize='small')
-    
     pathStats = 'steps={}\npathlen={}'.format(runs, len(path))
-    plt.gcf().text(x=0.75, y=0.05, s=pathStats, fontsize='small')
-    
-    plt.subplot(221); plt.imshow(imL); plt.title('Planned Path (Left Camera)')
-    plt.xlim([0, 640]); plt.ylim([480, 0])
-    plt.scatter(px, py, s=np.geomspace(70, 5, len(px)), c=cf[:,1], cmap=plt.cm.plasma_r, zorder=99)
-    plt.gca().add_patch(Polygon(pf, fill=True, facecolor=(0,1,0,0.12), edgecolor=(0,1,0,0.35)))
-
-    ax = plt.gcf().add_subplot(222, projection='3d')
-    ax.azim = 90; ax.elev = 110; ax.set_box_aspect((4,3,3))
-    ax.plot_surface(xx[100:yfloor,:], yy[100:yfloor,:], zz[100:yfloor,:], cmap=plt.cm.viridis_r, 
-                                rcount=25, ccount=25, linewidth=0, antialiased=False)
-    ax.set_xlabel('Azimuth (X)'); ax.set_ylabel('Elevation (Y)'); ax.set_zlabel('Depth (Z)')
-    ax.invert_xaxis(); ax.invert_zaxis(); ax.set_title('Planned Path (wrt. world-frame)')
-    ax.scatter3D(cf[:,0], cf[:,1], cf[:,2], c=cf[:,2], cmap=plt.cm.plasma_r)
-
-    plt.subplot(223); plt.imshow(disparityMap); plt.title('WLS Filtered Disparity Map')
-
-    plt.subplot(224); plt.imshow(occupancy_grid, origin='lower', interpolation='none')
-    plt.title('Occupancy Grid with A* Path')
-    plt.plot(coords[:,0], coords[:,1], 'r')     # Plot A* path over occupancy grid
+    if publisher is not None:
+        # The viewer process rebuilds the 3D view from the disparity and Q
+        publisher.publish(*frame_message(frameId, imL, disparityMap, occupancy_grid, pr, Q,
+                                         imgSize, (100, yfloor), (costStats, pathStats)))
+        return
+    depth = np.dstack((xx, yy, zz)) if viewer.needs_surface() else None
+    viewer.update(frameId, imL, disparityMap, occupancy_grid, pr, depth, (costStats, pathStats))
 
 def display_disparity(origImg, dispRaw, dispWLS, imgName, paramsVals):
     ''' Helper function to show figure with some parameters '''
@@ -261,4 +239,10 @@ def display_disparity(origImg, dispRaw, dispWLS, imgName, paramsVals):
     plt.tight_layout()
     plt.show()
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stereo disparity -> occupancy grid -> A* path (single pair or stream).")
+    parser.add_argument("--headless", action="store_true",
+                        help="run without drawing and publish frames for stereo_viewer.py")
+    parser.add_argument("--port", type=int, default=VIEWER_PORT, help="port frames are published on")
+    args = parser.parse_args()
+    main(headless=args.headless, port=args.port)